@@ -0,0 +1,226 @@
+"""
+Admission control for the ingest path.
+
+At most settings.INGEST_MAX_CONCURRENT ingests run at once, each on a
+dedicated thread pool so the event loop stays free for reads. Up to
+settings.INGEST_QUEUE_SIZE more wait for a slot; beyond that uploads are
+rejected with 429 and a Retry-After header instead of piling onto the
+database and timing out together.
+
+Reads take priority: `ReadPriorityMiddleware` counts in-flight GET
+requests, and ingests pause between insert batches (up to
+settings.INGEST_READ_YIELD_MAX_S per batch) while any are running. Batch
+upload workers in other processes follow a shared copy of the count
+(`ReadPriority.shared`).
+
+Queue depth, wait times and rejections are exported by `render_metrics`
+in the Prometheus text format.
+"""
+import asyncio
+import multiprocessing
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import HTTPException
+from .config import settings
+
+# Upper bounds (seconds) of the ingest wait time histogram buckets
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class IngestAdmission:
+    """Bounded concurrency plus a bounded wait queue for ingests."""
+
+    def __init__(self, max_concurrent: int, queue_size: int, retry_after_s: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self.queue_size = max(0, queue_size)
+        self.retry_after_s = retry_after_s
+        self.active = 0
+        self.waiting = 0
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.wait_seconds_sum = 0.0
+        self.wait_bucket_counts = [0] * len(WAIT_BUCKETS)
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        # Sized like the semaphore, so even an ingest whose request was
+        # cancelled mid-run cannot push the DB past max_concurrent writers
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent,
+                                            thread_name_prefix="ingest")
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wait for an ingest slot, or raise 429 if the queue is full."""
+        if self.active + self.waiting >= self.max_concurrent + self.queue_size:
+            self.rejected_total += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many uploads being processed, retry later",
+                headers={"Retry-After": str(self.retry_after_s)},
+            )
+
+        self.waiting += 1
+        started = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self._observe_wait(time.monotonic() - started)
+
+        self.active += 1
+        self.admitted_total += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    async def run(self, fn, *args):
+        """Run blocking ingest work on the ingest thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _observe_wait(self, seconds: float):
+        self.wait_seconds_sum += seconds
+        index = bisect_left(WAIT_BUCKETS, seconds)
+        if index < len(WAIT_BUCKETS):
+            self.wait_bucket_counts[index] += 1
+
+
+class ReadPriority:
+    """Counts in-flight reads so ingest threads can step aside for them."""
+
+    def __init__(self, max_yield_s: float):
+        self.max_yield_s = max_yield_s
+        self._yield_seconds = 0.0
+        self._reads = 0
+        self._condition = threading.Condition()
+        self._shared: Optional[WorkerReadPriority] = None
+
+    @property
+    def reads_in_flight(self) -> int:
+        return self._reads
+
+    @property
+    def yield_seconds_total(self) -> float:
+        shared = self._shared.yielded.value if self._shared is not None else 0.0
+        return self._yield_seconds + shared
+
+    def shared(self) -> "WorkerReadPriority":
+        """The read count as seen by worker processes (spawn context); created on first use."""
+        with self._condition:
+            if self._shared is None:
+                context = multiprocessing.get_context("spawn")
+                self._shared = WorkerReadPriority(context.Value("i", self._reads), context.Value("d", 0.0),
+                                                  self.max_yield_s)
+            return self._shared
+
+    def enter(self):
+        with self._condition:
+            self._reads += 1
+            self._publish()
+
+    def exit(self):
+        with self._condition:
+            self._reads -= 1
+            self._publish()
+            if self._reads == 0:
+                self._condition.notify_all()
+
+    def _publish(self):
+        if self._shared is not None:
+            self._shared.reads.value = self._reads
+
+    def wait_for_reads(self):
+        """Block (from an ingest thread) until no reads are running, up to max_yield_s."""
+        with self._condition:
+            if self._reads == 0:
+                return
+            started = time.monotonic()
+            self._condition.wait_for(lambda: self._reads == 0, timeout=self.max_yield_s)
+            self._yield_seconds += time.monotonic() - started
+
+
+class WorkerReadPriority:
+    """
+    ReadPriority.wait_for_reads for a worker process: polls the read count
+    shared by the server process. Passed to the worker when it starts.
+    """
+
+    POLL_S = 0.01
+
+    def __init__(self, reads, yielded, max_yield_s: float):
+        self.reads = reads
+        self.yielded = yielded
+        self.max_yield_s = max_yield_s
+
+    def wait_for_reads(self):
+        if self.reads.value == 0:
+            return
+        started = time.monotonic()
+        while self.reads.value and time.monotonic() - started < self.max_yield_s:
+            time.sleep(self.POLL_S)
+        with self.yielded.get_lock():
+            self.yielded.value += time.monotonic() - started
+
+
+class ReadPriorityMiddleware:
+    """ASGI middleware registering GET/HEAD requests with `read_priority`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] not in ("GET", "HEAD")
+                or scope["path"] == "/metrics"):
+            await self.app(scope, receive, send)
+            return
+        read_priority.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            read_priority.exit()
+
+
+ingest_admission = IngestAdmission(
+    settings.INGEST_MAX_CONCURRENT, settings.INGEST_QUEUE_SIZE, settings.INGEST_RETRY_AFTER_S,
+)
+read_priority = ReadPriority(settings.INGEST_READ_YIELD_MAX_S)
+
+
+def render_metrics() -> str:
+    """Admission metrics in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str, value):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+
+    a = ingest_admission
+    metric("telemetry_ingest_active", "gauge", "Ingests currently running.", a.active)
+    metric("telemetry_ingest_queue_depth", "gauge", "Ingests waiting for a slot.", a.waiting)
+    metric("telemetry_ingest_max_concurrent", "gauge", "Maximum concurrent ingests.", a.max_concurrent)
+    metric("telemetry_ingest_queue_capacity", "gauge", "Maximum ingests waiting for a slot.", a.queue_size)
+    metric("telemetry_ingest_admitted_total", "counter", "Ingests admitted.", a.admitted_total)
+    metric("telemetry_ingest_rejected_total", "counter", "Ingests rejected with 429.", a.rejected_total)
+
+    name = "telemetry_ingest_wait_seconds"
+    lines.append(f"# HELP {name} Time ingests spent waiting for a slot.")
+    lines.append(f"# TYPE {name} histogram")
+    cumulative = 0
+    for bound, count in zip(WAIT_BUCKETS, a.wait_bucket_counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{le="+Inf"}} {a.admitted_total}')
+    lines.append(f"{name}_sum {a.wait_seconds_sum:.6f}")
+    lines.append(f"{name}_count {a.admitted_total}")
+
+    metric("telemetry_reads_in_flight", "gauge", "GET requests currently running.",
+           read_priority.reads_in_flight)
+    metric("telemetry_ingest_read_yield_seconds_total", "counter",
+           "Time ingests spent paused for in-flight reads.",
+           f"{read_priority.yield_seconds_total:.6f}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,298 @@
+"""
+Bulk upload of many session files in one tar or zip archive.
+
+The archive is read as a stream (tar) or through its central directory
+(zip) and every session file member (*.jsonl[.gz|.zst|.lz4] or v2 *.tsf) is saved under uploads/sessions as it is
+read, so the archive is never unpacked in memory. The saved files are then
+ingested in parallel worker processes, each streaming its file into the
+database as single uploads do, so no member is ever held in memory whole.
+Lazy batches still read each file, for its car, track, duration and
+thumbnail, but write no samples.
+
+An optional manifest.json member names the driver (and, if the file does
+not carry them, car and track) per file:
+
+    {
+        "driver_name": "Default Driver",
+        "files": {
+            "stint1.jsonl.gz": "Alice",
+            "stint2.jsonl.gz": {"driver_name": "Bob", "car": "Porsche GT3 RS"}
+        }
+    }
+"""
+import hashlib
+import json
+import multiprocessing
+import tarfile
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from itertools import chain
+from pathlib import Path
+from typing import Callable, Optional
+from sqlmodel import Session as DBSession
+from .admission import WorkerReadPriority, read_priority
+from .channels import stream_derived_channels
+from .config import settings
+from .db import engine
+from .ingest import (
+    INGEST_FULL, INGEST_INGESTING, INGEST_LAZY, INSERT_BATCH_SIZE,
+    FILE_CHUNK_SIZE, ParsedSession, finish_ingest, iter_session_rows, write_samples, upload_file_name,
+)
+from .models import Session
+from .session_files import SESSION_FILE_SUFFIXES
+from .thumbnails import thumbnail_for_rows
+
+MANIFEST_NAME = "manifest.json"
+
+_ingest_pool: Optional[ProcessPoolExecutor] = None
+# In worker processes: pauses between insert batches while the server has reads in flight
+_worker_pause: Optional[Callable[[], None]] = None
+
+
+def ingest_pool() -> ProcessPoolExecutor:
+    """Worker processes shared by all batch uploads in this server process."""
+    global _ingest_pool
+    if _ingest_pool is None:
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        _ingest_pool = ProcessPoolExecutor(
+            max_workers=settings.BATCH_PARSE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(read_priority.shared(),),
+        )
+    return _ingest_pool
+
+
+def _init_worker(priority: WorkerReadPriority):
+    global _worker_pause
+    _worker_pause = priority.wait_for_reads
+
+
+class ArchiveError(ValueError):
+    """The upload is not a readable tar or zip archive, or breaks the limits."""
+
+
+def _members(archive_file):
+    """Yield (name, file object) for each regular file in a tar or zip archive."""
+    archive_file.seek(0)
+    if zipfile.is_zipfile(archive_file):
+        archive_file.seek(0)
+        with zipfile.ZipFile(archive_file) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, member
+        return
+
+    archive_file.seek(0)
+    try:
+        with tarfile.open(fileobj=archive_file, mode="r|*") as archive:
+            for info in archive:
+                if info.isfile():
+                    yield info.name, archive.extractfile(info)
+    except tarfile.TarError as e:
+        raise ArchiveError(f"Not a tar or zip archive: {e}")
+
+
+def save_member(member, dest_path: Path, max_bytes: int) -> tuple[str, int]:
+    """
+    Copy an archive member to `dest_path`, stopping once more than
+    `max_bytes` have been read. Returns (SHA-256 hex digest, bytes read).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(dest_path, "wb") as buffer:
+        while size <= max_bytes:
+            chunk = member.read(FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            digest.update(chunk)
+            buffer.write(chunk)
+    return digest.hexdigest(), size
+
+
+def save_members(archive_file, upload_dir: Path) -> tuple[list, dict, list]:
+    """
+    Save the session files in an archive under `upload_dir` with temporary
+    names. Returns (saved, manifest, skipped) where saved is a list of
+    (member name, path, sha256). Members are copied in chunks and checked
+    against BATCH_MAX_MEMBER_BYTES and BATCH_MAX_TOTAL_BYTES as they are
+    read, so an oversized (or decompression bomb) archive stops early; on
+    any error the files saved so far are removed.
+    """
+    saved, skipped = [], []
+    manifest: dict = {}
+    total = 0
+    try:
+        for name, member in _members(archive_file):
+            base = Path(name).name
+            if base == MANIFEST_NAME:
+                try:
+                    manifest = json.loads(member.read(1024 * 1024))
+                except ValueError as e:
+                    raise ArchiveError(f"Invalid {MANIFEST_NAME}: {e}")
+                if not isinstance(manifest, dict):
+                    raise ArchiveError(f"{MANIFEST_NAME} must be a JSON object")
+                continue
+            if not base.endswith(SESSION_FILE_SUFFIXES) or base.startswith("."):
+                skipped.append(name)
+                continue
+            if len(saved) >= settings.BATCH_MAX_FILES:
+                raise ArchiveError(f"Archive has more than {settings.BATCH_MAX_FILES} session files")
+            path = upload_dir / f".batch_{uuid.uuid4().hex}_{base}"
+            max_bytes = min(settings.BATCH_MAX_MEMBER_BYTES, settings.BATCH_MAX_TOTAL_BYTES - total)
+            saved.append((name, path, None))  # listed first so a failed copy is removed too
+            sha, size = save_member(member, path, max_bytes)
+            saved[-1] = (name, path, sha)
+            if size > settings.BATCH_MAX_MEMBER_BYTES:
+                raise ArchiveError(f"{name} is larger than {settings.BATCH_MAX_MEMBER_BYTES} bytes")
+            total += size
+            if total > settings.BATCH_MAX_TOTAL_BYTES:
+                raise ArchiveError(f"Archive session files are larger than {settings.BATCH_MAX_TOTAL_BYTES} "
+                                   "bytes in total")
+    except BaseException:
+        for _, path, _ in saved:
+            path.unlink(missing_ok=True)
+        raise
+    return saved, manifest, skipped
+
+
+def manifest_entry(manifest: dict, member_name: str, default_driver: str) -> dict:
+    """Driver, car and track overrides for one member."""
+    files = manifest.get("files") or {}
+    entry = files.get(member_name, files.get(Path(member_name).name, {}))
+    if isinstance(entry, str):
+        entry = {"driver_name": entry}
+    return {
+        "driver_name": entry.get("driver_name") or manifest.get("driver_name") or default_driver,
+        "car": entry.get("car"),
+        "track": entry.get("track"),
+    }
+
+
+def ingest_members(saved: list, manifest: dict, default_driver: str, upload_dir: Path,
+                   lazy: bool = False) -> list[dict]:
+    """
+    Ingest saved members in parallel worker processes, each as its own
+    session. Returns one result per member, in archive order. Blocking.
+    """
+    results: dict = {}
+    pending = iter(enumerate(saved))
+    pool = ingest_pool()
+    in_flight = {}
+
+    def submit_next():
+        item = next(pending, None)
+        if item is not None:
+            index, (name, path, sha) = item
+            in_flight[pool.submit(ingest_member, name, path, sha, manifest_entry(manifest, name, default_driver),
+                                  upload_dir, lazy)] = index
+
+    # Keep every worker busy, with one member each queued behind it
+    for _ in range(settings.BATCH_PARSE_WORKERS * 2):
+        submit_next()
+
+    while in_flight:
+        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in finished:
+            index = in_flight.pop(future)
+            submit_next()
+            name, path, _ = saved[index]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                path.unlink(missing_ok=True)
+                results[index] = {"file": name, "status": "error", "error": str(e)}
+    return [results[i] for i in range(len(saved))]
+
+
+def ingest_member(name: str, path: Path, sha: str, entry: dict, upload_dir: Path, lazy: bool) -> dict:
+    """
+    Worker task: stream one saved member into a new session over this
+    process's own connection, pausing between insert batches while the
+    server has reads in flight. Only the result dict goes back.
+    """
+    parsed = ParsedSession(file_path=str(path))
+    rows = iter_session_rows(path, "Unknown", "Unknown", parsed)
+    first = next(rows, None)
+    if first is None:
+        raise ValueError("No telemetry samples in file")
+    rows = chain([first], rows)
+
+    file_name = upload_file_name(entry["driver_name"], Path(name).name)
+    final_path = upload_dir / file_name
+    path.rename(final_path)
+
+    with DBSession(engine) as db:
+        session = Session(
+            driver_name=entry["driver_name"],
+            car=entry["car"] or parsed.car or "Unknown",
+            track=entry["track"] or parsed.track or "Unknown",
+            duration=0.0,
+            upload_time=datetime.utcnow(),
+            file_name=file_name,
+            file_sha256=sha,
+            ingest_state=INGEST_LAZY if lazy else INGEST_INGESTING,
+        )
+        db.add(session)
+        db.commit()
+        db.refresh(session)
+
+        if lazy:
+            # No samples are written, but listings still get a thumbnail
+            db.add(thumbnail_for_rows(session.id, rows))
+            sample_count = None
+        else:
+            try:
+                sample_count = write_samples(db, session, stream_derived_channels(rows, INSERT_BATCH_SIZE),
+                                             pause=_worker_pause)
+            except Exception as e:
+                # Keep the session and file, as single uploads do, so the
+                # file can be re-ingested with reingest_uploads.py
+                db.rollback()
+                finish_ingest(db, session.id)
+                return {"file": name, "status": "error", "id": session.id, "filename": file_name,
+                        "error": f"Failed to store telemetry samples: {e}"}
+        # Known once the whole file has been read
+        session.duration = parsed.duration or 0.0
+        db.add(session)
+        db.commit()
+        if not lazy:
+            finish_ingest(db, session.id)
+            print(f"Successfully stored {sample_count} telemetry samples for session {session.id}")
+
+        return {
+            "file": name,
+            "status": "ok",
+            "id": session.id,
+            "filename": file_name,
+            "driver_name": session.driver_name,
+            "car": session.car,
+            "track": session.track,
+            "duration": session.duration,
+            "ingest_state": INGEST_LAZY if lazy else INGEST_FULL,
+            "telemetry_samples_count": sample_count,
+            "error_count": parsed.error_count,
+        }
+
+
+def ingest_archive(archive_file, default_driver: str, upload_dir: Path, lazy: bool = False) -> dict:
+    """Save and ingest every session file in an archive. Blocking."""
+    saved: list = []
+    try:
+        saved, manifest, skipped = save_members(archive_file, upload_dir)
+        results = ingest_members(saved, manifest, default_driver, upload_dir, lazy)
+    except BaseException:
+        for _, path, _ in saved:
+            path.unlink(missing_ok=True)
+        raise
+    return {
+        "files": len(results),
+        "succeeded": sum(r["status"] == "ok" for r in results),
+        "failed": sum(r["status"] != "ok" for r in results),
+        "skipped": skipped,
+        "results": results,
+    }
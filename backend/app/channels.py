@@ -0,0 +1,168 @@
+"""
+Derived channels computed once per session at ingest, vectorized with NumPy.
+
+    long_accel_g    longitudinal acceleration from the speed trace (g)
+    lat_load_g      lateral load proxy from speed and steering input (g),
+                    using a kinematic bicycle model: v^2 * tan(steer angle) / wheelbase
+    distance_m      distance travelled since the previous sample (m)
+    brake_event     +1 where the brake is applied, -1 where it is released
+    throttle_event  +1 where the throttle is picked up, -1 where it is lifted
+
+Samples are processed in ts order. Gaps longer than 5x the median sample
+interval (pauses, dropped packets) break the differences, so no
+acceleration or distance is derived across them. The median is taken once
+per session, over the first GAP_MEDIAN_SAMPLES samples in recording order
+(see gap_threshold), so the whole-file, streamed and backfill paths all
+apply the same threshold.
+"""
+from typing import Iterable, Iterator, Optional
+import numpy as np
+from sqlalchemy import text
+from .stats import PEDAL_ON_PCT
+
+G = 9.80665
+# Road wheel angle at full steering input (steer = +/-1), and wheelbase,
+# for a typical GT car; lat_load_g is a proxy, not a measurement
+STEER_LOCK_RAD = np.radians(15.0)
+WHEELBASE_M = 2.45
+MAX_LOAD_G = 5.0
+
+DERIVED_CHANNELS = ("long_accel_g", "lat_load_g", "distance_m", "brake_event", "throttle_event")
+# Samples (in recording order) whose median interval sets the gap threshold
+GAP_MEDIAN_SAMPLES = 1000
+
+
+def _events(pedal: np.ndarray) -> np.ndarray:
+    """+1 on the sample where the pedal goes above PEDAL_ON_PCT, -1 where it drops back."""
+    on = (pedal > PEDAL_ON_PCT).astype(np.int8)
+    events = np.zeros(len(pedal), dtype=np.int8)
+    events[1:] = np.diff(on)
+    return events
+
+
+def gap_threshold(first_ts: Iterable[float]) -> float:
+    """
+    Longest interval differenced across: 5x the median interval of the
+    session's first GAP_MEDIAN_SAMPLES timestamps, given in recording order.
+    """
+    ts = np.sort(np.fromiter((t or 0.0 for t in first_ts), dtype=np.float64))
+    return 5 * float(np.median(np.diff(ts))) if len(ts) > 1 else 0.0
+
+
+def derive_channels(ts: np.ndarray, speed_kmh: np.ndarray, steer: np.ndarray,
+                    throttle: np.ndarray, brake: np.ndarray, max_dt: float) -> dict:
+    """Derived channel arrays for samples already ordered by ts; `max_dt` is the gap_threshold."""
+    n = len(ts)
+    if n == 0:
+        return {name: np.zeros(0) for name in DERIVED_CHANNELS}
+
+    speed = speed_kmh / 3.6
+    dt = np.diff(ts)
+    valid = (dt > 0) & (dt <= max_dt)
+
+    long_accel = np.zeros(n)
+    distance = np.zeros(n)
+    dv = np.diff(speed)
+    long_accel[1:][valid] = dv[valid] / dt[valid] / G
+    distance[1:][valid] = (speed[1:][valid] + speed[:-1][valid]) / 2 * dt[valid]
+
+    lat_load = speed ** 2 * np.tan(np.clip(steer, -1.0, 1.0) * STEER_LOCK_RAD) / WHEELBASE_M / G
+
+    return {
+        "long_accel_g": np.round(np.clip(long_accel, -MAX_LOAD_G, MAX_LOAD_G), 3),
+        "lat_load_g": np.round(np.clip(lat_load, -MAX_LOAD_G, MAX_LOAD_G), 3),
+        "distance_m": np.round(distance, 3),
+        "brake_event": _events(brake),
+        "throttle_event": _events(throttle),
+    }
+
+
+def add_derived_channels(rows: list, previous: Optional[dict] = None,
+                         max_dt: Optional[float] = None) -> Optional[dict]:
+    """
+    Fill the derived channels into parsed sample rows, in place. `previous`
+    is the sample just before `rows` (see stream_derived_channels); it is
+    used for the differences but not changed. `max_dt` defaults to the
+    gap_threshold of `rows`. Returns the last row in ts order.
+    """
+    if not rows:
+        return previous
+    if max_dt is None:
+        max_dt = gap_threshold(row["ts"] for row in rows[:GAP_MEDIAN_SAMPLES])
+    rows_in = rows if previous is None else [previous] + rows
+    order = np.argsort(np.fromiter((r["ts"] or 0.0 for r in rows_in), dtype=np.float64, count=len(rows_in)),
+                       kind="stable")
+
+    def column(name: str) -> np.ndarray:
+        return np.fromiter((rows_in[i][name] or 0.0 for i in order), dtype=np.float64, count=len(rows_in))
+
+    derived = derive_channels(column("ts"), column("speed"), column("steer"),
+                              column("throttle"), column("brake"), max_dt)
+    values = {name: derived[name].tolist() for name in DERIVED_CHANNELS}
+    for position, index in enumerate(order.tolist()):
+        row = rows_in[index]
+        if row is previous:
+            continue
+        for name in DERIVED_CHANNELS:
+            row[name] = values[name][position]
+    return rows_in[int(order[-1])]
+
+
+def stream_derived_channels(rows: Iterable[dict], batch_size: int) -> Iterator[dict]:
+    """
+    add_derived_channels for a stream of rows (in recording order), holding
+    one batch at a time. Each batch is derived together with the last
+    sample of the previous one, so differences and pedal events carry
+    across batches. The gap threshold is taken from the first batch (at
+    least GAP_MEDIAN_SAMPLES rows) and used for all of them.
+    """
+    batch_size = max(batch_size, GAP_MEDIAN_SAMPLES)
+    previous = None
+    max_dt = None
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            if max_dt is None:
+                max_dt = gap_threshold(sample["ts"] for sample in batch[:GAP_MEDIAN_SAMPLES])
+            previous = add_derived_channels(batch, previous, max_dt)
+            yield from batch
+            batch = []
+    add_derived_channels(batch, previous, max_dt)
+    yield from batch
+
+
+def backfill_session_channels(conn, low: int, high: int) -> int:
+    """
+    Migration backfill: compute the derived channels for sessions with ids
+    in (low, high] that do not have them yet. Returns rows updated.
+    """
+    session_ids = conn.execute(text(
+        "SELECT DISTINCT session_id FROM telemetrysample "
+        "WHERE session_id > :low AND session_id <= :high AND long_accel_g IS NULL"
+    ), {"low": low, "high": high}).scalars().all()
+
+    updated = 0
+    for session_id in session_ids:
+        rows = conn.execute(text(
+            "SELECT id, ts, speed, steer, throttle, brake FROM telemetrysample "
+            "WHERE session_id = :session_id ORDER BY ts, id"
+        ), {"session_id": session_id}).all()
+        if not rows:
+            continue
+        ids, ts, speed, steer, throttle, brake = (np.asarray(c, dtype=np.float64) for c in zip(*rows))
+        # Sample ids follow recording order
+        first = np.argsort(ids, kind="stable")[:GAP_MEDIAN_SAMPLES]
+        derived = derive_channels(ts, speed, steer, throttle, brake, gap_threshold(ts[first]))
+        values = {name: derived[name].tolist() for name in DERIVED_CHANNELS}
+        conn.execute(
+            text("UPDATE telemetrysample SET long_accel_g = :long_accel_g, lat_load_g = :lat_load_g, "
+                 "distance_m = :distance_m, brake_event = :brake_event, "
+                 "throttle_event = :throttle_event WHERE id = :id"),
+            [
+                {"id": int(sample_id), **{name: values[name][i] for name in DERIVED_CHANNELS}}
+                for i, sample_id in enumerate(ids.tolist())
+            ],
+        )
+        updated += len(rows)
+    return updated
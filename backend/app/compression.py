@@ -0,0 +1,243 @@
+"""
+Negotiated response compression (zstd, brotli, gzip) and a cache of
+precompressed bodies for session resources.
+
+`CompressionMiddleware` compresses any single-chunk response that is large
+enough and not already encoded. Session data routes use `cached_json`,
+which keeps the serialized JSON and each compressed variant in a
+size-bounded LRU, keyed by the session's data version, so repeat requests
+skip the sample queries, serialization and compression entirely.
+
+Levels come from settings.COMPRESSION_LEVEL, overridden per route path
+template (e.g. "/sessions/{session_id}/telemetry") by
+settings.COMPRESSION_LEVELS. brotli and zstandard are optional; without
+them only gzip is offered.
+"""
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from .config import settings
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+def _gzip(data: bytes, level: int) -> bytes:
+    return gzip.compress(data, compresslevel=min(max(level, 1), 9), mtime=0)
+
+
+def _brotli(data: bytes, level: int) -> bytes:
+    return brotli.compress(data, quality=min(max(level, 0), 11))
+
+
+def _zstd(data: bytes, level: int) -> bytes:
+    return zstandard.ZstdCompressor(level=min(max(level, 1), 22)).compress(data)
+
+
+# Encodings in server preference order
+CODECS: "OrderedDict[str, Callable[[bytes, int], bytes]]" = OrderedDict()
+if zstandard is not None:
+    CODECS["zstd"] = _zstd
+if brotli is not None:
+    CODECS["br"] = _brotli
+CODECS["gzip"] = _gzip
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def negotiate(accept_encoding: str, offered=CODECS) -> Optional[str]:
+    """
+    Pick the best of the `offered` encodings (default: every supported
+    one, in server preference order) allowed by an Accept-Encoding header.
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip()] = q
+
+    best, best_q = None, 0.0
+    for encoding in offered:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def level_for(scope) -> int:
+    """Compression level for the route that handled `scope`."""
+    path = getattr(scope.get("route"), "path", None)
+    return settings.COMPRESSION_LEVELS.get(path, settings.COMPRESSION_LEVEL)
+
+
+class ResponseCache:
+    """
+    LRU of serialized JSON bodies and their compressed variants, bounded by
+    total bytes. Keys are tuples whose second element is the session id, so
+    a re-ingested session's entries can be dropped together (in this
+    process; other processes stop using them once the data version changes).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()  # key -> {encoding: body}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, encoding: str) -> Optional[bytes]:
+        with self._lock:
+            variants = self._entries.get(key)
+            if variants is None:
+                return None
+            self._entries.move_to_end(key)
+            return variants.get(encoding)
+
+    def put(self, key: tuple, encoding: str, body: bytes):
+        with self._lock:
+            variants = self._entries.setdefault(key, {})
+            self.size += len(body) - len(variants.get(encoding, b""))
+            variants[encoding] = body
+            self._entries.move_to_end(key)
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= sum(len(b) for b in evicted.values())
+
+    def invalidate_session(self, session_id: int):
+        with self._lock:
+            for key in [k for k in self._entries if len(k) > 1 and k[1] == session_id]:
+                self.size -= sum(len(b) for b in self._entries.pop(key).values())
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_BYTES)
+
+
+def cached_json(request: Request, key: Optional[tuple], build: Callable[[], dict],
+                level: Optional[int] = None) -> Response:
+    """
+    Serve `build()` as JSON, caching the body and its compressed variant
+    under `key`. The key must change whenever the resource does (session
+    routes include the session's data version); with `key` None the
+    response is built and compressed but not cached. Exceptions from
+    `build` (e.g. 404s) propagate and are not cached.
+    """
+    encoding = negotiate(request.headers.get("accept-encoding", "")) or "identity"
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+
+    if key is None:
+        raw = json.dumps(jsonable_encoder(build()), separators=(",", ":")).encode("utf-8")
+        if encoding != "identity":
+            raw = CODECS[encoding](raw, level if level is not None else level_for(request.scope))
+        return Response(raw, media_type="application/json", headers=headers)
+
+    body = response_cache.get(key, encoding)
+    if body is not None:
+        response_cache.hits += 1
+        return Response(body, media_type="application/json", headers=headers)
+    response_cache.misses += 1
+
+    raw = response_cache.get(key, "identity")
+    if raw is None:
+        raw = json.dumps(jsonable_encoder(build()), separators=(",", ":")).encode("utf-8")
+        response_cache.put(key, "identity", raw)
+    if encoding == "identity":
+        return Response(raw, media_type="application/json", headers=headers)
+
+    body = CODECS[encoding](raw, level if level is not None else level_for(request.scope))
+    response_cache.put(key, encoding, body)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing single-chunk responses of compressible types.
+    Streaming responses (file downloads, etc.) and responses that already
+    carry a Content-Encoding pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if (b"content-encoding" in headers
+                        or message["status"] < 200 or message["status"] in (204, 304)
+                        or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming or too small to be worth it: send as is
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = CODECS[encoding](body, level_for(scope))
+            headers = [(k, v) for k, v in start_message["headers"]
+                       if k.lower() not in (b"content-length", b"vary")]
+            headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(compressed)).encode("latin-1")),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
@@ -3,9 +3,54 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     # Default to SQLite for easy development, override with .env for PostgreSQL
     DATABASE_URL: str = "sqlite:///./telemetry.db"
+    # PostgreSQL only: partition telemetrysample by ranges of session ids
+    # (see app/partitioning.py). Enable before the table is first created,
+    # or convert an existing table with partition_telemetry.py
+    TELEMETRY_PARTITIONING: bool = False
+    TELEMETRY_PARTITION_SESSIONS: int = 1000
+    # Log every SQL statement; turn off for load tests and production
+    SQL_ECHO: bool = True
     S3_BUCKET: str = "your-bucket"
     S3_REGION: str = "your-region"
     SECRET_KEY: str = "your-secret-key"
+    # Base position bin for track heatmaps; queries may use any multiple of it
+    HEATMAP_BIN_M: float = 10.0
+    # Pedal thresholds (%) for segment braking points and throttle pickup
+    SEGMENT_BRAKE_THRESHOLD_PCT: float = 10.0
+    SEGMENT_THROTTLE_THRESHOLD_PCT: float = 10.0
+    # Response compression. Levels are clamped to each codec's range
+    # (gzip 1-9, brotli 0-11, zstd 1-22); COMPRESSION_LEVELS overrides the
+    # default per route path. Cached routes compress once, so they can
+    # afford a higher level.
+    COMPRESSION_LEVEL: int = 5
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_LEVELS: dict[str, int] = {
+        "/sessions/{session_id}/telemetry": 9,
+        "/sessions/{session_id}/stats": 9,
+    }
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Ingest admission control: concurrent ingests, uploads allowed to wait
+    # for a slot (more get 429), the Retry-After hint, and the longest an
+    # ingest pauses per insert batch while reads are in flight
+    INGEST_MAX_CONCURRENT: int = 2
+    INGEST_QUEUE_SIZE: int = 8
+    INGEST_RETRY_AFTER_S: int = 10
+    INGEST_READ_YIELD_MAX_S: float = 0.5
+    # Bulk archive uploads (POST /sessions/upload-batch): session files
+    # accepted per archive, their largest (uncompressed from the archive)
+    # size each and in total, and processes decoding them in parallel
+    BATCH_MAX_FILES: int = 200
+    BATCH_MAX_MEMBER_BYTES: int = 256 * 1024 * 1024
+    BATCH_MAX_TOTAL_BYTES: int = 2 * 1024 * 1024 * 1024
+    BATCH_PARSE_WORKERS: int = 2
+    # Lazy ingest (app/lazy_sessions.py): store only the file and session
+    # row at upload unless the upload asks otherwise, and keep up to this
+    # many bytes of parsed lazy sessions in memory. A promotion whose claim
+    # has not been refreshed (once per insert batch) for PROMOTE_STALE_AFTER_S
+    # is taken to have died with its process and can be claimed again
+    INGEST_LAZY: bool = False
+    LAZY_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    PROMOTE_STALE_AFTER_S: int = 600
 
     class Config:
         env_file = ".env"
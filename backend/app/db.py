@@ -1,20 +1,73 @@
+from contextlib import contextmanager
+from pathlib import Path
+from sqlalchemy import text
 from sqlmodel import SQLModel, create_engine
 from .config import settings
+from .partitioning import create_partitioned_table
 import logging
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 logger = logging.getLogger(__name__)
 
-# Use connect_args for SQLite to check_same_thread=False (needed for async)
+# Use connect_args for SQLite to check_same_thread=False (needed for async).
+# With several workers they share one file; wait for the write lock rather
+# than failing immediately with "database is locked".
 connect_args = {}
 if settings.DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
+    connect_args = {"check_same_thread": False, "timeout": 30}
+
+engine = create_engine(settings.DATABASE_URL, echo=settings.SQL_ECHO, connect_args=connect_args)
+
+# Key for the PostgreSQL advisory lock serializing schema creation
+SCHEMA_LOCK_KEY = 0x7E1E_0001
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive inter-process lock on `path`, held for the with block."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
 
-engine = create_engine(settings.DATABASE_URL, echo=True, connect_args=connect_args)
 
 def init_db():
-    """Initialize database tables. Handles errors gracefully."""
+    """
+    Initialize database tables. Handles errors gracefully.
+
+    Every worker calls this on startup, so creation is serialized: by a
+    transaction-scoped advisory lock on PostgreSQL, and by a lock file next
+    to the database on SQLite (which is also switched to WAL so readers in
+    other workers are not blocked by a writer).
+    """
     try:
-        SQLModel.metadata.create_all(engine)
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+                create_partitioned_table(conn)
+                SQLModel.metadata.create_all(conn)
+        elif engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+            with file_lock(Path(engine.url.database + ".init.lock")):
+                SQLModel.metadata.create_all(engine)
+                with engine.connect() as conn:
+                    conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        else:
+            SQLModel.metadata.create_all(engine)
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
@@ -0,0 +1,171 @@
+"""
+Track position heatmaps aggregated across sessions.
+
+Samples are binned on position_m at settings.HEATMAP_BIN_M and the running
+sums/counts per (track, car, bin) are merged into trackheatmapbin as each
+session is ingested. Reads combine those rows into any coarser multiple of
+the base bin width, so they never scan telemetrysample.
+"""
+from sqlalchemy import func, case, cast, update, Integer
+from sqlmodel import Session as DBSession, select, delete
+from .config import settings
+from .models import TelemetrySample, TrackHeatmapBin
+from .stats import PEDAL_ON_PCT
+
+
+class HeatmapAccumulator:
+    """Per-bin aggregates for one session's samples, keyed by (track, car, bin)."""
+
+    def __init__(self, bin_width_m: float = None):
+        self.bin_width_m = bin_width_m or settings.HEATMAP_BIN_M
+        self.bins: dict = {}
+
+    def add(self, sample: dict):
+        if sample.get("in_pitlane"):
+            return
+        position = max(sample.get("position_m", 0.0) or 0.0, 0.0)
+        key = (sample["track"], sample["car"], int(position // self.bin_width_m))
+        speed = sample.get("speed", 0.0) or 0.0
+        brake = sample.get("brake", 0.0) or 0.0
+        b = self.bins.get(key)
+        if b is None:
+            b = self.bins[key] = {
+                "sample_count": 0, "speed_sum": 0.0, "speed_min": speed, "brake_sum": 0.0,
+                "braking_count": 0, "abs_count": 0, "tcs_count": 0,
+            }
+        b["sample_count"] += 1
+        b["speed_sum"] += speed
+        b["speed_min"] = min(b["speed_min"], speed)
+        b["brake_sum"] += brake
+        b["braking_count"] += brake > PEDAL_ON_PCT
+        b["abs_count"] += bool(sample.get("abs"))
+        b["tcs_count"] += bool(sample.get("tcs"))
+
+
+def merge_heatmap(db: DBSession, accumulator: HeatmapAccumulator) -> int:
+    """Add a session's bin aggregates to the stored heatmaps. Does not commit."""
+    width = accumulator.bin_width_m
+    by_track_car: dict = {}
+    for (track, car, index), values in accumulator.bins.items():
+        by_track_car.setdefault((track, car), {})[index] = values
+
+    for (track, car), bins in by_track_car.items():
+        existing = {
+            row.bin_index: row
+            for row in db.exec(
+                select(TrackHeatmapBin).where(
+                    TrackHeatmapBin.track == track,
+                    TrackHeatmapBin.car == car,
+                    TrackHeatmapBin.bin_width_m == width,
+                )
+            )
+        }
+        for index, values in bins.items():
+            row = existing.get(index)
+            if row is None:
+                db.add(TrackHeatmapBin(track=track, car=car, bin_width_m=width, bin_index=index, **values))
+                continue
+            # Add in SQL rather than in Python so increments from ingests
+            # running concurrently in other workers are not lost
+            db.execute(
+                update(TrackHeatmapBin)
+                .where(TrackHeatmapBin.id == row.id)
+                .values(
+                    sample_count=TrackHeatmapBin.sample_count + values["sample_count"],
+                    speed_sum=TrackHeatmapBin.speed_sum + values["speed_sum"],
+                    speed_min=case(
+                        (TrackHeatmapBin.speed_min > values["speed_min"], values["speed_min"]),
+                        else_=TrackHeatmapBin.speed_min,
+                    ),
+                    brake_sum=TrackHeatmapBin.brake_sum + values["brake_sum"],
+                    braking_count=TrackHeatmapBin.braking_count + values["braking_count"],
+                    abs_count=TrackHeatmapBin.abs_count + values["abs_count"],
+                    tcs_count=TrackHeatmapBin.tcs_count + values["tcs_count"],
+                )
+            )
+    return len(accumulator.bins)
+
+
+def rebuild_heatmaps(db: DBSession):
+    """Recompute all heatmap bins from stored samples with one GROUP BY scan."""
+    width = settings.HEATMAP_BIN_M
+    db.exec(delete(TrackHeatmapBin))
+    # Clamp negative positions to 0 before binning, as HeatmapAccumulator does
+    position = case((TelemetrySample.position_m > 0, TelemetrySample.position_m), else_=0.0)
+    bin_index = cast(func.floor(position / width), Integer)
+    rows = db.exec(
+        select(
+            TelemetrySample.track,
+            TelemetrySample.car,
+            bin_index,
+            func.count(),
+            func.sum(TelemetrySample.speed),
+            func.min(TelemetrySample.speed),
+            func.sum(TelemetrySample.brake),
+            func.sum(case((TelemetrySample.brake > PEDAL_ON_PCT, 1), else_=0)),
+            func.sum(case((TelemetrySample.abs, 1), else_=0)),
+            func.sum(case((TelemetrySample.tcs, 1), else_=0)),
+        )
+        .where(TelemetrySample.in_pitlane == False)  # noqa: E712
+        .group_by(TelemetrySample.track, TelemetrySample.car, bin_index)
+    ).all()
+    for track, car, index, count, speed_sum, speed_min, brake_sum, braking, abs_count, tcs_count in rows:
+        db.add(TrackHeatmapBin(
+            track=track, car=car, bin_width_m=width, bin_index=int(index),
+            sample_count=count, speed_sum=speed_sum, speed_min=speed_min, brake_sum=brake_sum,
+            braking_count=braking, abs_count=abs_count, tcs_count=tcs_count,
+        ))
+    db.commit()
+
+
+def read_heatmap(db: DBSession, track: str, car: str = None, bin_m: float = None) -> list:
+    """
+    Heatmap for a track (all cars unless `car` is given) at `bin_m`
+    metres per bin, which must be a multiple of the stored base width.
+    """
+    base = settings.HEATMAP_BIN_M
+    bin_m = bin_m or base
+    factor = int(round(bin_m / base))
+    if factor < 1 or abs(factor * base - bin_m) > 1e-6:
+        raise ValueError(f"bin_m must be a multiple of {base:g}")
+
+    statement = select(TrackHeatmapBin).where(
+        TrackHeatmapBin.track == track,
+        TrackHeatmapBin.bin_width_m == base,
+    )
+    if car:
+        statement = statement.where(TrackHeatmapBin.car == car)
+
+    merged: dict = {}
+    for row in db.exec(statement):
+        index = row.bin_index // factor
+        m = merged.get(index)
+        if m is None:
+            m = merged[index] = {
+                "sample_count": 0, "speed_sum": 0.0, "speed_min": row.speed_min, "brake_sum": 0.0,
+                "braking_count": 0, "abs_count": 0, "tcs_count": 0,
+            }
+        m["sample_count"] += row.sample_count
+        m["speed_sum"] += row.speed_sum
+        m["speed_min"] = min(m["speed_min"], row.speed_min)
+        m["brake_sum"] += row.brake_sum
+        m["braking_count"] += row.braking_count
+        m["abs_count"] += row.abs_count
+        m["tcs_count"] += row.tcs_count
+
+    result = []
+    for index in sorted(merged):
+        m = merged[index]
+        n = m["sample_count"]
+        result.append({
+            "position_from_m": round(index * bin_m, 3),
+            "position_to_m": round((index + 1) * bin_m, 3),
+            "samples": n,
+            "mean_speed": round(m["speed_sum"] / n, 2),
+            "min_speed": round(m["speed_min"], 2),
+            "mean_brake_pct": round(m["brake_sum"] / n, 2),
+            "braking_rate": round(m["braking_count"] / n, 4),
+            "abs_rate": round(m["abs_count"] / n, 4),
+            "tcs_rate": round(m["tcs_count"] / n, 4),
+        })
+    return result
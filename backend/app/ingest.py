@@ -0,0 +1,333 @@
+"""
+Parse uploaded session files into TelemetrySample rows and update the
+tables derived from them.
+
+Decoding (`iter_session_rows`, `stream_session_rows`) is kept free of
+database access; `write_samples` bulk inserts the decoded rows. Uploads and
+re-ingests stream rows from the file into `write_samples`
+(`ingest_session_file`), so memory stays at about one insert batch, and
+several processes may write different sessions at once (the aggregate
+merges retry on conflicts). `parse_session_file` returns the whole file
+as a list, for callers that need it all.
+"""
+import hashlib
+import json
+import traceback
+import uuid
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+from sqlalchemy import insert, delete, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session as DBSession
+from .channels import add_derived_channels, stream_derived_channels
+from .heatmap import HeatmapAccumulator, merge_heatmap, rebuild_heatmaps
+from .laps import LapTracker
+from .leaderboards import update_leaderboards, rebuild_leaderboards
+from .models import Session, TelemetrySample
+from .partitioning import ensure_partition
+from .segments import SegmentTracker, delete_session_segments
+from .stats import invalidate_session_stats
+from .thumbnails import build_thumbnail, delete_session_thumbnail
+from .compression import response_cache
+from .session_files import V2SessionFile, is_v2_file, open_jsonl
+
+# Session.ingest_state values; NULL (sessions from before lazy ingest) means full
+INGEST_FULL = "full"
+INGEST_INGESTING = "ingesting"
+INGEST_LAZY = "lazy"
+INGEST_PROMOTING = "promoting"
+
+# Rows per INSERT statement when bulk writing samples
+INSERT_BATCH_SIZE = 5000
+FILE_CHUNK_SIZE = 1024 * 1024
+# Retries when a concurrent ingest inserts the same aggregate row first
+AGGREGATE_MERGE_ATTEMPTS = 3
+
+
+@dataclass
+class ParsedSession:
+    """Telemetry rows decoded from one session file, ready to insert."""
+    file_path: str
+    rows: list = field(default_factory=list)
+    error_count: int = 0
+    car: Optional[str] = None
+    track: Optional[str] = None
+    duration: Optional[float] = None
+    sha256: Optional[str] = None
+
+
+def upload_file_name(driver_name: str, original_name: str) -> str:
+    """
+    Name under uploads/sessions for an uploaded file. The random part keeps
+    concurrent uploads (possibly in other workers) from colliding.
+    """
+    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    unique = uuid.uuid4().hex[:12]
+    return f"{driver_name.replace(' ', '_')}_{timestamp}_{unique}_{Path(original_name).name}"
+
+
+def save_file(src, dest_path: Path) -> str:
+    """Copy an uploaded file object to `dest_path`, returning its SHA-256 hex digest."""
+    digest = hashlib.sha256()
+    with open(dest_path, "wb") as buffer:
+        while True:
+            chunk = src.read(FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            buffer.write(chunk)
+    return digest.hexdigest()
+
+
+def file_sha256(file_path) -> str:
+    """SHA-256 hex digest of a stored session file."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(FILE_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sample_row(data: dict, car: str, track: str) -> dict:
+    """Map one decoded session file line to TelemetrySample column values."""
+    return {
+        "source": data.get("source", "UNKNOWN"),
+        "car": data.get("car", car),
+        "track": data.get("track", track),
+        "lap": data.get("lap", 0),
+        "segment": data.get("segment", ""),
+        "sector": data.get("sector", 0),
+        "position_m": data.get("position_m", 0.0),
+        "lap_time_s": data.get("lap_time_s", 0.0),
+        "sector_time_s": data.get("sector_time_s", 0.0),
+        "best_lap_time_s": data.get("best_lap_time_s"),
+        "best_sector_1_s": data.get("best_sector_1_s"),
+        "best_sector_2_s": data.get("best_sector_2_s"),
+        "best_sector_3_s": data.get("best_sector_3_s"),
+        "speed": data.get("speed", 0.0),
+        "rpm": data.get("rpm", 0),
+        "throttle": data.get("throttle", 0.0),
+        "brake": data.get("brake", 0.0),
+        "gear": data.get("gear", 0),
+        "steer": data.get("steer", 0.0),
+        "abs": data.get("abs", False),
+        "tcs": data.get("tcs", False),
+        "in_pitlane": data.get("in_pitlane", False),
+        "is_curve": data.get("is_curve", False),
+        "ts": data.get("ts", 0.0),
+    }
+
+
+def iter_session_rows(file_path, car: str, track: str, parsed: ParsedSession) -> Iterator[dict]:
+    """
+    Decode a .jsonl (gzip, zstd, lz4 or plain) or v2 (.tsf) session file
+    into TelemetrySample column dicts, one at a time and without derived
+    channels. `car` and `track` are used for samples that do not carry
+    their own. Invalid lines are counted in `parsed.error_count` and
+    skipped; `parsed.car`, `track` and `duration` are filled in as rows
+    pass (duration is final once the stream is exhausted).
+    """
+    first_ts = None
+    for row in _decode_rows(file_path, car, track, parsed):
+        if parsed.car is None:
+            parsed.car, parsed.track, first_ts = row["car"], row["track"], row["ts"]
+        parsed.duration = row["ts"] - first_ts if first_ts and row["ts"] else None
+        yield row
+
+
+def stream_session_rows(file_path, car: str, track: str, parsed: ParsedSession) -> Iterator[dict]:
+    """
+    iter_session_rows with the derived channels, computed per
+    INSERT_BATCH_SIZE batch: the streaming counterpart of
+    parse_session_file, holding about one insert batch in memory.
+    """
+    return stream_derived_channels(iter_session_rows(file_path, car, track, parsed), INSERT_BATCH_SIZE)
+
+
+def _decode_rows(file_path, car: str, track: str, parsed: ParsedSession) -> Iterator[dict]:
+    try:
+        if is_v2_file(file_path):
+            with V2SessionFile(file_path) as session_file:
+                for data in session_file:
+                    yield sample_row(data, car, track)
+        else:
+            with open_jsonl(file_path) as f:
+                for line_num, line in enumerate(f, 1):
+                    try:
+                        line = line.strip()
+                        if not line:
+                            continue
+
+                        data = json.loads(line)
+                        if not data or not isinstance(data, dict):
+                            continue
+
+                        row = sample_row(data, car, track)
+                    except json.JSONDecodeError as e:
+                        parsed.error_count += 1
+                        if parsed.error_count <= 5:  # Log first 5 JSON errors
+                            print(f"JSON decode error on line {line_num}: {e}")
+                        continue  # Skip invalid JSON lines
+                    except Exception as e:
+                        parsed.error_count += 1
+                        if parsed.error_count <= 5:  # Log first 5 errors
+                            print(f"Error parsing telemetry sample on line {line_num}: {e}")
+                            traceback.print_exc()
+                        continue
+                    yield row
+    except Exception as e:
+        # A truncated or corrupt file still yields the rows read so far
+        print(f"Warning: Failed to parse telemetry samples from {file_path}: {e}")
+        traceback.print_exc()
+
+
+def parse_session_file(file_path, car: str = "Unknown", track: str = "Unknown") -> ParsedSession:
+    """
+    Decode a session file (see iter_session_rows) into a list of
+    TelemetrySample column dicts, including the derived channels from
+    app/channels.py, with the file's hash, car, track and duration.
+    """
+    parsed = ParsedSession(file_path=str(file_path))
+    try:
+        parsed.sha256 = file_sha256(file_path)
+    except OSError as e:
+        print(f"Warning: Failed to hash {file_path}: {e}")
+    parsed.rows = list(iter_session_rows(file_path, car, track, parsed))
+    add_derived_channels(parsed.rows)
+    return parsed
+
+
+def merge_aggregate(db: DBSession, name: str, session_id: int, merge: Callable[[], object]):
+    """
+    Run and commit one cross-session aggregate update. Another worker may
+    insert the same leaderboard or heatmap row first; the unique constraint
+    then fails the commit and the merge is retried against the new row.
+    Other failures are reported but do not fail the ingest.
+    """
+    for _ in range(AGGREGATE_MERGE_ATTEMPTS):
+        try:
+            merge()
+            db.commit()
+            return
+        except IntegrityError:
+            db.rollback()
+        except Exception as e:
+            db.rollback()
+            print(f"Warning: Failed to update {name} for session {session_id}: {e}")
+            return
+    print(f"Warning: Failed to update {name} for session {session_id}: concurrent updates kept conflicting")
+
+
+def write_samples(db: DBSession, session: Session, rows: Iterable[dict], update_aggregates: bool = True,
+                  pause: Optional[Callable[[], None]] = None) -> int:
+    """
+    Bulk insert parsed rows (a list, or any iterable such as a stream from
+    the file) for `session` along with its per-lap segment rows and listing
+    thumbnail and, unless `update_aggregates` is False, merge it into the
+    cross-session tables (leaderboards and track heatmaps). Commits per
+    batch of INSERT_BATCH_SIZE rows, calling `pause` (if given) before each
+    one; returns the number of rows written.
+    """
+    session_id = session.id
+    ensure_partition(db, session_id)
+    tracker = LapTracker()
+    heatmap = HeatmapAccumulator()
+    segments = SegmentTracker(session_id)
+    speeds = array("d")  # for the thumbnail
+    written = 0
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, INSERT_BATCH_SIZE))
+        if not batch:
+            break
+        if pause is not None:
+            pause()
+        for row in batch:
+            row["session_id"] = session_id
+            tracker.add(row)
+            heatmap.add(row)
+            segments.add(row)
+            speeds.append(row["speed"] or 0.0)
+        db.execute(insert(TelemetrySample), batch)
+        db.commit()
+        written += len(batch)
+
+    db.add_all(segments.segments)
+    db.merge(build_thumbnail(session_id, speeds, tracker.laps))
+    db.commit()
+
+    if update_aggregates:
+        merge_aggregate(db, "leaderboards", session_id, lambda: update_leaderboards(db, session, tracker.laps))
+        merge_aggregate(db, "track heatmap", session_id, lambda: merge_heatmap(db, heatmap))
+
+    return written
+
+
+def ingest_session_file(db: DBSession, session: Session, file_path: Path,
+                        pause: Optional[Callable[[], None]] = None) -> tuple[int, int]:
+    """
+    Parse a session file into telemetry samples for `session` (created in
+    the "ingesting" state) and update the derived tables, then mark it
+    fully ingested. Rows are streamed from the file into write_samples, so
+    memory stays at about one insert batch whatever the file size. `pause`
+    is passed on to write_samples. Returns (sample_count, error_count).
+    """
+    parsed = ParsedSession(file_path=str(file_path))
+    rows = stream_session_rows(file_path, session.car, session.track, parsed)
+    sample_count = 0
+    try:
+        sample_count = write_samples(db, session, rows, pause=pause)
+    except Exception as e:
+        # If storing telemetry fails, still keep the session
+        db.rollback()
+        print(f"Warning: Failed to store telemetry samples: {e}")
+        traceback.print_exc()
+    finish_ingest(db, session.id)
+
+    if sample_count > 0:
+        print(f"Successfully stored {sample_count} telemetry samples for session {session.id}")
+    else:
+        print(f"Warning: No telemetry samples found in file {file_path}")
+    return sample_count, parsed.error_count
+
+
+def finish_ingest(db: DBSession, session_id: int):
+    """
+    Mark a session's samples as written: set it to full and bump its
+    data_version, so response cache entries keyed by the old version (in
+    any process) are no longer used. Commits.
+    """
+    db.execute(
+        update(Session)
+        .where(Session.id == session_id)
+        .values(ingest_state=INGEST_FULL, data_version=func.coalesce(Session.data_version, 0) + 1)
+    )
+    db.commit()
+    invalidate_session_stats(session_id)
+    response_cache.invalidate_session(session_id)
+
+
+def cache_version(session: Session) -> Optional[int]:
+    """Version of the session's data for cache keys; None while it is being ingested (do not cache)."""
+    if session.ingest_state == INGEST_INGESTING:
+        return None
+    return session.data_version or 0
+
+
+def delete_session_samples(db: DBSession, session_id: int):
+    """Remove a session's telemetry and per-session derived rows before it is re-ingested. Does not commit."""
+    db.execute(delete(TelemetrySample).where(TelemetrySample.session_id == session_id))
+    delete_session_segments(db, session_id)
+    delete_session_thumbnail(db, session_id)
+    invalidate_session_stats(session_id)
+    response_cache.invalidate_session(session_id)
+
+
+def rebuild_aggregates(db: DBSession):
+    """Recompute the cross-session tables that write_samples maintains incrementally."""
+    rebuild_leaderboards(db)
+    rebuild_heatmaps(db)
@@ -0,0 +1,63 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+@dataclass
+class CompletedLap:
+    lap: int
+    lap_time_s: float
+    sector_times: dict = field(default_factory=dict)  # sector number -> seconds
+    in_pitlane: bool = False
+
+
+class LapTracker:
+    """
+    Detect completed laps and sectors from a stream of telemetry samples.
+
+    Samples carry the running `lap_time_s` / `sector_time_s` of the current
+    lap and sector, so a lap (or sector) is complete when the next sample
+    belongs to a different one; its time is the last running value seen.
+    Memory use is constant apart from the list of completed laps.
+    """
+
+    def __init__(self):
+        self.laps: list[CompletedLap] = []
+        self._lap: Optional[int] = None
+        self._sector: Optional[int] = None
+        self._last_lap_time = 0.0
+        self._last_sector_time = 0.0
+        self._sectors: dict = {}
+        self._in_pitlane = False
+
+    def add(self, sample: dict):
+        lap = sample.get("lap", 0)
+        sector = sample.get("sector", 0)
+
+        if self._lap is not None and lap != self._lap:
+            self._close_sector()
+            if lap > self._lap and self._last_lap_time > 0:
+                self.laps.append(CompletedLap(
+                    lap=self._lap,
+                    lap_time_s=self._last_lap_time,
+                    sector_times=self._sectors,
+                    in_pitlane=self._in_pitlane,
+                ))
+            self._sectors = {}
+            self._in_pitlane = False
+        elif self._sector is not None and sector != self._sector:
+            self._close_sector()
+
+        self._lap = lap
+        self._sector = sector
+        self._last_lap_time = sample.get("lap_time_s", 0.0) or 0.0
+        self._last_sector_time = sample.get("sector_time_s", 0.0) or 0.0
+        self._in_pitlane = self._in_pitlane or bool(sample.get("in_pitlane", False))
+
+    def _close_sector(self):
+        if self._sector and self._last_sector_time > 0:
+            self._sectors[self._sector] = self._last_sector_time
+
+    @property
+    def valid_laps(self) -> list[CompletedLap]:
+        """Completed laps that did not touch the pitlane."""
+        return [lap for lap in self.laps if not lap.in_pitlane]
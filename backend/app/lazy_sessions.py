@@ -0,0 +1,266 @@
+"""
+Lazy ingest: keep only the uploaded file and the session row, and expand
+the file on first read.
+
+A lazy session has no TelemetrySample rows (and so no segments, leaderboard
+or heatmap contributions). Its telemetry is parsed from the file into
+per-field NumPy arrays, ordered by ts like the database path, and kept in
+an LRU bounded by total bytes. Sample ids are the sample's 1-based
+position among the file's valid samples, in file order (blank and invalid
+lines are not counted), since there are no rows to number them.
+
+Sessions that turn out to be read often can be promoted to a full ingest
+with POST /sessions/{id}/promote. Both the columns and a promotion are
+streamed from the file, one insert batch of row dicts at a time.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+import numpy as np
+from sqlalchemy import or_, update
+from sqlmodel import Session as DBSession
+from .config import settings
+from .ingest import (
+    INGEST_FULL, INGEST_LAZY, INGEST_PROMOTING, INSERT_BATCH_SIZE, ParsedSession,
+    stream_session_rows, write_samples, delete_session_samples, finish_ingest,
+)
+from .models import Session
+from .schemas import TELEMETRY_API_FIELDS
+
+FIELD_DTYPES = {
+    "id": np.int32,
+    "lap": np.int32,
+    "sector": np.int8,
+    "rpm": np.int32,
+    "gear": np.int8,
+    "abs": np.bool_,
+    "tcs": np.bool_,
+    "brake_event": np.int8,
+    "throttle_event": np.int8,
+}
+
+
+def is_lazy(session: Session) -> bool:
+    """Whether the session's telemetry is read from its file rather than the database."""
+    return session.ingest_state in (INGEST_LAZY, INGEST_PROMOTING)
+
+
+class ColumnarSession:
+    """One session's API fields as parallel arrays, ordered by ts."""
+
+    def __init__(self, columns: dict):
+        self.columns = columns
+        self.nbytes = sum(c.nbytes for c in columns.values())
+
+    def __len__(self) -> int:
+        return len(self.columns["ts"])
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict]) -> "ColumnarSession":
+        """
+        Columns of parsed rows; ids number the rows from 1 in file order.
+        `rows` may be a stream: it is converted INSERT_BATCH_SIZE rows at a time.
+        """
+        chunks: dict = {name: [] for name in TELEMETRY_API_FIELDS}
+        rows = iter(rows)
+        count = 0
+        while True:
+            batch = list(islice(rows, INSERT_BATCH_SIZE))
+            if not batch:
+                break
+            for row in batch:
+                count += 1
+                row["id"] = count
+            for name in TELEMETRY_API_FIELDS:
+                dtype = FIELD_DTYPES.get(name, np.float64)
+                chunks[name].append(np.fromiter((r[name] or 0 for r in batch), dtype=dtype, count=len(batch)))
+
+        columns = {
+            name: np.concatenate(parts) if parts else np.zeros(0, dtype=FIELD_DTYPES.get(name, np.float64))
+            for name, parts in chunks.items()
+        }
+        order = np.argsort(columns["ts"], kind="stable")
+        return cls({name: values[order] for name, values in columns.items()})
+
+    def select(self, limit: int, offset: int, lap: Optional[int] = None, laps: Optional[tuple] = None,
+               ts_from: Optional[float] = None, ts_to: Optional[float] = None,
+               position_from: Optional[float] = None, position_to: Optional[float] = None) -> list[dict]:
+        """Samples matching the telemetry endpoint's filters, as API dicts."""
+        c = self.columns
+        mask = np.ones(len(self), dtype=bool)
+        if lap is not None:
+            mask &= c["lap"] == lap
+        elif laps is not None:
+            mask &= (c["lap"] >= laps[0]) & (c["lap"] <= laps[1])
+        if ts_from is not None:
+            mask &= c["ts"] >= ts_from
+        if ts_to is not None:
+            mask &= c["ts"] <= ts_to
+        position = c["position_m"]
+        if position_from is not None and position_to is not None and position_from > position_to:
+            mask &= (position >= position_from) | (position <= position_to)
+        else:
+            if position_from is not None:
+                mask &= position >= position_from
+            if position_to is not None:
+                mask &= position <= position_to
+
+        index = np.flatnonzero(mask)[offset:offset + limit]
+        values = [c[name][index].tolist() for name in TELEMETRY_API_FIELDS]
+        return [dict(zip(TELEMETRY_API_FIELDS, sample)) for sample in zip(*values)]
+
+
+class SessionLRU:
+    """
+    Parsed lazy sessions, least recently used evicted first once the total
+    exceeds `max_bytes`. A session larger than the whole budget is parsed
+    for each read and never cached. Concurrent misses on one session parse
+    the file once.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds_sum = 0.0
+        self._entries: OrderedDict = OrderedDict()  # session id -> ColumnarSession
+        self._loading: dict = {}  # session id -> lock held while parsing
+        self._lock = threading.Lock()
+
+    def get(self, session_id: int, load: Callable[[], ColumnarSession]) -> ColumnarSession:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            loading = self._loading.setdefault(session_id, threading.Lock())
+
+        with loading:
+            with self._lock:
+                entry = self._entries.get(session_id)
+            if entry is not None:
+                return entry
+            started = time.perf_counter()
+            try:
+                entry = load()
+            finally:
+                with self._lock:
+                    self._loading.pop(session_id, None)
+            with self._lock:
+                self.load_seconds_sum += time.perf_counter() - started
+                if entry.nbytes <= self.max_bytes:
+                    self._entries[session_id] = entry
+                    self.size += entry.nbytes
+                    while self.size > self.max_bytes:
+                        _, evicted = self._entries.popitem(last=False)
+                        self.size -= evicted.nbytes
+                        self.evictions += 1
+            return entry
+
+    def invalidate(self, session_id: int):
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self.size -= entry.nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+lazy_cache = SessionLRU(settings.LAZY_CACHE_MAX_BYTES)
+
+
+def session_columns(session: Session, upload_dir: Path) -> ColumnarSession:
+    """
+    The lazy session's telemetry, from the cache or parsed from its file.
+    Parsing takes a while for a large file, so call it off the event loop.
+    """
+    if not session.file_name or not (upload_dir / session.file_name).is_file():
+        raise FileNotFoundError(f"Session file not found for session {session.id}")
+    file_path = upload_dir / session.file_name
+    return lazy_cache.get(
+        session.id,
+        lambda: ColumnarSession.from_rows(
+            stream_session_rows(file_path, session.car, session.track, ParsedSession(file_path=str(file_path)))
+        ),
+    )
+
+
+def promote_session(db: DBSession, session: Session, file_path: Path,
+                    pause: Optional[Callable[[], None]] = None) -> Optional[int]:
+    """
+    Fully ingest a lazy session: stream its samples from the file into the
+    database and merge it into the cross-session tables. The session is
+    claimed with a conditional update, so concurrent promotions (possibly
+    in other workers) ingest it once. The claim is refreshed with every
+    insert batch; one left stale for PROMOTE_STALE_AFTER_S (its process
+    died) is taken over, dropping the samples it wrote. Returns the sample
+    count, or None if it was not lazy or is being promoted.
+    """
+    claimed = db.execute(
+        update(Session)
+        .where(Session.id == session.id, Session.ingest_state == INGEST_LAZY)
+        .values(ingest_state=INGEST_PROMOTING, ingest_claimed_at=datetime.utcnow())
+    ).rowcount
+    if not claimed:
+        stale_before = datetime.utcnow() - timedelta(seconds=settings.PROMOTE_STALE_AFTER_S)
+        claimed = db.execute(
+            update(Session)
+            .where(Session.id == session.id, Session.ingest_state == INGEST_PROMOTING,
+                   or_(Session.ingest_claimed_at.is_(None), Session.ingest_claimed_at < stale_before))
+            .values(ingest_claimed_at=datetime.utcnow())
+        ).rowcount
+        if claimed:
+            delete_session_samples(db, session.id)
+    db.commit()
+    if not claimed:
+        return None
+
+    def refresh_claim():
+        # Committed with the insert batch that follows
+        db.execute(update(Session).where(Session.id == session.id).values(ingest_claimed_at=datetime.utcnow()))
+        if pause is not None:
+            pause()
+
+    try:
+        rows = stream_session_rows(file_path, session.car, session.track, ParsedSession(file_path=str(file_path)))
+        sample_count = write_samples(db, session, rows, pause=refresh_claim)
+    except BaseException:
+        # write_samples commits per batch; drop what it wrote and stay lazy
+        db.rollback()
+        delete_session_samples(db, session.id)
+        db.execute(update(Session).where(Session.id == session.id).values(ingest_state=INGEST_LAZY))
+        db.commit()
+        raise
+    finish_ingest(db, session.id)
+    lazy_cache.invalidate(session.id)
+    return sample_count
+
+
+def render_metrics() -> str:
+    """Lazy session cache metrics in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str, value):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+
+    c = lazy_cache
+    metric("telemetry_lazy_cache_sessions", "gauge", "Lazy sessions held parsed in memory.", len(c))
+    metric("telemetry_lazy_cache_bytes", "gauge", "Bytes held by parsed lazy sessions.", c.size)
+    metric("telemetry_lazy_cache_max_bytes", "gauge", "Byte budget of the lazy session cache.", c.max_bytes)
+    metric("telemetry_lazy_cache_hits_total", "counter", "Lazy session reads served from memory.", c.hits)
+    metric("telemetry_lazy_cache_misses_total", "counter", "Lazy session reads that parsed the file.", c.misses)
+    metric("telemetry_lazy_cache_evictions_total", "counter", "Parsed lazy sessions evicted.", c.evictions)
+    metric("telemetry_lazy_cache_load_seconds_total", "counter", "Time spent parsing lazy session files.",
+           f"{c.load_seconds_sum:.6f}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,130 @@
+"""
+Materialized leaderboards: best lap and best sector per driver/car/track.
+
+The tables are updated incrementally from the laps completed in each
+ingested session, so reading a leaderboard never touches telemetrysample.
+`rebuild_leaderboards` recomputes everything from the stored samples.
+Improvements are applied with conditional UPDATEs, so concurrent ingests
+in several workers cannot replace a faster time with a slower one.
+"""
+from sqlalchemy import update
+from sqlmodel import Session as DBSession, select, delete
+from .laps import LapTracker, CompletedLap
+from .models import Session, TelemetrySample, LeaderboardLap, LeaderboardSector
+
+
+def update_leaderboards(db: DBSession, session: Session, laps: list[CompletedLap]) -> int:
+    """
+    Merge a session's completed laps into the leaderboard tables.
+    Laps that touched the pitlane are ignored. Returns the number of
+    leaderboard rows that were inserted or improved. Does not commit.
+    """
+    best_lap = None
+    best_sectors: dict = {}
+    for lap in laps:
+        if lap.in_pitlane:
+            continue
+        if best_lap is None or lap.lap_time_s < best_lap.lap_time_s:
+            best_lap = lap
+        for sector, sector_time in lap.sector_times.items():
+            if sector not in best_sectors or sector_time < best_sectors[sector][0]:
+                best_sectors[sector] = (sector_time, lap.lap)
+
+    changed = 0
+    if best_lap is not None:
+        row = db.exec(
+            select(LeaderboardLap).where(
+                LeaderboardLap.track == session.track,
+                LeaderboardLap.car == session.car,
+                LeaderboardLap.driver_name == session.driver_name,
+            )
+        ).first()
+        if row is None:
+            row = LeaderboardLap(
+                track=session.track,
+                car=session.car,
+                driver_name=session.driver_name,
+                lap_time_s=best_lap.lap_time_s,
+                session_id=session.id,
+                lap=best_lap.lap,
+                set_at=session.upload_time,
+            )
+            db.add(row)
+            changed += 1
+        elif best_lap.lap_time_s < row.lap_time_s:
+            # Conditional UPDATE so a faster time written concurrently by
+            # another worker is never overwritten with a slower one
+            changed += db.execute(
+                update(LeaderboardLap)
+                .where(LeaderboardLap.id == row.id, LeaderboardLap.lap_time_s > best_lap.lap_time_s)
+                .values(lap_time_s=best_lap.lap_time_s, session_id=session.id,
+                        lap=best_lap.lap, set_at=session.upload_time)
+            ).rowcount
+
+    for sector, (sector_time, lap_number) in best_sectors.items():
+        row = db.exec(
+            select(LeaderboardSector).where(
+                LeaderboardSector.track == session.track,
+                LeaderboardSector.car == session.car,
+                LeaderboardSector.driver_name == session.driver_name,
+                LeaderboardSector.sector == sector,
+            )
+        ).first()
+        if row is None:
+            db.add(LeaderboardSector(
+                track=session.track,
+                car=session.car,
+                driver_name=session.driver_name,
+                sector=sector,
+                sector_time_s=sector_time,
+                session_id=session.id,
+                lap=lap_number,
+                set_at=session.upload_time,
+            ))
+            changed += 1
+        elif sector_time < row.sector_time_s:
+            changed += db.execute(
+                update(LeaderboardSector)
+                .where(LeaderboardSector.id == row.id, LeaderboardSector.sector_time_s > sector_time)
+                .values(sector_time_s=sector_time, session_id=session.id,
+                        lap=lap_number, set_at=session.upload_time)
+            ).rowcount
+
+    return changed
+
+
+def rebuild_leaderboards(db: DBSession) -> int:
+    """
+    Recompute both leaderboard tables from stored telemetry samples.
+    Used for backfilling; reads each session's samples once, in ts order.
+    Returns the number of sessions processed.
+    """
+    db.exec(delete(LeaderboardLap))
+    db.exec(delete(LeaderboardSector))
+    db.commit()
+
+    sessions = db.exec(select(Session).order_by(Session.id)).all()
+    for session in sessions:
+        tracker = LapTracker()
+        rows = db.exec(
+            select(
+                TelemetrySample.lap,
+                TelemetrySample.sector,
+                TelemetrySample.lap_time_s,
+                TelemetrySample.sector_time_s,
+                TelemetrySample.in_pitlane,
+            )
+            .where(TelemetrySample.session_id == session.id)
+            .order_by(TelemetrySample.ts)
+        )
+        for lap, sector, lap_time_s, sector_time_s, in_pitlane in rows:
+            tracker.add({
+                "lap": lap,
+                "sector": sector,
+                "lap_time_s": lap_time_s,
+                "sector_time_s": sector_time_s,
+                "in_pitlane": in_pitlane,
+            })
+        update_leaderboards(db, session, tracker.laps)
+        db.commit()
+    return len(sessions)
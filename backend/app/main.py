@@ -1,8 +1,12 @@
 from fastapi import FastAPI
-from .routers import auth, sessions
+from .routers import auth, sessions, leaderboards, tracks, metrics
 from .db import init_db
+from .compression import CompressionMiddleware
+from .admission import ReadPriorityMiddleware
 
 app = FastAPI(title="Telemetry Backend")
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ReadPriorityMiddleware)
 
 # Initialize database on startup
 @app.on_event("startup")
@@ -11,6 +15,9 @@ def on_startup():
 
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(sessions.router, prefix="/sessions", tags=["Sessions"])
+app.include_router(leaderboards.router, prefix="/leaderboards", tags=["Leaderboards"])
+app.include_router(tracks.router, prefix="/tracks", tags=["Tracks"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 @app.get("/")
 def root():
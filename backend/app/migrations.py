@@ -0,0 +1,352 @@
+"""
+Registered schema migrations with batched online backfills.
+
+A migration is an ordered list of idempotent steps:
+
+    AddColumn    adds a nullable column, which is a catalog-only change on
+                 both SQLite and PostgreSQL (no table rewrite, no long lock)
+    CreateTable  creates a new model's table if it does not exist
+    CreateIndex  builds an index, CONCURRENTLY on PostgreSQL
+    Backfill     fills values in bounded ranges of a key column, one short
+                 transaction per range, sleeping between ranges so a live
+                 server keeps its share of the database
+
+Progress is stored in schema_migration: the next step to run and, inside a
+backfill, the last key range committed. An interrupted run resumes where it
+stopped, and runs are serialized by an advisory lock (PostgreSQL) or a lock
+file (SQLite).
+
+New migrations are appended to MIGRATIONS; `migrate.py` runs the pending ones.
+"""
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+from sqlalchemy import inspect, text, Boolean, DateTime, Float, Integer, String
+from sqlalchemy.types import TypeEngine
+from sqlmodel import Session as DBSession, SQLModel, select
+from .channels import backfill_session_channels
+from .db import engine, file_lock
+from .models import SchemaMigration, SessionThumbnail
+from .partitioning import is_partitioned
+from .thumbnails import backfill_session_thumbnails
+
+DEFAULT_BATCH_SIZE = 10_000
+DEFAULT_THROTTLE_S = 0.05
+MIGRATION_LOCK_KEY = 0x7E1E_0002
+
+
+@dataclass
+class MigrationContext:
+    """Run-wide options shared by the steps."""
+    batch_size: int = DEFAULT_BATCH_SIZE
+    throttle_s: float = DEFAULT_THROTTLE_S
+    log: Callable[[str], None] = print
+
+
+@dataclass
+class AddColumn:
+    table: str
+    column: str
+    type_: TypeEngine
+
+    def describe(self) -> str:
+        return f"add column {self.table}.{self.column}"
+
+    def run(self, ctx: MigrationContext, progress: "Progress"):
+        if self.column in {c["name"] for c in inspect(engine).get_columns(self.table)}:
+            ctx.log(f"  ✓ {self.table}.{self.column} already exists")
+            return
+        type_sql = self.type_.compile(dialect=engine.dialect)
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {self.table} ADD COLUMN {self.column} {type_sql}"))
+        ctx.log(f"  ✓ Added {self.table}.{self.column} {type_sql}")
+
+
+@dataclass
+class CreateTable:
+    model: type
+
+    def describe(self) -> str:
+        return f"create table {self.model.__tablename__}"
+
+    def run(self, ctx: MigrationContext, progress: "Progress"):
+        SQLModel.metadata.create_all(engine, tables=[self.model.__table__])
+        ctx.log(f"  ✓ Table {self.model.__tablename__}")
+
+
+@dataclass
+class CreateIndex:
+    name: str
+    table: str
+    columns: tuple
+
+    def describe(self) -> str:
+        return f"create index {self.name} on {self.table} ({', '.join(self.columns)})"
+
+    def run(self, ctx: MigrationContext, progress: "Progress"):
+        columns = ", ".join(self.columns)
+        if engine.dialect.name == "postgresql":
+            # CONCURRENTLY builds without blocking writes but cannot run in a
+            # transaction; a failed build leaves an INVALID index, dropped here
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                invalid = conn.execute(text(
+                    "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE c.relname = :name AND NOT i.indisvalid"
+                ), {"name": self.name}).first()
+                if invalid:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY {self.name}"))
+                if is_partitioned(conn, self.table):
+                    # Not supported on partitioned tables; each partition
+                    # still gets its own index
+                    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table} ({columns})"))
+                else:
+                    conn.execute(text(
+                        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {self.table} ({columns})"
+                    ))
+        else:
+            with engine.begin() as conn:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table} ({columns})"))
+        ctx.log(f"  ✓ Index {self.name}")
+
+
+@dataclass
+class Backfill:
+    """
+    Fill rows in ranges of `key`. Either give `set` (column -> SQL
+    expression) with a `where` condition selecting the rows still to fill,
+    or an `apply(conn, low, high) -> rows` callable for values computed in
+    Python; both handle the half-open key range (low, high].
+    """
+    table: str
+    set: dict = field(default_factory=dict)
+    where: Optional[str] = None
+    apply: Optional[Callable] = None
+    key: str = "id"
+    batch_size: Optional[int] = None  # overrides the run-wide batch size
+
+    def describe(self) -> str:
+        target = ", ".join(self.set) if self.set else getattr(self.apply, "__name__", "values")
+        return f"backfill {self.table}.{target} in batches of {self.key}"
+
+    def update_batch(self, conn, low: int, high: int) -> int:
+        if self.apply is not None:
+            return self.apply(conn, low, high) or 0
+        assignments = ", ".join(f"{column} = {expression}" for column, expression in self.set.items())
+        condition = f" AND ({self.where})" if self.where else ""
+        return conn.execute(text(
+            f"UPDATE {self.table} SET {assignments} "
+            f"WHERE {self.key} > :low AND {self.key} <= :high{condition}"
+        ), {"low": low, "high": high}).rowcount
+
+    def run(self, ctx: MigrationContext, progress: "Progress"):
+        with engine.connect() as conn:
+            low_key, high_key = conn.execute(
+                text(f"SELECT min({self.key}), max({self.key}) FROM {self.table}")
+            ).first()
+            pending = True
+            if self.where and progress.last_key is None:
+                pending = conn.execute(
+                    text(f"SELECT 1 FROM {self.table} WHERE {self.where} LIMIT 1")
+                ).first() is not None
+        if high_key is None or not pending:
+            ctx.log(f"  ✓ Nothing to backfill in {self.table}")
+            return
+
+        batch = self.batch_size or ctx.batch_size
+        low = progress.last_key if progress.last_key is not None else low_key - 1
+        if progress.last_key is not None:
+            ctx.log(f"  Resuming after {self.key} {low}")
+        started = time.perf_counter()
+        updated = 0
+        while low < high_key:
+            high = low + batch
+            with engine.begin() as conn:
+                updated += self.update_batch(conn, low, high)
+                progress.checkpoint(conn, last_key=high)
+            low = high
+            done = min(1.0, (low - low_key + 1) / (high_key - low_key + 1))
+            elapsed = time.perf_counter() - started
+            sys.stderr.write(f"\r  {done:6.1%} | {updated:,} rows | "
+                             f"{updated / elapsed if elapsed else 0:,.0f} rows/s")
+            sys.stderr.flush()
+            if ctx.throttle_s:
+                time.sleep(ctx.throttle_s)
+        sys.stderr.write("\n")
+        ctx.log(f"  ✓ Backfilled {updated:,} rows")
+
+
+@dataclass
+class Migration:
+    name: str
+    description: str
+    steps: list
+
+
+class Progress:
+    """A migration's schema_migration row."""
+
+    def __init__(self, name: str):
+        self.name = name
+        with DBSession(engine) as db:
+            row = db.get(SchemaMigration, name)
+            if row is None:
+                row = SchemaMigration(name=name)
+                db.add(row)
+                db.commit()
+                db.refresh(row)
+            self.step, self.last_key, self.applied_at = row.step, row.last_key, row.applied_at
+
+    def checkpoint(self, conn, step: Optional[int] = None, last_key: Optional[int] = None,
+                   applied: bool = False):
+        """Record progress on `conn`, inside the caller's transaction."""
+        if step is not None:
+            self.step = step
+        self.last_key = last_key
+        if applied:
+            self.applied_at = datetime.utcnow()
+        conn.execute(
+            text("UPDATE schema_migration SET step = :step, last_key = :last_key, "
+                 "applied_at = :applied_at WHERE name = :name"),
+            {"step": self.step, "last_key": self.last_key, "applied_at": self.applied_at, "name": self.name},
+        )
+
+
+@contextmanager
+def migration_lock():
+    """Keep two migration runs from interleaving."""
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    elif engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+        with file_lock(Path(engine.url.database + ".migrate.lock")):
+            yield
+    else:
+        yield
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        name="0001_add_abs_tcs",
+        description="ABS and TCS flags on telemetry samples",
+        steps=[
+            AddColumn("telemetrysample", "abs", Boolean()),
+            AddColumn("telemetrysample", "tcs", Boolean()),
+            Backfill("telemetrysample", set={"abs": "FALSE", "tcs": "FALSE"},
+                     where="abs IS NULL OR tcs IS NULL"),
+        ],
+    ),
+    Migration(
+        name="0002_add_session_file_columns",
+        description="Uploaded file name and content hash on sessions",
+        steps=[
+            AddColumn("session", "file_name", String()),
+            AddColumn("session", "file_sha256", String()),
+            CreateIndex("ix_session_file_name", "session", ("file_name",)),
+            CreateIndex("ix_session_file_sha256", "session", ("file_sha256",)),
+        ],
+    ),
+    Migration(
+        name="0003_add_derived_channels",
+        description="Acceleration, lateral load, distance and pedal events on telemetry samples",
+        steps=[
+            AddColumn("telemetrysample", "long_accel_g", Float()),
+            AddColumn("telemetrysample", "lat_load_g", Float()),
+            AddColumn("telemetrysample", "distance_m", Float()),
+            AddColumn("telemetrysample", "brake_event", Integer()),
+            AddColumn("telemetrysample", "throttle_event", Integer()),
+            # Channels depend on neighbouring samples, so fill whole sessions
+            Backfill("session", apply=backfill_session_channels, batch_size=1),
+        ],
+    ),
+    Migration(
+        name="0004_telemetry_range_indexes",
+        description="Indexes for lap, time window and track position queries",
+        steps=[
+            CreateIndex("ix_telemetrysample_session_lap_ts", "telemetrysample", ("session_id", "lap", "ts")),
+            CreateIndex("ix_telemetrysample_session_position", "telemetrysample", ("session_id", "position_m")),
+        ],
+    ),
+    Migration(
+        name="0005_add_session_ingest_state",
+        description="Lazy ingest state on sessions",
+        steps=[
+            # NULL reads as full, so existing sessions need no backfill
+            AddColumn("session", "ingest_state", String()),
+        ],
+    ),
+    Migration(
+        name="0006_session_thumbnails",
+        description="Speed sparkline and lap times for session listings",
+        steps=[
+            CreateTable(SessionThumbnail),
+            Backfill("session", apply=backfill_session_thumbnails, batch_size=50),
+        ],
+    ),
+    Migration(
+        name="0007_session_data_version",
+        description="Data version on sessions for response cache keys",
+        steps=[
+            # NULL reads as version 0
+            AddColumn("session", "data_version", Integer()),
+        ],
+    ),
+    Migration(
+        name="0008_session_ingest_claimed_at",
+        description="Claim time of lazy session promotions, to recover abandoned ones",
+        steps=[
+            AddColumn("session", "ingest_claimed_at", DateTime()),
+        ],
+    ),
+]
+
+
+def migration_status() -> list[dict]:
+    SQLModel.metadata.create_all(engine, tables=[SchemaMigration.__table__])
+    with DBSession(engine) as db:
+        rows = {row.name: row for row in db.exec(select(SchemaMigration)).all()}
+    status = []
+    for migration in MIGRATIONS:
+        row = rows.get(migration.name)
+        status.append({
+            "name": migration.name,
+            "description": migration.description,
+            "applied_at": row.applied_at if row else None,
+            "step": row.step if row else 0,
+            "steps": len(migration.steps),
+        })
+    return status
+
+
+def run_migrations(only: Optional[list] = None, ctx: Optional[MigrationContext] = None) -> int:
+    """Run pending migrations (or just those named in `only`). Returns how many were applied."""
+    ctx = ctx or MigrationContext()
+    SQLModel.metadata.create_all(engine, tables=[SchemaMigration.__table__])
+    applied = 0
+    with migration_lock():
+        for migration in MIGRATIONS:
+            if only and migration.name not in only:
+                continue
+            progress = Progress(migration.name)
+            if progress.applied_at is not None:
+                continue
+            ctx.log(f"{migration.name}: {migration.description}")
+            for index in range(progress.step, len(migration.steps)):
+                step = migration.steps[index]
+                ctx.log(f" [{index + 1}/{len(migration.steps)}] {step.describe()}")
+                step.run(ctx, progress)
+                with engine.begin() as conn:
+                    progress.checkpoint(conn, step=index + 1, last_key=None,
+                                        applied=index + 1 == len(migration.steps))
+            if not migration.steps:
+                with engine.begin() as conn:
+                    progress.checkpoint(conn, applied=True)
+            applied += 1
+    return applied
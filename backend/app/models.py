@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import UniqueConstraint, Index
 from datetime import datetime
 from typing import Optional
 
@@ -9,11 +10,27 @@ class Session(SQLModel, table=True):
     track: str
     duration: float
     upload_time: datetime = Field(default_factory=datetime.utcnow)
+    file_name: Optional[str] = Field(default=None, index=True)  # name under uploads/sessions
+    file_sha256: Optional[str] = Field(default=None, index=True)  # content hash of the uploaded file
+    # "full" (samples in the database; also NULL on older rows), "ingesting"
+    # (samples being written), "lazy" or "promoting" (read from the file,
+    # see app/lazy_sessions.py)
+    ingest_state: Optional[str] = Field(default="full")
+    # Bumped each time the samples are (re)written; part of response cache keys
+    data_version: Optional[int] = Field(default=0)
+    # Refreshed by a running promotion; a stale one can be claimed again
+    ingest_claimed_at: Optional[datetime] = Field(default=None)
     
     # Relationship to telemetry samples
     telemetry_samples: list["TelemetrySample"] = Relationship(back_populates="session")
 
 class TelemetrySample(SQLModel, table=True):
+    __table_args__ = (
+        # Lap / time window reads, and stretches of track within a session
+        Index("ix_telemetrysample_session_lap_ts", "session_id", "lap", "ts"),
+        Index("ix_telemetrysample_session_position", "session_id", "position_m"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: int = Field(foreign_key="session.id")
     
@@ -50,6 +67,101 @@ class TelemetrySample(SQLModel, table=True):
     
     # Timestamp
     ts: float  # Unix timestamp
+
+    # Derived at ingest (app/channels.py); NULL until backfilled on older rows
+    long_accel_g: Optional[float] = None
+    lat_load_g: Optional[float] = None
+    distance_m: Optional[float] = None  # travelled since the previous sample
+    brake_event: Optional[int] = None  # +1 applied, -1 released
+    throttle_event: Optional[int] = None  # +1 picked up, -1 lifted
     
     # Relationship back to session
     session: Session = Relationship(back_populates="telemetry_samples")
+
+
+class LeaderboardLap(SQLModel, table=True):
+    """Best completed lap per driver/car/track, maintained at ingest."""
+    __table_args__ = (UniqueConstraint("track", "car", "driver_name"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    track: str = Field(index=True)
+    car: str
+    driver_name: str
+    lap_time_s: float
+    session_id: int = Field(foreign_key="session.id")
+    lap: int
+    set_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class LeaderboardSector(SQLModel, table=True):
+    """Best time per sector per driver/car/track, maintained at ingest."""
+    __table_args__ = (UniqueConstraint("track", "car", "driver_name", "sector"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    track: str = Field(index=True)
+    car: str
+    driver_name: str
+    sector: int
+    sector_time_s: float
+    session_id: int = Field(foreign_key="session.id")
+    lap: int
+    set_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class TrackHeatmapBin(SQLModel, table=True):
+    """
+    Running per-position aggregates for one track/car, keyed on
+    position_m binned at bin_width_m. Maintained incrementally at ingest.
+    """
+    __table_args__ = (UniqueConstraint("track", "car", "bin_width_m", "bin_index"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    track: str = Field(index=True)
+    car: str
+    bin_width_m: float
+    bin_index: int
+    sample_count: int = 0
+    speed_sum: float = 0.0
+    speed_min: float = 0.0
+    brake_sum: float = 0.0
+    braking_count: int = 0  # samples with brake applied
+    abs_count: int = 0
+    tcs_count: int = 0
+
+
+class LapSegment(SQLModel, table=True):
+    """One pass through a track segment on one lap, built at ingest."""
+    __table_args__ = (Index("ix_lapsegment_track_segment", "track", "segment"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: int = Field(foreign_key="session.id", index=True)
+    track: str
+    car: str
+    lap: int
+    segment: str
+    is_curve: bool
+    entry_ts: float
+    segment_time_s: float
+    entry_speed: float
+    min_speed: float
+    exit_speed: float
+    braking_point_m: Optional[float] = None  # first position with brake above threshold
+    throttle_pickup_m: Optional[float] = None  # first position after min speed with throttle above threshold
+
+
+class SessionThumbnail(SQLModel, table=True):
+    """Sparkline speed trace and lap times for listings, built at ingest (app/thumbnails.py)."""
+    session_id: int = Field(foreign_key="session.id", primary_key=True)
+    speed: bytes  # min/max decimated, uint16 tenths of km/h
+    lap_times: bytes  # (uint16 lap, float32 seconds) per completed lap
+
+
+class SchemaMigration(SQLModel, table=True):
+    """Progress of a registered migration (see app/migrations.py)."""
+    __tablename__ = "schema_migration"
+
+    name: str = Field(primary_key=True)
+    step: int = 0  # index of the next step to run
+    last_key: Optional[int] = None  # backfill checkpoint within that step
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    applied_at: Optional[datetime] = None
@@ -0,0 +1,160 @@
+"""
+Optional declarative range partitioning of telemetrysample (PostgreSQL).
+
+With settings.TELEMETRY_PARTITIONING enabled, telemetrysample is created as
+a table partitioned by RANGE (session_id), with one partition per
+settings.TELEMETRY_PARTITION_SESSIONS consecutive session ids:
+
+    telemetrysample_p0  FOR VALUES FROM (0) TO (1000)
+    telemetrysample_p1  FOR VALUES FROM (1000) TO (2000)
+    ...
+
+Partitions are created on demand by `ensure_partition` just before a
+session's samples are inserted. Every per-session query filters on
+session_id, so the planner prunes all other partitions, and each partition
+keeps its own small indexes that are vacuumed independently. Retention
+drops whole partitions (`drop_partitions_before`) instead of deleting rows.
+
+The primary key becomes (id, session_id), because PostgreSQL requires the
+partition key in every unique constraint; the ORM keeps treating `id` as
+the key, which is still unique because it comes from one sequence.
+
+On SQLite, or with the setting off, everything here is a no-op.
+"""
+import logging
+import re
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+from .config import settings
+from .models import TelemetrySample
+
+logger = logging.getLogger(__name__)
+
+TABLE = TelemetrySample.__tablename__
+PARTITION_NAME_RE = re.compile(rf"^{TABLE}_p(\d+)$")
+
+# Partitions known to exist in this process, to skip repeated DDL
+_known_partitions: set = set()
+
+
+def enabled(bind) -> bool:
+    return settings.TELEMETRY_PARTITIONING and bind.dialect.name == "postgresql"
+
+
+def partition_bounds(index: int) -> tuple[int, int]:
+    size = settings.TELEMETRY_PARTITION_SESSIONS
+    return index * size, (index + 1) * size
+
+
+def partition_for(session_id: int) -> tuple[str, int, int]:
+    """(name, lower bound, upper bound) of the partition holding `session_id`."""
+    index = session_id // settings.TELEMETRY_PARTITION_SESSIONS
+    low, high = partition_bounds(index)
+    return f"{TABLE}_p{index}", low, high
+
+
+def is_partitioned(conn, table: str = TABLE) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+             "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"),
+        {"table": table},
+    ).first() is not None
+
+
+def partitioned_table_ddl(conn) -> list[str]:
+    """
+    CREATE TABLE for telemetrysample as a range-partitioned table, followed
+    by CREATE INDEX for the model's indexes. Indexes on the parent are
+    created on every partition, including ones attached later.
+    """
+    table = TelemetrySample.__table__
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+    ddl = ddl.replace("PRIMARY KEY (id)", "PRIMARY KEY (id, session_id)")
+    statements = [f"{ddl} PARTITION BY RANGE (session_id)"]
+    for index in sorted(table.indexes, key=lambda i: i.name):
+        statements.append(str(CreateIndex(index).compile(dialect=conn.dialect)).strip())
+    return statements
+
+
+def create_partitioned_table(conn):
+    """
+    Create telemetrysample partitioned if it does not exist yet. Called by
+    init_db before create_all, under the schema advisory lock.
+    """
+    if not enabled(conn):
+        return
+    if not inspect(conn).has_table(TABLE):
+        # Tables it references (session) must exist first
+        table = TelemetrySample.__table__
+        table.metadata.create_all(conn, tables=[fk.column.table for fk in table.foreign_keys])
+        for statement in partitioned_table_ddl(conn):
+            conn.execute(text(statement))
+        logger.info(f"Created partitioned table {TABLE}")
+    elif not is_partitioned(conn):
+        logger.warning(
+            f"TELEMETRY_PARTITIONING is on but {TABLE} is not partitioned; "
+            "run partition_telemetry.py convert"
+        )
+
+
+def ensure_partition(db, session_id: int):
+    """Create the partition for `session_id` if needed. Commits any DDL."""
+    if not enabled(db.get_bind()):
+        return
+    name, low, high = partition_for(session_id)
+    if name in _known_partitions:
+        return
+    # Serialize with other workers creating the same partition; IF NOT EXISTS
+    # alone still races on the catalog
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": name})
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ({low}) TO ({high})"
+    ))
+    db.commit()
+    _known_partitions.add(name)
+
+
+def list_partitions(conn) -> list[dict]:
+    """Existing partitions with their session id bounds and row estimates."""
+    rows = conn.execute(text(
+        "SELECT c.relname, c.reltuples::bigint FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table ORDER BY c.relname"
+    ), {"table": TABLE}).all()
+    partitions = []
+    for name, estimated_rows in rows:
+        match = PARTITION_NAME_RE.match(name)
+        if not match:
+            continue
+        low, high = partition_bounds(int(match.group(1)))
+        partitions.append({"name": name, "low": low, "high": high, "estimated_rows": max(estimated_rows, 0)})
+    return sorted(partitions, key=lambda p: p["low"])
+
+
+def drop_partitions_before(conn, cutoff: datetime, dry_run: bool = False) -> list[str]:
+    """
+    Drop the sample partitions whose sessions were all uploaded before
+    `cutoff`. A partition is only dropped once its id range is closed (a
+    newer session exists beyond it), so no future upload can land in it.
+    Sessions and their derived rows (segments, leaderboards) are kept.
+    Returns the dropped partition names.
+    """
+    max_session_id = conn.execute(text("SELECT max(id) FROM session")).scalar() or 0
+    dropped = []
+    for partition in list_partitions(conn):
+        if partition["high"] > max_session_id:
+            break  # this and later ranges may still receive uploads
+        newest = conn.execute(
+            text("SELECT max(upload_time) FROM session WHERE id >= :low AND id < :high"),
+            {"low": partition["low"], "high": partition["high"]},
+        ).scalar()
+        if newest is not None and newest >= cutoff:
+            continue
+        if not dry_run:
+            conn.execute(text(f"DROP TABLE {partition['name']}"))
+            _known_partitions.discard(partition["name"])
+        dropped.append(partition["name"])
+    return dropped
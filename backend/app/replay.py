@@ -0,0 +1,199 @@
+"""
+Server-paced replay of a stored session over a WebSocket.
+
+Samples are read from the database in small keyset-paginated pages, so a
+viewer never holds more than one page in memory, and are sent at the pace
+of their `ts` deltas divided by the speed factor. Pacing is anchored to
+the wall clock rather than summed sleeps, so it does not drift.
+
+Client -> server control messages (JSON):
+    {"action": "pause"} / {"action": "resume"}
+    {"action": "seek", "lap": 7}
+    {"action": "speed", "value": 4}
+    {"action": "stop"}
+Server -> client messages:
+    {"type": "start", ...}, {"type": "sample", "sample": {...}},
+    {"type": "seeked", "lap": 7}, {"type": "end"}, {"type": "error", "detail": ...}
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Optional
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocketState
+from sqlalchemy import or_, and_
+from sqlmodel import Session as DBSession, select
+from .db import engine
+from .models import TelemetrySample
+from .schemas import TELEMETRY_API_FIELDS, TELEMETRY_API_COLUMNS
+
+# Samples fetched per query; bounds memory per viewer
+REPLAY_PAGE_SIZE = 500
+MAX_REPLAY_SPEED = 64.0
+
+
+class ReplayCursor:
+    """Keyset cursor over a session's samples ordered by (ts, id)."""
+
+    def __init__(self, session_id: int, page_size: int = REPLAY_PAGE_SIZE):
+        self.session_id = session_id
+        self.page_size = page_size
+        self._after: Optional[tuple] = None  # (ts, id) of the last sample returned
+
+    def fetch_page(self) -> list[dict]:
+        statement = select(*TELEMETRY_API_COLUMNS).where(TelemetrySample.session_id == self.session_id)
+        if self._after is not None:
+            ts, sample_id = self._after
+            statement = statement.where(or_(
+                TelemetrySample.ts > ts,
+                and_(TelemetrySample.ts == ts, TelemetrySample.id > sample_id),
+            ))
+        statement = statement.order_by(TelemetrySample.ts, TelemetrySample.id).limit(self.page_size)
+        with DBSession(engine) as db:
+            rows = db.exec(statement).all()
+        page = [dict(zip(TELEMETRY_API_FIELDS, row)) for row in rows]
+        if page:
+            self._after = (page[-1]["ts"], page[-1]["id"])
+        return page
+
+    def seek_lap(self, lap: int) -> bool:
+        """Position the cursor just before the first sample of `lap`."""
+        with DBSession(engine) as db:
+            first = db.exec(
+                select(TelemetrySample.ts, TelemetrySample.id)
+                .where(TelemetrySample.session_id == self.session_id, TelemetrySample.lap == lap)
+                .order_by(TelemetrySample.ts, TelemetrySample.id)
+                .limit(1)
+            ).first()
+        if first is None:
+            return False
+        ts, sample_id = first
+        self._after = (ts, sample_id - 1)
+        return True
+
+
+class SessionReplay:
+    """One viewer's replay: a control-message reader and a paced sender."""
+
+    def __init__(self, websocket: WebSocket, session_id: int, speed: float):
+        self.websocket = websocket
+        self.cursor = ReplayCursor(session_id)
+        self.speed = speed
+        self.paused = False
+        self.stopped = False
+        self._changed = asyncio.Event()  # set whenever a control message arrives
+        self._anchor: Optional[tuple] = None  # (wall clock, sample ts) pacing origin
+        self._page: deque = deque()
+        # Held around every cursor move together with the matching update of
+        # _page, so a page fetched before a seek cannot land after it
+        self._cursor_lock = asyncio.Lock()
+
+    async def run(self, start_lap: Optional[int] = None):
+        if start_lap is not None and not await run_in_threadpool(self.cursor.seek_lap, start_lap):
+            await self.websocket.send_json({"type": "error", "detail": f"Lap {start_lap} not found"})
+            return
+        await self.websocket.send_json({
+            "type": "start", "session_id": self.cursor.session_id, "speed": self.speed, "lap": start_lap,
+        })
+        reader = asyncio.create_task(self._read_controls())
+        try:
+            await self._send_samples()
+        finally:
+            reader.cancel()
+
+    async def _read_controls(self):
+        try:
+            while True:
+                text = await self.websocket.receive_text()
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    continue  # ignore malformed control messages
+                if isinstance(message, dict):
+                    await self._handle_control(message)
+        except (WebSocketDisconnect, RuntimeError):
+            self.stopped = True
+        finally:
+            self._changed.set()
+
+    async def _handle_control(self, message: dict):
+        action = message.get("action")
+        if action == "pause":
+            self.paused = True
+        elif action == "resume":
+            self.paused = False
+        elif action == "speed":
+            try:
+                self.speed = min(max(float(message.get("value")), 0.01), MAX_REPLAY_SPEED)
+            except (TypeError, ValueError):
+                return
+        elif action == "seek":
+            try:
+                lap = int(message.get("lap"))
+            except (TypeError, ValueError):
+                return
+            async with self._cursor_lock:
+                found = await run_in_threadpool(self.cursor.seek_lap, lap)
+                if found:
+                    self._page.clear()
+            if found:
+                await self.websocket.send_json({"type": "seeked", "lap": lap})
+            else:
+                await self.websocket.send_json({"type": "error", "detail": f"Lap {lap} not found"})
+        elif action == "stop":
+            self.stopped = True
+        else:
+            return
+        self._anchor = None  # re-anchor pacing after any change
+        self._changed.set()
+
+    async def _wait(self, timeout: Optional[float]) -> bool:
+        """Sleep up to `timeout` seconds; returns True if a control message interrupted it."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._changed.clear()
+        return True
+
+    async def _send_samples(self):
+        while not self.stopped:
+            if self.paused:
+                await self._wait(None)
+                continue
+
+            if not self._page:
+                async with self._cursor_lock:
+                    page = await run_in_threadpool(self.cursor.fetch_page)
+                    self._page.extend(page)
+                if not page:
+                    await self.websocket.send_json({"type": "end"})
+                    return
+
+            sample = self._page[0]
+            now = time.monotonic()
+            if self._anchor is None:
+                self._anchor = (now, sample["ts"])
+            due = self._anchor[0] + (sample["ts"] - self._anchor[1]) / self.speed
+            if due > now and await self._wait(due - now):
+                continue  # state changed while waiting; re-evaluate
+            if not self._page or self._page[0] is not sample:
+                continue  # a seek replaced the page while we slept
+
+            self._page.popleft()
+            await self.websocket.send_json({"type": "sample", "sample": sample})
+
+
+async def replay_session(websocket: WebSocket, session_id: int, speed: float, lap: Optional[int]):
+    """Accept `websocket` and stream the session until it ends or the client leaves."""
+    await websocket.accept()
+    replay = SessionReplay(websocket, session_id, min(max(speed, 0.01), MAX_REPLAY_SPEED))
+    try:
+        await replay.run(start_lap=lap)
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close()
+    except (WebSocketDisconnect, RuntimeError):
+        # Client went away mid-send; nothing left to clean up
+        return
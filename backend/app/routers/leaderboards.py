@@ -0,0 +1,54 @@
+from fastapi import APIRouter, HTTPException
+from sqlmodel import Session as DBSession, select
+from typing import Optional
+from ..models import LeaderboardLap, LeaderboardSector
+from ..db import engine
+
+router = APIRouter()
+
+
+@router.get("/")
+async def get_leaderboard(
+    track: Optional[str] = None,
+    car: Optional[str] = None,
+    driver_name: Optional[str] = None,
+    sector: Optional[int] = None,
+    limit: int = 50,
+):
+    """
+    Best laps (or, with `sector`, best sector times) per driver/car/track,
+    fastest first. Filter by `driver_name` to get that driver's personal bests.
+    """
+    if sector is not None and sector not in (1, 2, 3):
+        raise HTTPException(status_code=400, detail="sector must be 1, 2 or 3")
+
+    with DBSession(engine) as db:
+        if sector is None:
+            model, time_column = LeaderboardLap, LeaderboardLap.lap_time_s
+            statement = select(LeaderboardLap)
+        else:
+            model, time_column = LeaderboardSector, LeaderboardSector.sector_time_s
+            statement = select(LeaderboardSector).where(LeaderboardSector.sector == sector)
+
+        if track:
+            statement = statement.where(model.track == track)
+        if car:
+            statement = statement.where(model.car == car)
+        if driver_name:
+            statement = statement.where(model.driver_name == driver_name)
+
+        entries = db.exec(statement.order_by(time_column).limit(limit)).all()
+        return [
+            {
+                "position": position,
+                "track": e.track,
+                "car": e.car,
+                "driver_name": e.driver_name,
+                "sector": sector,
+                "time_s": e.lap_time_s if sector is None else e.sector_time_s,
+                "session_id": e.session_id,
+                "lap": e.lap,
+                "set_at": e.set_at.isoformat() if e.set_at else None,
+            }
+            for position, e in enumerate(entries, 1)
+        ]
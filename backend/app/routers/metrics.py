@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..admission import render_metrics
+from ..lazy_sessions import render_metrics as render_lazy_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Ingest admission and lazy session cache metrics in the Prometheus text format."""
+    return PlainTextResponse(render_metrics() + render_lazy_metrics(), media_type="text/plain; version=0.0.4")
@@ -1,13 +1,30 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, WebSocket, Request
+from fastapi.responses import FileResponse, Response
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import or_
 from sqlmodel import Session as DBSession, select
 from datetime import datetime
-import shutil
-import gzip
 import json
 from pathlib import Path
-from ..models import Session, TelemetrySample
-from ..schemas import SessionCreate
+from typing import Optional
+from ..models import Session, SessionThumbnail, TelemetrySample
+from ..schemas import SessionCreate, HashLookup, TELEMETRY_API_FIELDS, TELEMETRY_API_COLUMNS
 from ..db import engine
+from ..ingest import (
+    INGEST_INGESTING, ParsedSession, ingest_session_file, iter_session_rows, save_file, file_sha256,
+    upload_file_name, cache_version,
+)
+from ..stats import session_stats, BinWidthError
+from ..replay import replay_session
+from ..compression import cached_json, negotiate
+from ..admission import ingest_admission, read_priority
+from ..batch_upload import ingest_archive, ArchiveError
+from ..config import settings
+from ..thumbnails import thumbnail_json, thumbnail_for_rows
+from ..session_files import (
+    SESSION_FILE_SUFFIXES, read_session_summary, is_v2_file, detect_codec, open_jsonl, session_media_type,
+)
+from ..lazy_sessions import INGEST_FULL, INGEST_LAZY, is_lazy, session_columns, promote_session
 
 router = APIRouter()
 
@@ -18,8 +35,8 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 def extract_metadata_from_file(file_path: Path) -> dict:
     """
-    Extract metadata from a session file by reading the first and last samples.
-    Returns dict with car, track, and duration.
+    Extract metadata from a session file by reading the first and last samples
+    (or, for a v2 file, its footer). Returns dict with car, track, and duration.
     """
     metadata = {
         "car": None,
@@ -28,7 +45,13 @@ def extract_metadata_from_file(file_path: Path) -> dict:
     }
     
     try:
-        with gzip.open(file_path, "rt", encoding="utf-8") as f:
+        summary = read_session_summary(file_path)
+        if summary is not None:
+            metadata["car"] = summary.get("car")
+            metadata["track"] = summary.get("track")
+            metadata["duration"] = summary.get("duration")
+            return metadata
+        with open_jsonl(file_path) as f:
             first = None
             last = None
             
@@ -62,25 +85,38 @@ async def upload_session(
     driver_name: str = Form(...),
     car: str = Form(...),
     track: str = Form(...),
-    duration: float = Form(...)
+    duration: float = Form(...),
+    lazy: Optional[bool] = Form(None),
 ):
     """
     Upload a session file and store metadata in the database.
     The file is saved locally (can be extended to S3 later).
+    Ingests go through admission control: when too many are already queued
+    the upload is rejected with 429 and a Retry-After header.
+
+    With `lazy` (default: the INGEST_LAZY setting) only the file, the
+    session and its listing thumbnail are stored; telemetry is read from
+    the file until the session is promoted (POST /sessions/{id}/promote).
     """
+    lazy = settings.INGEST_LAZY if lazy is None else lazy
+    async with ingest_admission.slot():
+        return await ingest_admission.run(store_upload, file, driver_name, car, track, duration, lazy)
+
+
+def store_upload(file: UploadFile, driver_name: str, car: str, track: str, duration: float,
+                 lazy: bool = False) -> dict:
+    """Save an uploaded file and ingest it. Blocking; runs on the ingest pool."""
     try:
         # Validate file extension
-        if not file.filename or not file.filename.endswith(('.jsonl.gz', '.gz')):
-            raise HTTPException(status_code=400, detail="File must be a .jsonl.gz file")
+        if not file.filename or not file.filename.endswith(SESSION_FILE_SUFFIXES):
+            raise HTTPException(status_code=400, detail="File must be a .jsonl(.gz/.zst/.lz4) or .tsf session file")
         
         # Generate unique filename with timestamp
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        safe_filename = f"{driver_name.replace(' ', '_')}_{timestamp}_{file.filename}"
+        safe_filename = upload_file_name(driver_name, file.filename)
         file_path = UPLOAD_DIR / safe_filename
         
-        # Save the file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Save the file, hashing it on the way for ETags and de-duplication
+        file_sha = save_file(file.file, file_path)
         
         # Verify file was saved and has content
         if not file_path.exists() or file_path.stat().st_size == 0:
@@ -102,7 +138,10 @@ async def upload_session(
             car=car,
             track=track,
             duration=duration,
-            upload_time=datetime.utcnow()
+            upload_time=datetime.utcnow(),
+            file_name=safe_filename,
+            file_sha256=file_sha,
+            ingest_state=INGEST_LAZY if lazy else INGEST_INGESTING,
         )
         
         with DBSession(engine) as db:
@@ -114,85 +153,17 @@ async def upload_session(
             session_id = session_record.id
             upload_time_iso = session_record.upload_time.isoformat()
             
-            # Parse and store telemetry samples
-            sample_count = 0
-            error_count = 0
-            try:
-                with gzip.open(file_path, "rt", encoding="utf-8") as f:
-                    for line_num, line in enumerate(f, 1):
-                        try:
-                            line = line.strip()
-                            if not line:
-                                continue
-                            
-                            data = json.loads(line)
-                            if not data or not isinstance(data, dict):
-                                continue
-                            
-                            # Create telemetry sample
-                            sample = TelemetrySample(
-                                session_id=session_id,
-                                source=data.get("source", "UNKNOWN"),
-                                car=data.get("car", car),
-                                track=data.get("track", track),
-                                lap=data.get("lap", 0),
-                                segment=data.get("segment", ""),
-                                sector=data.get("sector", 0),
-                                position_m=data.get("position_m", 0.0),
-                                lap_time_s=data.get("lap_time_s", 0.0),
-                                sector_time_s=data.get("sector_time_s", 0.0),
-                                best_lap_time_s=data.get("best_lap_time_s"),
-                                best_sector_1_s=data.get("best_sector_1_s"),
-                                best_sector_2_s=data.get("best_sector_2_s"),
-                                best_sector_3_s=data.get("best_sector_3_s"),
-                                speed=data.get("speed", 0.0),
-                                rpm=data.get("rpm", 0),
-                                throttle=data.get("throttle", 0.0),
-                                brake=data.get("brake", 0.0),
-                                gear=data.get("gear", 0),
-                                steer=data.get("steer", 0.0),
-                                abs=data.get("abs", False),
-                                tcs=data.get("tcs", False),
-                                in_pitlane=data.get("in_pitlane", False),
-                                is_curve=data.get("is_curve", False),
-                                ts=data.get("ts", 0.0)
-                            )
-                            db.add(sample)
-                            sample_count += 1
-                            
-                            # Commit in batches for performance
-                            if sample_count % 1000 == 0:
-                                db.commit()
-                        except json.JSONDecodeError as e:
-                            error_count += 1
-                            if error_count <= 5:  # Log first 5 JSON errors
-                                print(f"JSON decode error on line {line_num}: {e}")
-                            continue  # Skip invalid JSON lines
-                        except Exception as e:
-                            error_count += 1
-                            if error_count <= 5:  # Log first 5 errors
-                                print(f"Error parsing telemetry sample on line {line_num}: {e}")
-                                import traceback
-                                traceback.print_exc()
-                            continue
-                
-                # Final commit for remaining samples
-                if sample_count > 0:
-                    db.commit()
-                    print(f"Successfully stored {sample_count} telemetry samples for session {session_id}")
-                else:
-                    print(f"Warning: No telemetry samples found in file {file_path}")
-            except Exception as e:
-                # If telemetry parsing fails, still return the session
-                print(f"Warning: Failed to parse telemetry samples: {e}")
-                import traceback
-                traceback.print_exc()
-                # Try to commit any samples that were added before the error
-                try:
-                    if sample_count > 0:
-                        db.commit()
-                except:
-                    pass
+            # Parse and store telemetry samples, then update leaderboards
+            sample_count = None
+            if lazy:
+                # No samples are written, but listings still get a thumbnail
+                rows = iter_session_rows(file_path, car, track, ParsedSession(file_path=str(file_path)))
+                db.add(thumbnail_for_rows(session_id, rows))
+                db.commit()
+            else:
+                sample_count, error_count = ingest_session_file(
+                    db, session_record, file_path, pause=read_priority.wait_for_reads
+                )
         
         return {
             "id": session_id,
@@ -204,6 +175,7 @@ async def upload_session(
             "duration": duration,
             "upload_time": upload_time_iso,
             "telemetry_samples_count": sample_count,
+            "ingest_state": INGEST_LAZY if lazy else INGEST_FULL,
             "message": "Session uploaded successfully"
         }
     
@@ -217,12 +189,78 @@ async def upload_session(
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
+@router.post("/upload-batch")
+async def upload_session_batch(
+    file: UploadFile = File(...),
+    driver_name: str = Form("Unknown"),
+    lazy: Optional[bool] = Form(None),
+):
+    """
+    Upload a tar (optionally gzip/bz2/xz compressed) or zip archive of
+    .jsonl.gz session files and ingest each as its own session. Driver names
+    come from a manifest.json in the archive (see app/batch_upload.py),
+    falling back to `driver_name`; car, track and duration are read from
+    the files. Members are decoded in parallel and the whole batch takes
+    one ingest admission slot. `lazy` works as for single uploads.
+
+    Returns one result per session file, in archive order; a file that
+    fails does not fail the others. Archives over BATCH_MAX_FILES session
+    files, BATCH_MAX_MEMBER_BYTES per file or BATCH_MAX_TOTAL_BYTES in
+    total are rejected with a 400.
+    """
+    async with ingest_admission.slot():
+        return await ingest_admission.run(store_upload_batch, file, driver_name,
+                                          settings.INGEST_LAZY if lazy is None else lazy)
+
+
+def store_upload_batch(file: UploadFile, driver_name: str, lazy: bool) -> dict:
+    """Save and ingest the members of an uploaded archive. Blocking; runs on the ingest pool."""
+    try:
+        return ingest_archive(file.file, driver_name, UPLOAD_DIR, lazy=lazy)
+    except ArchiveError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch upload failed: {str(e)}")
+
+
+# Hashes accepted per known-hashes request
+MAX_HASH_LOOKUP = 1000
+
+
+@router.post("/known-hashes")
+async def known_hashes(lookup: HashLookup):
+    """
+    Which of the given file SHA-256 digests are already stored, mapped to
+    their session ids, so clients can skip uploading files twice.
+    """
+    if len(lookup.sha256) > MAX_HASH_LOOKUP:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_HASH_LOOKUP} hashes per request")
+    digests = {digest.lower() for digest in lookup.sha256}
+    with DBSession(engine) as db:
+        rows = db.exec(
+            select(Session.file_sha256, Session.id).where(Session.file_sha256.in_(digests))
+        ).all() if digests else []
+    return {"known": {digest: session_id for digest, session_id in rows}}
+
+
 @router.get("/")
-async def list_sessions():
-    """List all uploaded sessions."""
+async def list_sessions(include: Optional[str] = None):
+    """
+    List all uploaded sessions. `include=thumbnail` adds each session's
+    sparkline (decimated speed trace and lap times, see app/thumbnails.py),
+    read in the same query; sessions without one get null.
+    """
+    includes = {part.strip() for part in include.split(",")} if include else set()
+    if includes - {"thumbnail"}:
+        raise HTTPException(status_code=400, detail="include supports: thumbnail")
     with DBSession(engine) as db:
-        statement = select(Session)
-        sessions = db.exec(statement).all()
+        if "thumbnail" in includes:
+            statement = select(Session, SessionThumbnail).outerjoin(
+                SessionThumbnail, SessionThumbnail.session_id == Session.id
+            )
+            rows = db.exec(statement).all()
+        else:
+            rows = [(s, None) for s in db.exec(select(Session)).all()]
         return [
             {
                 "id": s.id,
@@ -231,8 +269,10 @@ async def list_sessions():
                 "track": s.track,
                 "duration": s.duration,
                 "upload_time": s.upload_time.isoformat() if s.upload_time else None,
+                "ingest_state": s.ingest_state or INGEST_FULL,
+                **({"thumbnail": thumbnail_json(thumbnail)} if "thumbnail" in includes else {}),
             }
-            for s in sessions
+            for s, thumbnail in rows
         ]
 
 
@@ -250,46 +290,238 @@ async def get_session(session_id: int):
             "track": session.track,
             "duration": session.duration,
             "upload_time": session.upload_time.isoformat() if session.upload_time else None,
+            "ingest_state": session.ingest_state or INGEST_FULL,
         }
 
+def parse_lap_range(lap_range: str) -> tuple[int, int]:
+    """Parse "5-8" (inclusive) into (5, 8)."""
+    try:
+        first, last = (int(part) for part in lap_range.split("-", 1))
+    except ValueError:
+        raise HTTPException(status_code=400, detail='lap_range must look like "5-8"')
+    if first > last:
+        raise HTTPException(status_code=400, detail="lap_range start must not exceed its end")
+    return first, last
+
+
+def session_or_404(session_id: int) -> Session:
+    """The session row (detached; its columns stay readable), or a 404."""
+    with DBSession(engine) as db:
+        session = db.get(Session, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
+
+
 @router.get("/{session_id}/telemetry")
-async def get_session_telemetry(session_id: int, limit: int = 1000, offset: int = 0):
-    """Get telemetry samples for a specific session."""
+async def get_session_telemetry(
+    request: Request,
+    session_id: int,
+    limit: int = 1000,
+    offset: int = 0,
+    lap: Optional[int] = None,
+    lap_range: Optional[str] = None,
+    ts_from: Optional[float] = None,
+    ts_to: Optional[float] = None,
+    position_from: Optional[float] = None,
+    position_to: Optional[float] = None,
+):
+    """
+    Get telemetry samples for a specific session. Responses are cached
+    together with their compressed form under the session's data version,
+    except while the session is being ingested.
+
+    Narrow the rows with `lap` or `lap_range` ("5-8", inclusive), a
+    `ts_from`/`ts_to` window and a `position_from`/`position_to` stretch
+    of track; a position range with from > to wraps across the start/finish
+    line. Filters combine, and are served by the (session_id, lap, ts) and
+    (session_id, position_m) indexes. Lazy sessions are served from their
+    parsed file (app/lazy_sessions.py) with the same filters.
+    """
+    if lap is not None and lap_range is not None:
+        raise HTTPException(status_code=400, detail="Use either lap or lap_range, not both")
+    laps = parse_lap_range(lap_range) if lap_range is not None else None
+    session = session_or_404(session_id)
+    version = cache_version(session)
+
+    def build():
+        if is_lazy(session):
+            try:
+                columns = session_columns(session, UPLOAD_DIR)
+            except FileNotFoundError:
+                raise HTTPException(status_code=404, detail="Session file not found")
+            samples = columns.select(limit, offset, lap, laps, ts_from, ts_to, position_from, position_to)
+            return {"session_id": session_id, "count": len(samples), "samples": samples}
+
+        with DBSession(engine) as db:
+            statement = select(*TELEMETRY_API_COLUMNS).where(TelemetrySample.session_id == session_id)
+            if lap is not None:
+                statement = statement.where(TelemetrySample.lap == lap)
+            elif laps is not None:
+                statement = statement.where(TelemetrySample.lap.between(*laps))
+            if ts_from is not None:
+                statement = statement.where(TelemetrySample.ts >= ts_from)
+            if ts_to is not None:
+                statement = statement.where(TelemetrySample.ts <= ts_to)
+            if position_from is not None and position_to is not None and position_from > position_to:
+                statement = statement.where(or_(
+                    TelemetrySample.position_m >= position_from,
+                    TelemetrySample.position_m <= position_to,
+                ))
+            else:
+                if position_from is not None:
+                    statement = statement.where(TelemetrySample.position_m >= position_from)
+                if position_to is not None:
+                    statement = statement.where(TelemetrySample.position_m <= position_to)
+
+            statement = statement.order_by(TelemetrySample.ts).limit(limit).offset(offset)
+            samples = db.exec(statement).all()
+            
+            return {
+                "session_id": session_id,
+                "count": len(samples),
+                "samples": [dict(zip(TELEMETRY_API_FIELDS, s)) for s in samples]
+            }
+
+    key = None if version is None else (
+        "telemetry", session_id, version, limit, offset, lap, laps, ts_from, ts_to, position_from, position_to
+    )
+    if is_lazy(session):
+        # A cache miss may parse the whole file; keep that off the event loop
+        return await run_in_threadpool(cached_json, request, key, build)
+    return cached_json(request, key, build)
+
+
+@router.get("/{session_id}/stats")
+async def get_session_stats(
+    request: Request,
+    session_id: int,
+    speed_bin: float = 10.0,
+    rpm_bin: float = 500.0,
+    lap: Optional[int] = None,
+):
+    """
+    Aggregate statistics for a session: speed and RPM histograms, time in
+    each gear, throttle/brake overlap and ABS/TCS duty cycle per lap.
+    Pass `lap` to restrict everything to one lap. Bin widths that would
+    give more than stats.MAX_HISTOGRAM_BINS bins are rejected with a 400.
+    """
+    if speed_bin <= 0 or rpm_bin <= 0:
+        raise HTTPException(status_code=400, detail="Bin widths must be positive")
+    session = session_or_404(session_id)
+    if is_lazy(session):
+        raise HTTPException(status_code=409, detail="Session is stored lazily; promote it first")
+    version = cache_version(session)
+
+    def build():
+        with DBSession(engine) as db:
+            try:
+                stats = session_stats(db, session_id, speed_bin, rpm_bin, lap, version)
+            except BinWidthError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            return {"session_id": session_id, "lap": lap, **stats}
+
+    key = None if version is None else ("stats", session_id, version, speed_bin, rpm_bin, lap)
+    return cached_json(request, key, build)
+
+
+@router.websocket("/{session_id}/replay")
+async def replay_session_ws(websocket: WebSocket, session_id: int, speed: float = 1.0, lap: Optional[int] = None):
+    """
+    Play back a stored session over a WebSocket, paced by sample timestamps
+    and scaled by `speed`. Accepts pause/resume/seek/speed/stop control
+    messages while playing; see app/replay.py for the message format.
+    """
+    with DBSession(engine) as db:
+        session = db.get(Session, session_id)
+        if not session:
+            await websocket.close(code=4404, reason="Session not found")
+            return
+        if is_lazy(session):
+            await websocket.close(code=4409, reason="Session is stored lazily; promote it first")
+            return
+    await replay_session(websocket, session_id, speed, lap)
+
+
+@router.post("/{session_id}/promote")
+async def promote_lazy_session(session_id: int):
+    """
+    Fully ingest a lazily stored session: write its telemetry samples and
+    merge it into leaderboards and heatmaps. Goes through ingest admission
+    control like uploads.
+    """
+    async with ingest_admission.slot():
+        return await ingest_admission.run(store_promotion, session_id)
+
+
+def store_promotion(session_id: int) -> dict:
+    """Promote a lazy session. Blocking; runs on the ingest pool."""
     with DBSession(engine) as db:
         session = db.get(Session, session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        
-        statement = (
-            select(TelemetrySample)
-            .where(TelemetrySample.session_id == session_id)
-            .order_by(TelemetrySample.ts)
-            .limit(limit)
-            .offset(offset)
-        )
-        samples = db.exec(statement).all()
-        
+        if not is_lazy(session):
+            raise HTTPException(status_code=409, detail="Session is already fully ingested")
+        if not session.file_name or not (UPLOAD_DIR / session.file_name).is_file():
+            raise HTTPException(status_code=404, detail="Session file not found")
+
+        sample_count = promote_session(db, session, UPLOAD_DIR / session.file_name,
+                                       pause=read_priority.wait_for_reads)
+        if sample_count is None:
+            raise HTTPException(status_code=409, detail="Session is already being promoted")
         return {
-            "session_id": session_id,
-            "count": len(samples),
-            "samples": [
-                {
-                    "id": s.id,
-                    "lap": s.lap,
-                    "sector": s.sector,
-                    "position_m": s.position_m,
-                    "lap_time_s": s.lap_time_s,
-                    "sector_time_s": s.sector_time_s,
-                    "speed": s.speed,
-                    "rpm": s.rpm,
-                    "throttle": s.throttle,
-                    "brake": s.brake,
-                    "gear": s.gear,
-                    "steer": s.steer,
-                    "abs": s.abs,
-                    "tcs": s.tcs,
-                    "ts": s.ts,
-                }
-                for s in samples
-            ]
+            "id": session_id,
+            "ingest_state": INGEST_FULL,
+            "telemetry_samples_count": sample_count,
         }
+
+
+@router.get("/{session_id}/file")
+async def download_session_file(session_id: int, request: Request):
+    """
+    Download the original uploaded session file.
+
+    Supports Range requests (partial and resumed downloads) and ETags based
+    on the file's SHA-256. Clients that accept the stored file's codec (gzip
+    or zstd) get the stored bytes as NDJSON with that `Content-Encoding`, so
+    they decode it transparently and the server never recompresses; other
+    clients get the file as is. The encoded variant has its own ETag (the
+    hash with a "-gzip" or "-zstd" suffix). v2 (.tsf) and lz4 files are
+    always sent as stored.
+    """
+    with DBSession(engine) as db:
+        session = db.get(Session, session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        if not session.file_name or not (UPLOAD_DIR / session.file_name).is_file():
+            raise HTTPException(status_code=404, detail="Session file not found")
+        file_path = UPLOAD_DIR / session.file_name
+
+        if not session.file_sha256:
+            # Sessions uploaded before hashes were stored
+            session.file_sha256 = file_sha256(file_path)
+            db.add(session)
+            db.commit()
+        file_sha = session.file_sha256
+        file_name = session.file_name
+
+    stored_codec = None if is_v2_file(file_path) else detect_codec(file_path)
+    codec = None
+    if stored_codec in ("gzip", "zstd"):
+        codec = negotiate(request.headers.get("accept-encoding", ""), (stored_codec,))
+    etag = f'"{file_sha}-{codec}"' if codec else f'"{file_sha}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "private, max-age=31536000, immutable"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    if codec:
+        headers["Content-Encoding"] = codec
+        suffix = ".gz" if codec == "gzip" else ".zst"
+        return FileResponse(
+            file_path,
+            media_type="application/x-ndjson",
+            headers=headers,
+            filename=file_name[:-len(suffix)] if file_name.endswith(suffix) else file_name,
+        )
+    return FileResponse(file_path, media_type=session_media_type(file_path), headers=headers, filename=file_name)
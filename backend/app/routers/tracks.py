@@ -0,0 +1,58 @@
+from fastapi import APIRouter, HTTPException
+from sqlmodel import Session as DBSession
+from typing import Optional
+from ..config import settings
+from ..db import engine
+from ..heatmap import read_heatmap
+from ..segments import list_segments, compare_segment
+
+router = APIRouter()
+
+
+@router.get("/{track}/heatmap")
+async def get_track_heatmap(track: str, car: Optional[str] = None, bin_m: Optional[float] = None):
+    """
+    Mean/min speed, brake usage and ABS/TCS activation rate along the lap,
+    aggregated over every session at this track (optionally one car).
+    `bin_m` defaults to the stored base bin width and must be a multiple of it.
+    """
+    with DBSession(engine) as db:
+        try:
+            bins = read_heatmap(db, track, car, bin_m)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not bins:
+            raise HTTPException(status_code=404, detail="No heatmap data for this track")
+        return {
+            "track": track,
+            "car": car,
+            "bin_m": bin_m or settings.HEATMAP_BIN_M,
+            "bins": bins,
+        }
+
+
+@router.get("/{track}/segments")
+async def get_track_segments(track: str):
+    """Segments with recorded passes at this track."""
+    with DBSession(engine) as db:
+        return {"track": track, "segments": list_segments(db, track)}
+
+
+@router.get("/{track}/segments/{segment}")
+async def compare_track_segment(
+    track: str,
+    segment: str,
+    car: Optional[str] = None,
+    driver_name: Optional[str] = None,
+    session_id: Optional[int] = None,
+    limit: int = 100,
+):
+    """
+    Compare one corner across laps, sessions and drivers: entry/min/exit
+    speed, segment time, braking point and throttle pickup, fastest first.
+    """
+    with DBSession(engine) as db:
+        passes = compare_segment(db, track, segment, car, driver_name, session_id, limit)
+        if not passes:
+            raise HTTPException(status_code=404, detail="No passes recorded for this segment")
+        return {"track": track, "segment": segment, "count": len(passes), "passes": passes}
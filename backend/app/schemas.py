@@ -1,7 +1,40 @@
 from pydantic import BaseModel
+from .models import TelemetrySample
 
 class SessionCreate(BaseModel):
     driver_name: str
     car: str
     track: str
     duration: float
+
+
+class HashLookup(BaseModel):
+    sha256: list[str]
+
+
+# TelemetrySample fields returned by the telemetry and replay endpoints
+TELEMETRY_API_FIELDS = (
+    "id",
+    "lap",
+    "sector",
+    "position_m",
+    "lap_time_s",
+    "sector_time_s",
+    "speed",
+    "rpm",
+    "throttle",
+    "brake",
+    "gear",
+    "steer",
+    "abs",
+    "tcs",
+    "ts",
+    "long_accel_g",
+    "lat_load_g",
+    "distance_m",
+    "brake_event",
+    "throttle_event",
+)
+
+# Column expressions for selecting just those fields
+TELEMETRY_API_COLUMNS = [getattr(TelemetrySample, field) for field in TELEMETRY_API_FIELDS]
@@ -0,0 +1,116 @@
+"""
+Per-lap, per-segment corner analytics built at ingest.
+
+A segment pass is a run of consecutive samples with the same lap and
+segment. Its time runs from its first sample to the first sample of the
+next pass, so passes add up to the lap. The last pass of a session has no
+successor and is dropped as incomplete, as are passes through the pitlane.
+"""
+from typing import Optional
+from sqlmodel import Session as DBSession, select, delete
+from .config import settings
+from .models import LapSegment, Session
+
+
+class SegmentTracker:
+    """Collect LapSegment rows from a stream of samples ordered by ts."""
+
+    def __init__(self, session_id: int,
+                 brake_threshold: Optional[float] = None,
+                 throttle_threshold: Optional[float] = None):
+        self.session_id = session_id
+        self.brake_threshold = settings.SEGMENT_BRAKE_THRESHOLD_PCT if brake_threshold is None else brake_threshold
+        self.throttle_threshold = settings.SEGMENT_THROTTLE_THRESHOLD_PCT if throttle_threshold is None else throttle_threshold
+        self.segments: list[LapSegment] = []
+        self._key = None
+        self._samples: list = []
+
+    def add(self, sample: dict):
+        key = (sample.get("lap", 0), sample.get("segment", ""))
+        if key != self._key and self._samples:
+            self._close(next_ts=sample.get("ts", 0.0))
+        self._key = key
+        self._samples.append(sample)
+
+    def _close(self, next_ts: float):
+        samples, self._samples = self._samples, []
+        first = samples[0]
+        if any(s.get("in_pitlane") for s in samples) or not first.get("segment"):
+            return
+
+        speeds = [s.get("speed", 0.0) for s in samples]
+        min_index = min(range(len(speeds)), key=speeds.__getitem__)
+
+        braking_point = next(
+            (s.get("position_m") for s in samples if (s.get("brake") or 0.0) > self.brake_threshold),
+            None,
+        )
+        throttle_pickup = next(
+            (s.get("position_m") for s in samples[min_index:] if (s.get("throttle") or 0.0) > self.throttle_threshold),
+            None,
+        )
+
+        self.segments.append(LapSegment(
+            session_id=self.session_id,
+            track=first["track"],
+            car=first["car"],
+            lap=first.get("lap", 0),
+            segment=first["segment"],
+            is_curve=bool(first.get("is_curve")),
+            entry_ts=first.get("ts", 0.0),
+            segment_time_s=round(next_ts - first.get("ts", 0.0), 3),
+            entry_speed=speeds[0],
+            min_speed=speeds[min_index],
+            exit_speed=speeds[-1],
+            braking_point_m=braking_point,
+            throttle_pickup_m=throttle_pickup,
+        ))
+
+
+def delete_session_segments(db: DBSession, session_id: int):
+    """Remove a session's segment rows. Does not commit."""
+    db.exec(delete(LapSegment).where(LapSegment.session_id == session_id))
+
+
+def list_segments(db: DBSession, track: str) -> list:
+    """Distinct segment names recorded for a track."""
+    rows = db.exec(
+        select(LapSegment.segment, LapSegment.is_curve)
+        .where(LapSegment.track == track)
+        .distinct()
+    ).all()
+    return [{"segment": segment, "is_curve": is_curve} for segment, is_curve in rows]
+
+
+def compare_segment(db: DBSession, track: str, segment: str, car: Optional[str] = None,
+                    driver_name: Optional[str] = None, session_id: Optional[int] = None,
+                    limit: int = 100) -> list:
+    """Passes through one segment across laps, sessions and drivers, fastest first."""
+    statement = (
+        select(LapSegment, Session.driver_name)
+        .join(Session, Session.id == LapSegment.session_id)
+        .where(LapSegment.track == track, LapSegment.segment == segment)
+    )
+    if car:
+        statement = statement.where(LapSegment.car == car)
+    if driver_name:
+        statement = statement.where(Session.driver_name == driver_name)
+    if session_id is not None:
+        statement = statement.where(LapSegment.session_id == session_id)
+
+    rows = db.exec(statement.order_by(LapSegment.segment_time_s).limit(limit)).all()
+    return [
+        {
+            "session_id": s.session_id,
+            "driver_name": driver,
+            "car": s.car,
+            "lap": s.lap,
+            "segment_time_s": s.segment_time_s,
+            "entry_speed": s.entry_speed,
+            "min_speed": s.min_speed,
+            "exit_speed": s.exit_speed,
+            "braking_point_m": s.braking_point_m,
+            "throttle_pickup_m": s.throttle_pickup_m,
+        }
+        for s, driver in rows
+    ]
@@ -0,0 +1,326 @@
+"""
+Reader for session file format v2 (.tsf), written by the desktop app
+(desktop-app/telemetry/session_file.py describes the layout).
+
+A v2 file has a JSON metadata header, independently compressed blocks of
+samples, a block index with ts/lap/position ranges and a JSON summary
+footer, so metadata costs two small reads and a lap or time range only
+decompresses the blocks that overlap it. Files that were never closed
+(no footer) are read by walking the block headers.
+
+Blocks hold JSON lines ("encoding": "json") or packed little-endian
+columns ("binary", desktop-app/telemetry/sample_encoding.py), decoded
+here with one np.frombuffer per column, and are compressed with zlib,
+zstd, lz4 or not at all ("compression").
+
+.jsonl session streams may be gzip, zstd or lz4 compressed, or plain
+(desktop-app/utils/compression.py); `open_jsonl` picks the codec.
+
+Files are told apart by their magic bytes, not their names.
+"""
+import gzip
+import io
+import json
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import IO, Iterator, Optional
+import numpy as np
+from .zstd_stream import ZstdFrameReader
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # optional dependency
+    lz4_frame = None
+
+FORMAT_VERSION = 2
+FILE_MAGIC = b"TSF2"
+BLOCK_MAGIC = b"BLK2"
+TRAILER_MAGIC = b"TSFE"
+
+# Accepted upload file names
+SESSION_FILE_SUFFIXES = (".jsonl.gz", ".gz", ".jsonl.zst", ".jsonl.lz4", ".jsonl", ".tsf")
+
+# .jsonl stream codecs: name -> (magic bytes, media type)
+STREAM_CODECS = {
+    "gzip": (b"\x1f\x8b", "application/gzip"),
+    "zstd": (b"\x28\xb5\x2f\xfd", "application/zstd"),
+    "lz4": (b"\x04\x22\x4d\x18", "application/x-lz4"),
+}
+
+# Binary encoding column types; string channels are uint16 indexes into a per-block table
+BINARY_DTYPES = {
+    "ts": "<f8", "lap": "<i4", "sector": "i1", "position_m": "<f8",
+    "lap_time_s": "<f8", "sector_time_s": "<f8", "best_lap_time_s": "<f8",
+    "best_sector_1_s": "<f8", "best_sector_2_s": "<f8", "best_sector_3_s": "<f8",
+    "speed": "<f8", "rpm": "<i4", "throttle": "<f8", "brake": "<f8", "gear": "i1", "steer": "<f8",
+    "abs": "?", "tcs": "?", "in_pitlane": "?", "is_curve": "?",
+    "source": "<u2", "car": "<u2", "track": "<u2", "segment": "<u2",
+}
+ENCODINGS = ("json", "binary")
+COMPRESSIONS = ("zlib", "zstd", "lz4", "none")
+
+HEADER = struct.Struct("<4sHHI")
+BLOCK_HEADER = struct.Struct("<4sII")
+BLOCK_INFO = struct.Struct("<QIIIddiidd")
+TRAILER = struct.Struct("<QIQI4s")
+
+
+class SessionFileError(ValueError):
+    """Not a v2 session file, or a damaged one."""
+
+
+@dataclass
+class BlockInfo:
+    offset: int
+    length: int
+    crc32: int
+    count: int
+    ts_first: float
+    ts_last: float
+    lap_first: int
+    lap_last: int
+    position_min: float
+    position_max: float
+
+
+def _decode_binary(data: bytes) -> list[dict]:
+    (length,) = struct.unpack_from("<I", data)
+    meta = json.loads(data[4:4 + length].decode("utf-8"))
+    n = meta["count"]
+    offset = 4 + length
+    fields = meta["fields"]
+    strings = meta.get("strings", {})
+    nan_nulls = set(meta.get("nan_nulls", []))
+    columns = []
+    for name in fields:
+        dtype = np.dtype(BINARY_DTYPES[name])
+        array = np.frombuffer(data, dtype=dtype, count=n, offset=offset)
+        offset += dtype.itemsize * n
+        if name in strings and strings[name]:
+            column = np.array(strings[name], dtype=object)[array].tolist()
+        elif name in nan_nulls:
+            column = np.where(np.isnan(array), None, array.astype(object)).tolist()
+        else:
+            column = array.tolist()
+        columns.append(column)
+
+    rows = [dict(zip(fields, values)) for values in zip(*columns)] if fields else [{} for _ in range(n)]
+    for name, value in meta.get("constants", {}).items():
+        for row in rows:
+            row[name] = value
+    for name, indexes in meta.get("nulls", {}).items():
+        for i in indexes:
+            rows[i][name] = None
+    for name, indexes in meta.get("missing", {}).items():
+        for i in indexes:
+            del rows[i][name]
+    for i, values in meta.get("extra", {}).items():
+        rows[int(i)].update(values)
+    return rows
+
+
+def _require(module, codec: str, package: str):
+    if module is None:
+        raise SessionFileError(f"{codec} compressed session files need the {package} package")
+
+
+def _decompress(payload: bytes, compression: str) -> bytes:
+    if compression == "zlib":
+        return zlib.decompress(payload)
+    if compression == "zstd":
+        _require(zstandard, "zstd", "zstandard")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if compression == "lz4":
+        _require(lz4_frame, "lz4", "lz4")
+        return lz4_frame.decompress(payload)
+    return payload
+
+
+def _decode_block(payload: bytes, encoding: str, compression: str = "zlib") -> list[dict]:
+    data = _decompress(payload, compression)
+    if encoding == "binary":
+        return _decode_binary(data)
+    return [json.loads(line) for line in data.decode("utf-8").split("\n") if line]
+
+
+class V2SessionFile:
+    """Open v2 session file: `header`, `summary`, `blocks`, and sample access."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.f = open(self.path, "rb")
+        try:
+            self.header = self._read_header()
+            self.complete = self._read_trailer()
+            if not self.complete:
+                self._recover()
+        except Exception:
+            self.f.close()
+            raise
+
+    def _read_header(self) -> dict:
+        raw = self.f.read(HEADER.size)
+        if len(raw) < HEADER.size or raw[:4] != FILE_MAGIC:
+            raise SessionFileError(f"{self.path}: not a v2 session file")
+        _magic, version, _flags, length = HEADER.unpack(raw)
+        if version > FORMAT_VERSION:
+            raise SessionFileError(f"{self.path}: unsupported format version {version}")
+        self._data_offset = HEADER.size + length
+        try:
+            header = json.loads(self.f.read(length).decode("utf-8"))
+        except ValueError as e:
+            raise SessionFileError(f"{self.path}: damaged header: {e}") from e
+        self.encoding = header.get("encoding", "json")
+        if self.encoding not in ENCODINGS:
+            raise SessionFileError(f"{self.path}: unsupported sample encoding {self.encoding}")
+        self.compression = header.get("compression", "zlib")
+        if self.compression not in COMPRESSIONS:
+            raise SessionFileError(f"{self.path}: unsupported block compression {self.compression}")
+        return header
+
+    def _read_trailer(self) -> bool:
+        size = os.fstat(self.f.fileno()).st_size
+        if size < self._data_offset + TRAILER.size:
+            return False
+        self.f.seek(size - TRAILER.size)
+        index_offset, count, footer_offset, footer_length, magic = TRAILER.unpack(self.f.read(TRAILER.size))
+        if magic != TRAILER_MAGIC or footer_offset + footer_length != size - TRAILER.size:
+            return False
+        self.f.seek(index_offset)
+        index = self.f.read(count * BLOCK_INFO.size)
+        self.blocks = [BlockInfo(*BLOCK_INFO.unpack_from(index, i)) for i in range(0, len(index), BLOCK_INFO.size)]
+        self.summary = json.loads(self.f.read(footer_length).decode("utf-8"))
+        return True
+
+    def _recover(self):
+        """Index the blocks of a file without a footer; the summary is the time span only."""
+        self.blocks = []
+        first = last = None
+        offset = self._data_offset
+        while True:
+            self.f.seek(offset)
+            raw = self.f.read(BLOCK_HEADER.size)
+            if len(raw) < BLOCK_HEADER.size:
+                break
+            magic, length, crc = BLOCK_HEADER.unpack(raw)
+            payload = self.f.read(length)
+            if magic != BLOCK_MAGIC or len(payload) < length or zlib.crc32(payload) != crc:
+                break  # torn last block
+            samples = _decode_block(payload, self.encoding, self.compression)
+            if samples:
+                laps = [s.get("lap", 0) or 0 for s in samples]
+                positions = [s.get("position_m", 0.0) or 0.0 for s in samples]
+                self.blocks.append(BlockInfo(
+                    offset, length, crc, len(samples),
+                    samples[0].get("ts", 0.0) or 0.0, samples[-1].get("ts", 0.0) or 0.0,
+                    min(laps), max(laps), min(positions), max(positions),
+                ))
+                first = first or samples[0]
+                last = samples[-1]
+            offset += BLOCK_HEADER.size + length
+        self.summary = {
+            "car": (first or {}).get("car"),
+            "track": (first or {}).get("track"),
+            "sample_count": sum(b.count for b in self.blocks),
+            "first_ts": (first or {}).get("ts"),
+            "last_ts": (last or {}).get("ts"),
+        }
+        if first and last and first.get("ts") and last.get("ts"):
+            self.summary["duration"] = last["ts"] - first["ts"]
+
+    def read_block(self, index: int) -> list[dict]:
+        block = self.blocks[index]
+        self.f.seek(block.offset + BLOCK_HEADER.size)
+        payload = self.f.read(block.length)
+        if zlib.crc32(payload) != block.crc32:
+            raise SessionFileError(f"{self.path}: block {index} is damaged")
+        return _decode_block(payload, self.encoding, self.compression)
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self.blocks)):
+            yield from self.read_block(i)
+
+    def samples(self, lap: Optional[int] = None, ts_from: Optional[float] = None,
+                ts_to: Optional[float] = None) -> Iterator[dict]:
+        """Samples of one lap and/or ts range, decompressing only overlapping blocks."""
+        for i, block in enumerate(self.blocks):
+            if lap is not None and not block.lap_first <= lap <= block.lap_last:
+                continue
+            if (ts_from is not None and block.ts_last < ts_from) or (ts_to is not None and block.ts_first > ts_to):
+                continue
+            for sample in self.read_block(i):
+                ts = sample.get("ts", 0.0) or 0.0
+                if lap is not None and (sample.get("lap", 0) or 0) != lap:
+                    continue
+                if (ts_from is not None and ts < ts_from) or (ts_to is not None and ts > ts_to):
+                    continue
+                yield sample
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def is_v2_file(file_path) -> bool:
+    """True if the file starts with the v2 magic, whatever its name."""
+    try:
+        with open(file_path, "rb") as f:
+            return f.read(len(FILE_MAGIC)) == FILE_MAGIC
+    except OSError:
+        return False
+
+
+def detect_codec(file_path) -> str:
+    """Compression of a .jsonl session file from its magic bytes: gzip, zstd, lz4 or none."""
+    with open(file_path, "rb") as f:
+        head = f.read(4)
+    for name, (magic, _media_type) in STREAM_CODECS.items():
+        if head.startswith(magic):
+            return name
+    return "none"
+
+
+def open_jsonl(file_path) -> IO[str]:
+    """
+    Text stream of a .jsonl session file, decompressed with whichever codec
+    it uses. Reading a file whose recording was cut short returns every
+    complete (flushed) line and then raises EOFError (gzip, zstd).
+    """
+    codec = detect_codec(file_path)
+    if codec == "gzip":
+        return gzip.open(file_path, "rt", encoding="utf-8")
+    if codec == "zstd":
+        _require(zstandard, "zstd", "zstandard")
+        return io.TextIOWrapper(io.BufferedReader(ZstdFrameReader(file_path)), encoding="utf-8")
+    if codec == "lz4":
+        _require(lz4_frame, "lz4", "lz4")
+        return lz4_frame.open(file_path, "rt", encoding="utf-8")
+    return open(file_path, "rt", encoding="utf-8")
+
+
+def session_media_type(file_path) -> str:
+    """Content type of a stored session file."""
+    if is_v2_file(file_path):
+        return "application/octet-stream"
+    codec = detect_codec(file_path)
+    return STREAM_CODECS[codec][1] if codec in STREAM_CODECS else "application/x-ndjson"
+
+
+def read_session_summary(file_path) -> Optional[dict]:
+    """Footer summary (car, track, duration, ...) of a v2 file; None for other files."""
+    if not is_v2_file(file_path):
+        return None
+    with V2SessionFile(file_path) as session_file:
+        return session_file.summary
@@ -0,0 +1,177 @@
+"""
+Aggregate statistics for a stored session, computed with NumPy over the
+session's columns so clients never need the raw samples.
+
+Each sample is weighted by the time until the next sample, so histograms
+are in seconds rather than sample counts. Results are cached per session
+data version (Session.data_version, bumped by every re-ingest in any
+process) and bin configuration.
+"""
+import threading
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from sqlmodel import Session as DBSession, select
+from .models import TelemetrySample
+
+# Number of (session, bin configuration) results kept per process
+STATS_CACHE_SIZE = 256
+
+# Most bins a histogram may have (from 0 to the largest value); narrower bins are rejected
+MAX_HISTOGRAM_BINS = 10_000
+
+# Inputs above this percentage count as "applied" for the overlap stats
+PEDAL_ON_PCT = 5.0
+
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class BinWidthError(ValueError):
+    """A histogram bin width that would need more than MAX_HISTOGRAM_BINS bins."""
+
+
+def load_channels(db: DBSession, session_id: int, lap: Optional[int] = None) -> dict:
+    """Load the channels used for stats as NumPy arrays, ordered by ts."""
+    statement = select(
+        TelemetrySample.ts,
+        TelemetrySample.lap,
+        TelemetrySample.speed,
+        TelemetrySample.rpm,
+        TelemetrySample.gear,
+        TelemetrySample.throttle,
+        TelemetrySample.brake,
+        TelemetrySample.abs,
+        TelemetrySample.tcs,
+    ).where(TelemetrySample.session_id == session_id)
+    if lap is not None:
+        statement = statement.where(TelemetrySample.lap == lap)
+    rows = db.exec(statement.order_by(TelemetrySample.ts)).all()
+
+    columns = list(zip(*rows)) if rows else [()] * 9
+    return {
+        "ts": np.asarray(columns[0], dtype=np.float64),
+        "lap": np.asarray(columns[1], dtype=np.int64),
+        "speed": np.asarray(columns[2], dtype=np.float64),
+        "rpm": np.asarray(columns[3], dtype=np.float64),
+        "gear": np.asarray(columns[4], dtype=np.int64),
+        "throttle": np.asarray(columns[5], dtype=np.float64),
+        "brake": np.asarray(columns[6], dtype=np.float64),
+        "abs": np.asarray(columns[7], dtype=bool),
+        "tcs": np.asarray(columns[8], dtype=bool),
+    }
+
+
+def sample_durations(ts: np.ndarray) -> np.ndarray:
+    """
+    Time each sample represents: the gap to the next sample. Gaps longer
+    than 5x the median (pauses, dropped packets) are clamped to the median
+    so they do not dominate the histograms.
+    """
+    if len(ts) < 2:
+        return np.zeros(len(ts))
+    dt = np.diff(ts)
+    median = float(np.median(dt))
+    dt = np.where((dt < 0) | (dt > 5 * median), median, dt)
+    return np.append(dt, median)
+
+
+def _histogram(values: np.ndarray, weights: np.ndarray, bin_width: float) -> list:
+    if len(values) == 0:
+        return []
+    scaled = np.floor(np.clip(values, 0, None) / bin_width)
+    if not np.isfinite(scaled.max()) or scaled.max() >= MAX_HISTOGRAM_BINS:
+        raise BinWidthError(f"Bin width {bin_width:g} needs more than {MAX_HISTOGRAM_BINS} bins for this data")
+    index = scaled.astype(np.int64)
+    time_s = np.bincount(index, weights=weights)
+    samples = np.bincount(index)
+    return [
+        {
+            "from": round(i * bin_width, 3),
+            "to": round((i + 1) * bin_width, 3),
+            "time_s": round(float(time_s[i]), 3),
+            "samples": int(samples[i]),
+        }
+        for i in np.nonzero(samples)[0]
+    ]
+
+
+def _duty(mask: np.ndarray, dt: np.ndarray, total: float) -> float:
+    return round(float(dt[mask].sum()) / total, 4) if total > 0 else 0.0
+
+
+def compute_stats(channels: dict, speed_bin: float, rpm_bin: float) -> dict:
+    ts = channels["ts"]
+    dt = sample_durations(ts)
+    total = float(dt.sum())
+
+    throttle_on = channels["throttle"] > PEDAL_ON_PCT
+    brake_on = channels["brake"] > PEDAL_ON_PCT
+    overlap = throttle_on & brake_on
+
+    gears, gear_index = np.unique(channels["gear"], return_inverse=True)
+    gear_time = np.bincount(gear_index, weights=dt) if len(gears) else []
+
+    laps = []
+    lap_values = channels["lap"]
+    for lap in np.unique(lap_values):
+        mask = lap_values == lap
+        lap_dt = dt[mask]
+        lap_total = float(lap_dt.sum())
+        lap_speed = channels["speed"][mask]
+        laps.append({
+            "lap": int(lap),
+            "samples": int(mask.sum()),
+            "time_s": round(lap_total, 3),
+            "mean_speed": round(float(lap_speed.mean()), 2),
+            "max_speed": round(float(lap_speed.max()), 2),
+            "abs_duty": _duty(channels["abs"][mask], lap_dt, lap_total),
+            "tcs_duty": _duty(channels["tcs"][mask], lap_dt, lap_total),
+            "throttle_brake_overlap_s": round(float(lap_dt[overlap[mask]].sum()), 3),
+        })
+
+    return {
+        "samples": int(len(ts)),
+        "time_s": round(total, 3),
+        "speed_histogram": {"bin_kmh": speed_bin, "bins": _histogram(channels["speed"], dt, speed_bin)},
+        "rpm_bands": {"bin_rpm": rpm_bin, "bins": _histogram(channels["rpm"], dt, rpm_bin)},
+        "gear_time_s": {str(int(g)): round(float(t), 3) for g, t in zip(gears, gear_time)},
+        "throttle_brake_overlap": {
+            "time_s": round(float(dt[overlap].sum()), 3),
+            "fraction": _duty(overlap, dt, total),
+        },
+        "abs_duty": _duty(channels["abs"], dt, total),
+        "tcs_duty": _duty(channels["tcs"], dt, total),
+        "laps": laps,
+    }
+
+
+def session_stats(db: DBSession, session_id: int, speed_bin: float = 10.0,
+                  rpm_bin: float = 500.0, lap: Optional[int] = None, version: Optional[int] = None) -> dict:
+    """
+    Stats for a session (or one lap of it), served from cache when possible.
+    `version` is the session's cache_version (app/ingest.py); with None
+    (still ingesting) the stats are computed but not cached.
+    """
+    key = (session_id, version, speed_bin, rpm_bin, lap)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    stats = compute_stats(load_channels(db, session_id, lap), speed_bin, rpm_bin)
+    if version is None:
+        return stats
+
+    with _cache_lock:
+        _cache[key] = stats
+        while len(_cache) > STATS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return stats
+
+
+def invalidate_session_stats(session_id: int):
+    """Drop cached stats for a session whose samples have been replaced."""
+    with _cache_lock:
+        for key in [k for k in _cache if k[0] == session_id]:
+            del _cache[key]
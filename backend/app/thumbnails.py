@@ -0,0 +1,103 @@
+"""
+Fixed-size sparkline data for session listings, built at ingest.
+
+The speed trace is min/max decimated to THUMBNAIL_POINTS values: the
+samples are split into THUMBNAIL_POINTS / 2 equal buckets and each bucket
+contributes its minimum and maximum in the order they occurred, so braking
+zones and top speeds survive at any session length. Values are stored as
+little-endian uint16 tenths of km/h (400 bytes), and completed laps as
+(uint16 lap, float32 seconds) records, so a listing reads one small row
+per session.
+"""
+from array import array
+from typing import Iterable, Optional
+import numpy as np
+from sqlalchemy import text
+from sqlmodel import Session as DBSession, delete
+from .laps import LapTracker, CompletedLap
+from .models import SessionThumbnail
+
+THUMBNAIL_POINTS = 200
+SPEED_SCALE = 10  # stored units per km/h
+SPEED_DTYPE = np.dtype("<u2")
+LAP_DTYPE = np.dtype([("lap", "<u2"), ("lap_time_s", "<f4")])
+
+
+def decimate_min_max(values: np.ndarray, points: int = THUMBNAIL_POINTS) -> np.ndarray:
+    """Reduce `values` to at most `points` values, keeping each bucket's extremes in order."""
+    if len(values) <= points:
+        return values
+    edges = np.linspace(0, len(values), points // 2 + 1).astype(np.int64)
+    picked = np.empty(points // 2 * 2, dtype=np.int64)
+    for bucket, (start, end) in enumerate(zip(edges[:-1], edges[1:])):
+        chunk = values[start:end]
+        low, high = start + int(np.argmin(chunk)), start + int(np.argmax(chunk))
+        picked[2 * bucket], picked[2 * bucket + 1] = min(low, high), max(low, high)
+    return values[picked]
+
+
+def build_thumbnail(session_id: int, speeds, laps: list[CompletedLap]) -> SessionThumbnail:
+    """Thumbnail row from a session's speed trace (in ts order) and completed laps."""
+    speed = decimate_min_max(np.asarray(speeds, dtype=np.float64))
+    encoded = np.clip(np.round(speed * SPEED_SCALE), 0, np.iinfo(SPEED_DTYPE).max).astype(SPEED_DTYPE)
+    lap_times = np.array([(lap.lap, lap.lap_time_s) for lap in laps], dtype=LAP_DTYPE)
+    return SessionThumbnail(session_id=session_id, speed=encoded.tobytes(), lap_times=lap_times.tobytes())
+
+
+def thumbnail_for_rows(session_id: int, rows: Iterable[dict]) -> SessionThumbnail:
+    """
+    Thumbnail for parsed sample rows that are not going through
+    write_samples. `rows` is read once, so it may be a stream from the file.
+    """
+    tracker = LapTracker()
+    speeds = array("d")
+    for row in rows:
+        tracker.add(row)
+        speeds.append(row["speed"] or 0.0)
+    return build_thumbnail(session_id, speeds, tracker.laps)
+
+
+def thumbnail_json(thumbnail: Optional[SessionThumbnail]) -> Optional[dict]:
+    """Decoded thumbnail for API responses."""
+    if thumbnail is None:
+        return None
+    speed = np.frombuffer(thumbnail.speed, dtype=SPEED_DTYPE) / SPEED_SCALE
+    laps = np.frombuffer(thumbnail.lap_times, dtype=LAP_DTYPE)
+    return {
+        "speed": speed.tolist(),
+        "laps": laps["lap"].tolist(),
+        "lap_times": np.round(laps["lap_time_s"].astype(np.float64), 3).tolist(),
+    }
+
+
+def delete_session_thumbnail(db: DBSession, session_id: int):
+    """Remove a session's thumbnail. Does not commit."""
+    db.exec(delete(SessionThumbnail).where(SessionThumbnail.session_id == session_id))
+
+
+def backfill_session_thumbnails(conn, low: int, high: int) -> int:
+    """
+    Migration backfill: build thumbnails from stored samples for sessions
+    with ids in (low, high] that have none. Returns thumbnails written.
+    """
+    session_ids = conn.execute(text(
+        "SELECT id FROM session WHERE id > :low AND id <= :high "
+        "AND id NOT IN (SELECT session_id FROM sessionthumbnail)"
+    ), {"low": low, "high": high}).scalars().all()
+
+    written = 0
+    for session_id in session_ids:
+        rows = conn.execute(text(
+            "SELECT speed, lap, sector, lap_time_s, sector_time_s, in_pitlane FROM telemetrysample "
+            "WHERE session_id = :session_id ORDER BY ts, id"
+        ), {"session_id": session_id}).mappings().all()
+        if not rows:
+            continue
+        thumbnail = thumbnail_for_rows(session_id, [dict(row) for row in rows])
+        conn.execute(
+            text("INSERT INTO sessionthumbnail (session_id, speed, lap_times) "
+                 "VALUES (:session_id, :speed, :lap_times)"),
+            {"session_id": session_id, "speed": thumbnail.speed, "lap_times": thumbnail.lap_times},
+        )
+        written += 1
+    return written
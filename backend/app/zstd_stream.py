@@ -0,0 +1,68 @@
+"""
+Reader for zstd streams that were cut short.
+
+zstandard's own stream reader drops the output of a last frame that was
+cut short, which is how a recording that crashed ends, even though its
+flushed blocks are complete. `ZstdFrameReader` returns everything up to
+the cut and then raises EOFError, as gzip does for a truncated member.
+
+The desktop app keeps the same reader in desktop-app/utils/zstd_stream.py.
+"""
+import io
+
+try:
+    import zstandard
+except ImportError:  # optional dependency; callers check before opening
+    zstandard = None
+
+
+class ZstdFrameReader(io.RawIOBase):
+    """
+    Decompressed bytes of every zstd frame in a file, fed chunk by chunk
+    through decompressobj. Wrap it in io.BufferedReader for line reads.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._dctx = zstandard.ZstdDecompressor()
+        self._obj = self._dctx.decompressobj()
+        self._in_frame = False  # input fed to the current frame
+        self._buffer = b""
+        self._offset = 0  # bytes of _buffer already returned
+
+    def readable(self) -> bool:
+        return True
+
+    def _decompress(self, data: bytes) -> bytes:
+        output = []
+        while data:
+            self._in_frame = True
+            output.append(self._obj.decompress(data))
+            if not self._obj.eof:
+                break
+            # Frame complete; each appended recording starts a new one
+            data = self._obj.unused_data
+            self._obj = self._dctx.decompressobj()
+            self._in_frame = False
+        return b"".join(output)
+
+    def readinto(self, buffer) -> int:
+        while self._offset >= len(self._buffer):
+            chunk = self._file.read(self.CHUNK_SIZE)
+            if not chunk:
+                if self._in_frame:
+                    raise EOFError("Compressed file ended before the end of the zstd frame")
+                return 0
+            self._buffer = self._decompress(chunk)
+            self._offset = 0
+        # Copy out from the offset; the buffer is only replaced once it is used up
+        count = min(len(buffer), len(self._buffer) - self._offset)
+        buffer[:count] = memoryview(self._buffer)[self._offset:self._offset + count]
+        self._offset += count
+        return count
+
+    def close(self):
+        self._file.close()
+        super().close()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Read load test for the backend, run at several uvicorn worker counts.
+
+For each worker count a server is started on a free port against the
+configured DATABASE_URL (SQL echo off), a pool of client processes hammers
+the read endpoints of one session for a fixed time over keep-alive
+connections (or a new connection per request), and throughput and latency are reported. With --url an
+already running server is tested instead.
+
+The database needs at least one ingested session; pass --seed-file to
+upload one first.
+
+Usage:
+    python load_test.py --workers 1 2 4 --clients 16 --duration 15
+    python load_test.py --url http://localhost:8000 --clients 8
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from multiprocessing import Pool
+from pathlib import Path
+from urllib.parse import urlsplit
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url + "/", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start within {timeout:.0f}s")
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, SQL_ECHO="false")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+         "--no-access-log"],
+        cwd=Path(__file__).parent, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def get_json(url: str, timeout: float = 60.0):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def seed(url: str, seed_file: str):
+    boundary = uuid.uuid4().hex
+    fields = {"driver_name": "Load Test", "car": "Unknown", "track": "Unknown", "duration": "0"}
+    body = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    )
+    body += (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+             f'filename="{Path(seed_file).name}"\r\nContent-Type: application/gzip\r\n\r\n').encode()
+    body += Path(seed_file).read_bytes() + f"\r\n--{boundary}--\r\n".encode()
+    request = urllib.request.Request(
+        f"{url}/sessions/upload", data=body, method="POST",
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    with urllib.request.urlopen(request, timeout=300) as response:
+        session_id = json.loads(response.read())["id"]
+    print(f"Seeded session {session_id} from {seed_file}")
+
+
+def read_paths(url: str) -> list[str]:
+    """A mix of list, detail, paged telemetry, stats and leaderboard reads."""
+    sessions = get_json(f"{url}/sessions/")
+    if not sessions:
+        raise RuntimeError("No sessions in the database; pass --seed-file to upload one")
+    session = max(sessions, key=lambda s: s["id"])
+    sid = session["id"]
+    pages = max(1, int(get_json(f"{url}/sessions/{sid}/stats").get("samples", 0)) // 500)
+    paths = ["/sessions/", f"/sessions/{sid}", f"/sessions/{sid}/stats", "/leaderboards/"]
+    paths += [f"/sessions/{sid}/telemetry?limit=500&offset={i * 500}" for i in range(min(pages, 20))]
+    return paths
+
+
+def client(args) -> tuple[list, int]:
+    """One client process: keep-alive GETs until `duration` elapses."""
+    url, paths, duration, seed_value, keep_alive = args
+    rng = random.Random(seed_value)
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    headers = {"Accept-Encoding": "gzip"}
+    if not keep_alive:
+        headers["Connection"] = "close"
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        path = rng.choice(paths)
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if not keep_alive:
+                conn.close()
+            if response.status != 200:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    conn.close()
+    return latencies, errors
+
+
+def run_load(url: str, clients: int, duration: float, keep_alive: bool = True) -> dict:
+    paths = read_paths(url)
+    # Warm the database and response caches before measuring
+    for path in paths:
+        urllib.request.urlopen(url + path, timeout=60).read()
+
+    with Pool(clients) as pool:
+        results = pool.map(client, [(url, paths, duration, i, keep_alive) for i in range(clients)])
+
+    latencies = sorted(l for result, _ in results for l in result)
+    errors = sum(e for _, e in results)
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / duration,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def print_result(label: str, result: dict):
+    print(f"{label:>8} | {result['requests']:>9,} | {result['errors']:>6} | {result['rps']:>9,.0f} | "
+          f"{result['p50_ms']:>7.1f} | {result['p95_ms']:>7.1f} | {result['p99_ms']:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend read path")
+    parser.add_argument("--url", help="Test an already running server instead of starting one")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="uvicorn worker counts to compare (default: 1 2 4)")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent client processes (default: 16)")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per run (default: 15)")
+    parser.add_argument("--seed-file", help="Upload this .jsonl.gz session before testing")
+    parser.add_argument("--new-connections", action="store_true",
+                        help="Open a connection per request instead of keep-alive (see SCALING.md)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    header = f"{'workers':>8} | {'requests':>9} | {'errors':>6} | {'req/s':>9} | {'p50 ms':>7} | {'p95 ms':>7} | {'p99 ms':>7}"
+
+    if args.url:
+        url = args.url.rstrip("/")
+        if args.seed_file:
+            seed(url, args.seed_file)
+        results["external"] = run_load(url, args.clients, args.duration, not args.new_connections)
+    else:
+        for i, workers in enumerate(args.workers):
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            server = start_server(workers, port)
+            try:
+                wait_ready(url)
+                if args.seed_file and i == 0:
+                    seed(url, args.seed_file)
+                results[workers] = run_load(url, args.clients, args.duration, not args.new_connections)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(header)
+    print("-" * len(header))
+    for label, result in results.items():
+        print_result(str(label), result)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Run registered schema migrations (app/migrations.py).
+
+Safe to run against a live database: columns are added as nullable, indexes
+are built concurrently on PostgreSQL, and backfills commit in small key
+ranges with a pause between them. Progress is checkpointed, so an
+interrupted run continues where it stopped when started again.
+
+Usage:
+    python migrate.py                       # run all pending migrations
+    python migrate.py --status
+    python migrate.py --only 0001_add_abs_tcs --batch-size 5000 --throttle 0.2
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.db import engine
+from app.config import settings
+from app.migrations import MigrationContext, MIGRATIONS, migration_status, run_migrations, \
+    DEFAULT_BATCH_SIZE, DEFAULT_THROTTLE_S
+
+
+def print_status():
+    for row in migration_status():
+        if row["applied_at"]:
+            state = f"applied {row['applied_at']:%Y-%m-%d %H:%M}"
+        elif row["step"]:
+            state = f"in progress (step {row['step'] + 1}/{row['steps']})"
+        else:
+            state = "pending"
+        print(f"  {row['name']:<36} {state:<28} {row['description']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run schema migrations")
+    parser.add_argument("--status", action="store_true", help="Show migration status and exit")
+    parser.add_argument("--only", nargs="+", metavar="NAME", choices=[m.name for m in MIGRATIONS],
+                        help="Run only these migrations")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Key range per backfill transaction (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--throttle", type=float, default=DEFAULT_THROTTLE_S,
+                        help=f"Seconds to sleep between backfill batches (default: {DEFAULT_THROTTLE_S})")
+    args = parser.parse_args()
+
+    engine.echo = False
+    print(f"Connecting to database: {settings.DATABASE_URL.split('@')[-1] if '@' in settings.DATABASE_URL else settings.DATABASE_URL}")
+    if args.status:
+        print_status()
+        return
+
+    applied = run_migrations(args.only, MigrationContext(batch_size=args.batch_size, throttle_s=args.throttle))
+    if applied:
+        print(f"\n✓ Applied {applied} migration(s)")
+    else:
+        print("✓ Nothing to migrate")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nInterrupted; run again to resume")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
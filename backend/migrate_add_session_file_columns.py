@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the file_name and file_sha256 columns to the
+session table.
+
+Works on SQLite and PostgreSQL. Existing sessions keep NULL values;
+reingest_uploads.py fills them in when it re-creates sessions from
+uploads/, and file downloads hash legacy files on first request.
+
+Kept for existing instructions; equivalent to
+    python migrate.py --only 0002_add_session_file_columns
+
+Usage:
+    python migrate_add_session_file_columns.py
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.db import engine
+from app.migrations import run_migrations
+
+if __name__ == "__main__":
+    try:
+        engine.echo = False
+        run_migrations(["0002_add_session_file_columns"])
+        print("\n✓ Migration completed successfully!")
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Manage the partitioned telemetrysample table (PostgreSQL only).
+
+Requires TELEMETRY_PARTITIONING=true in the environment or .env.
+
+Commands:
+    status                 List partitions with their session id ranges
+    convert                Rebuild an existing unpartitioned telemetrysample
+                           as a partitioned table, copying one partition's
+                           session range per transaction. Stop the server first.
+    drop-older-than DAYS   Drop partitions whose sessions were all uploaded
+                           more than DAYS days ago (add --dry-run to preview)
+
+Usage:
+    python partition_telemetry.py status
+    python partition_telemetry.py convert [--keep-old]
+    python partition_telemetry.py drop-older-than 180 [--dry-run]
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sqlalchemy import text
+from app.db import engine
+from app.config import settings
+from app import partitioning
+from app.models import TelemetrySample
+
+OLD_TABLE = f"{partitioning.TABLE}_unpartitioned"
+
+
+def status():
+    with engine.connect() as conn:
+        if not partitioning.is_partitioned(conn):
+            print(f"{partitioning.TABLE} is not partitioned")
+            return
+        partitions = partitioning.list_partitions(conn)
+    print(f"{len(partitions)} partitions of {settings.TELEMETRY_PARTITION_SESSIONS} sessions each:")
+    for p in partitions:
+        print(f"  {p['name']:<28} sessions [{p['low']}, {p['high']})  ~{p['estimated_rows']:,} rows")
+
+
+def convert(keep_old: bool):
+    """Move existing samples into a freshly created partitioned table."""
+    with engine.begin() as conn:
+        if partitioning.is_partitioned(conn):
+            print(f"✓ {partitioning.TABLE} is already partitioned. Nothing to do.")
+            return
+
+        # Free up the table, sequence and index names for the new table
+        print(f"Renaming {partitioning.TABLE} to {OLD_TABLE}...")
+        index_names = conn.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+            {"table": partitioning.TABLE},
+        ).scalars().all()
+        conn.execute(text(f"ALTER TABLE {partitioning.TABLE} RENAME TO {OLD_TABLE}"))
+        conn.execute(text(f"ALTER SEQUENCE {partitioning.TABLE}_id_seq RENAME TO {OLD_TABLE}_id_seq"))
+        for index_name in index_names:
+            new_name = index_name.replace(partitioning.TABLE, OLD_TABLE, 1)
+            conn.execute(text(f"ALTER INDEX {index_name} RENAME TO {new_name}"))
+
+        partitioning.create_partitioned_table(conn)
+
+    with engine.connect() as conn:
+        bounds = conn.execute(text(f"SELECT min(session_id), max(session_id) FROM {OLD_TABLE}")).first()
+    if bounds[0] is None:
+        print("Old table is empty")
+    else:
+        columns = ", ".join(c.name for c in TelemetrySample.__table__.columns)
+        size = settings.TELEMETRY_PARTITION_SESSIONS
+        first, last = bounds[0] // size, bounds[1] // size
+        started = time.perf_counter()
+        copied = 0
+        for index in range(first, last + 1):
+            low, high = partitioning.partition_bounds(index)
+            with engine.begin() as conn:
+                count = conn.execute(text(
+                    f"SELECT count(*) FROM {OLD_TABLE} WHERE session_id >= :low AND session_id < :high"
+                ), {"low": low, "high": high}).scalar()
+                if not count:
+                    continue
+                name, _, _ = partitioning.partition_for(low)
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {partitioning.TABLE} "
+                    f"FOR VALUES FROM ({low}) TO ({high})"
+                ))
+                # Columns by name: migrations may have added them to the old
+                # table in a different order
+                conn.execute(text(
+                    f"INSERT INTO {partitioning.TABLE} ({columns}) SELECT {columns} FROM {OLD_TABLE} "
+                    "WHERE session_id >= :low AND session_id < :high"
+                ), {"low": low, "high": high})
+            copied += count
+            print(f"  {name}: {count:,} rows ({copied:,} total, {time.perf_counter() - started:.0f}s)")
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"SELECT setval('{partitioning.TABLE}_id_seq', "
+            f"(SELECT coalesce(max(id), 0) + 1 FROM {partitioning.TABLE}), false)"
+        ))
+        if not keep_old:
+            conn.execute(text(f"DROP TABLE {OLD_TABLE}"))
+            print(f"Dropped {OLD_TABLE}")
+    print("\n✓ Conversion completed successfully!")
+
+
+def drop_older_than(days: int, dry_run: bool):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    with engine.begin() as conn:
+        dropped = partitioning.drop_partitions_before(conn, cutoff, dry_run=dry_run)
+    verb = "Would drop" if dry_run else "Dropped"
+    if not dropped:
+        print(f"No partitions with all sessions uploaded before {cutoff:%Y-%m-%d}")
+    for name in dropped:
+        print(f"{verb} {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage telemetrysample partitions (PostgreSQL)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="List partitions")
+    convert_parser = commands.add_parser("convert", help="Partition an existing telemetrysample table")
+    convert_parser.add_argument("--keep-old", action="store_true",
+                                help=f"Keep {OLD_TABLE} after copying")
+    drop_parser = commands.add_parser("drop-older-than", help="Drop partitions of old sessions")
+    drop_parser.add_argument("days", type=int)
+    drop_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql" or not settings.TELEMETRY_PARTITIONING:
+        raise RuntimeError("Partitioning needs PostgreSQL and TELEMETRY_PARTITIONING=true")
+    engine.echo = False
+
+    if args.command == "status":
+        status()
+    elif args.command == "convert":
+        convert(args.keep_old)
+    else:
+        drop_older_than(args.days, args.dry_run)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
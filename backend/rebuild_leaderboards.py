@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Rebuild the materialized leaderboard tables from stored telemetry samples.
+
+Usage:
+    python rebuild_leaderboards.py
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sqlmodel import Session as DBSession
+from app.db import engine, init_db
+from app.leaderboards import rebuild_leaderboards
+
+
+def rebuild():
+    """Recompute best laps and sectors for every stored session."""
+    init_db()
+    with DBSession(engine) as db:
+        count = rebuild_leaderboards(db)
+    print(f"✓ Rebuilt leaderboards from {count} sessions")
+
+
+if __name__ == "__main__":
+    try:
+        rebuild()
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
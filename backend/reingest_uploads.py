@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Re-ingest every session file in uploads/sessions.
+
+Files are re-ingested in a process pool, one file per worker task: each
+worker streams its file's rows into the database over its own connection
+(as single uploads do), so only the file name and row count come back to
+this process. Each finished file is appended to a checkpoint file, so an
+interrupted run picks up where it stopped. Sessions are matched to files by
+Session.file_name: an existing session has its samples replaced, a file
+without one gets a new session (driver and upload time are recovered from
+the upload filename). Lazily stored sessions only have their metadata
+refreshed. Leaderboards and track heatmaps are rebuilt once at the end.
+
+Usage:
+    python reingest_uploads.py [--workers N] [--restart]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sqlmodel import Session as DBSession, select
+from app.db import engine, init_db
+from app.ingest import (
+    INGEST_INGESTING, ParsedSession, file_sha256, iter_session_rows, stream_session_rows, write_samples,
+    delete_session_samples, finish_ingest, rebuild_aggregates,
+)
+from app.lazy_sessions import is_lazy
+from app.models import Session
+from app.session_files import SESSION_FILE_SUFFIXES
+
+# "<Driver_Name>_<YYYYmmdd_HHMMSS>_<random>_<original name>" as written by
+# /sessions/upload (older uploads have no random part)
+UPLOAD_NAME_RE = re.compile(r"^(?P<driver>.+?)_(?P<stamp>\d{8}_\d{6})_(?:[0-9a-f]{12}_)?(?P<original>.+)$")
+
+
+def session_for_file(db: DBSession, path: Path, sha256: str) -> Session:
+    """
+    Find the session stored from `path`, or create one from its filename,
+    and mark it as ingesting (lazy sessions stay lazy).
+    """
+    session = db.exec(select(Session).where(Session.file_name == path.name)).first()
+    if session is None:
+        match = UPLOAD_NAME_RE.match(path.name)
+        if match:
+            driver_name = match.group("driver").replace("_", " ")
+            upload_time = datetime.strptime(match.group("stamp"), "%Y%m%d_%H%M%S")
+        else:
+            driver_name = "Unknown"
+            upload_time = datetime.utcfromtimestamp(path.stat().st_mtime)
+        session = Session(driver_name=driver_name, car="Unknown", track="Unknown",
+                          duration=0.0, upload_time=upload_time, file_name=path.name)
+    else:
+        delete_session_samples(db, session.id)
+
+    session.file_sha256 = sha256
+    if not is_lazy(session):
+        # Not cached by the API until finish_ingest bumps its data version
+        session.ingest_state = INGEST_INGESTING
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+def update_metadata(db: DBSession, session: Session, parsed: ParsedSession):
+    """Car, track and duration of `session` from its streamed file."""
+    if parsed.car:
+        session.car = parsed.car
+    if parsed.track:
+        session.track = parsed.track
+    if parsed.duration is not None:
+        session.duration = parsed.duration
+    db.add(session)
+    db.commit()
+
+
+def reingest_file(path: Path) -> int:
+    """
+    Worker task: re-ingest one file over this process's own connection.
+    Returns the number of rows written (0 for a lazy session, whose
+    metadata is refreshed only).
+    """
+    engine.echo = False
+    with DBSession(engine) as db:
+        session = session_for_file(db, path, file_sha256(path))
+        parsed = ParsedSession(file_path=str(path))
+        if is_lazy(session):
+            for _ in iter_session_rows(path, "Unknown", "Unknown", parsed):
+                pass
+            update_metadata(db, session, parsed)
+            return 0
+        rows_written = write_samples(db, session, stream_session_rows(path, "Unknown", "Unknown", parsed),
+                                     update_aggregates=False)
+        update_metadata(db, session, parsed)
+        finish_ingest(db, session.id)
+        return rows_written
+
+
+def init_worker():
+    # Connections pooled by the parent must not be shared with a forked child
+    engine.dispose(close=False)
+
+
+def progress(done: int, total: int, rows: int, elapsed: float, width: int = 30):
+    filled = int(width * done / total) if total else width
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    bar = "#" * filled + "-" * (width - filled)
+    sys.stderr.write(f"\r[{bar}] {done}/{total} files | {rows:,} rows | {rate:,.0f} rows/s")
+    sys.stderr.flush()
+
+
+def reingest(uploads_dir: Path, workers: int, checkpoint: Path, restart: bool):
+    init_db()
+    engine.echo = False  # per-statement logging would dominate a bulk run
+
+    if restart and checkpoint.exists():
+        checkpoint.unlink()
+    done_names = set(checkpoint.read_text().split()) if checkpoint.exists() else set()
+
+    files = sorted(p for p in uploads_dir.iterdir()
+                   if p.name.endswith(SESSION_FILE_SUFFIXES) and p.name not in done_names)
+    total = len(files)
+    print(f"Re-ingesting {total} files from {uploads_dir} with {workers} workers "
+          f"({len(done_names)} already done)")
+    if not files:
+        return
+
+    rows_written = 0
+    done = 0
+    started = time.perf_counter()
+    pending_files = iter(files)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool, \
+            DBSession(engine) as db, open(checkpoint, "a") as checkpoint_file:
+        in_flight = {}
+
+        def submit_next():
+            path = next(pending_files, None)
+            if path is not None:
+                in_flight[pool.submit(reingest_file, path)] = path
+
+        # Keep every worker busy, with one task each queued behind it
+        for _ in range(workers * 2):
+            submit_next()
+
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = in_flight.pop(future)
+                submit_next()
+                try:
+                    rows_written += future.result()
+                except Exception as e:
+                    sys.stderr.write(f"\nFailed to re-ingest {path.name}: {e}\n")
+                    continue
+                checkpoint_file.write(path.name + "\n")
+                checkpoint_file.flush()
+                done += 1
+                progress(done, total, rows_written, time.perf_counter() - started)
+
+        sys.stderr.write("\n")
+        print("Rebuilding leaderboards and heatmaps...")
+        rebuild_aggregates(db)
+
+    elapsed = time.perf_counter() - started
+    print(f"✓ Re-ingested {done}/{total} files, {rows_written:,} rows in {elapsed:.1f}s "
+          f"({rows_written / elapsed if elapsed else 0:,.0f} rows/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-ingest all uploaded session files")
+    parser.add_argument("--uploads-dir", default="uploads/sessions",
+                        help="Directory of uploaded .jsonl.gz files (default: uploads/sessions)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Checkpoint file (default: <uploads-dir>/.reingest_checkpoint)")
+    parser.add_argument("--restart", action="store_true",
+                        help="Ignore the checkpoint and re-ingest every file")
+    args = parser.parse_args()
+
+    uploads_dir = Path(args.uploads_dir)
+    checkpoint = Path(args.checkpoint) if args.checkpoint else uploads_dir / ".reingest_checkpoint"
+    reingest(uploads_dir, max(1, args.workers), checkpoint, args.restart)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nInterrupted; run again to resume from the checkpoint")
+        sys.exit(1)
@@ -0,0 +1,264 @@
+# db/database.py
+"""
+Local SQLite database for the desktop app.
+
+    UploadJob     durable queue of session files waiting to be uploaded;
+                  drained by telemetry/upload_queue.py
+    SessionFile   index of recorded session files (size, hash, car, track,
+                  laps, upload status) so listings never open the files;
+                  kept up to date by telemetry/session_library.py
+
+The database file sits in the working directory, next to sessions/ (set
+TELEMETRY_LOCAL_DB to move it), and is safe to use from several threads.
+"""
+import os
+import time
+from pathlib import Path
+from typing import Optional, Dict, List
+from sqlalchemy import event, update, delete
+from sqlmodel import SQLModel, Field, Session, create_engine, select, func
+
+LOCAL_DB_PATH = Path(os.environ.get("TELEMETRY_LOCAL_DB", "telemetry_local.db"))
+
+# Upload job states
+UPLOAD_PENDING = "pending"
+UPLOAD_IN_PROGRESS = "uploading"
+UPLOAD_DONE = "done"
+UPLOAD_FAILED = "failed"  # gave up; re-enqueue to try again
+
+engine = create_engine(
+    f"sqlite:///{LOCAL_DB_PATH}",
+    connect_args={"check_same_thread": False, "timeout": 30},
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets the UI read queue status while the worker writes
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+class UploadJob(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_path: str = Field(index=True)
+    driver_name: str
+    backend_url: str
+    status: str = Field(default=UPLOAD_PENDING, index=True)
+    attempts: int = 0
+    next_attempt_at: float = 0.0  # Unix time; not retried before this
+    last_error: Optional[str] = None
+    remote_session_id: Optional[int] = None  # backend session id once uploaded
+    created_at: float = Field(default_factory=time.time)
+    updated_at: float = Field(default_factory=time.time)
+
+
+class SessionFile(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    path: str = Field(unique=True, index=True)  # absolute
+    size: int
+    mtime: float = Field(index=True)  # st_mtime when indexed; a change means re-index
+    sha256: Optional[str] = Field(default=None, index=True)
+    car: str = "Unknown"
+    track: str = "Unknown"
+    sample_count: int = 0
+    lap_count: int = 0  # completed laps
+    best_lap_s: Optional[float] = None  # fastest completed lap outside the pitlane
+    duration: float = 0.0
+    started_at: Optional[float] = None  # ts of the first sample
+    upload_status: Optional[str] = None  # an UPLOAD_* state; None: never queued
+    remote_session_id: Optional[int] = None
+    indexed_at: float = Field(default_factory=time.time)
+
+
+def init_db():
+    """Create the local tables if they do not exist."""
+    SQLModel.metadata.create_all(engine)
+
+
+def enqueue_upload(session_path: str, driver_name: str, backend_url: str) -> UploadJob:
+    """
+    Queue a session file for upload. A file that is already waiting or
+    uploading is not queued twice; its existing job is returned.
+    """
+    with Session(engine) as db:
+        job = db.exec(
+            select(UploadJob).where(
+                UploadJob.session_path == session_path,
+                UploadJob.status.in_([UPLOAD_PENDING, UPLOAD_IN_PROGRESS]),
+            )
+        ).first()
+        if job is None:
+            job = UploadJob(session_path=session_path, driver_name=driver_name, backend_url=backend_url)
+            db.add(job)
+            db.execute(
+                update(SessionFile).where(SessionFile.path == session_path).values(upload_status=UPLOAD_PENDING)
+            )
+            db.commit()
+            db.refresh(job)
+        return job
+
+
+def claim_next_upload(now: Optional[float] = None) -> Optional[UploadJob]:
+    """
+    Take the oldest pending job that is due and mark it uploading.
+    The conditional update keeps two workers from claiming the same job.
+    """
+    now = time.time() if now is None else now
+    with Session(engine) as db:
+        while True:
+            job = db.exec(
+                select(UploadJob)
+                .where(UploadJob.status == UPLOAD_PENDING, UploadJob.next_attempt_at <= now)
+                .order_by(UploadJob.next_attempt_at, UploadJob.id)
+                .limit(1)
+            ).first()
+            if job is None:
+                return None
+            claimed = db.execute(
+                update(UploadJob)
+                .where(UploadJob.id == job.id, UploadJob.status == UPLOAD_PENDING)
+                .values(status=UPLOAD_IN_PROGRESS, attempts=UploadJob.attempts + 1, updated_at=time.time())
+            ).rowcount
+            db.commit()
+            if claimed:
+                db.refresh(job)
+                return job
+
+
+def _finish(job_id: int, **values):
+    with Session(engine) as db:
+        db.execute(update(UploadJob).where(UploadJob.id == job_id).values(updated_at=time.time(), **values))
+        # Mirror the outcome on the session's index entry
+        file_values = {"upload_status": values["status"]}
+        if values.get("remote_session_id") is not None:
+            file_values["remote_session_id"] = values["remote_session_id"]
+        db.execute(
+            update(SessionFile)
+            .where(SessionFile.path == select(UploadJob.session_path).where(UploadJob.id == job_id).scalar_subquery())
+            .values(**file_values)
+        )
+        db.commit()
+
+
+def complete_upload(job_id: int, remote_session_id: Optional[int]):
+    _finish(job_id, status=UPLOAD_DONE, remote_session_id=remote_session_id, last_error=None)
+
+
+def retry_upload(job_id: int, error: str, next_attempt_at: float):
+    _finish(job_id, status=UPLOAD_PENDING, last_error=error, next_attempt_at=next_attempt_at)
+
+
+def fail_upload(job_id: int, error: str):
+    _finish(job_id, status=UPLOAD_FAILED, last_error=error)
+
+
+def reset_interrupted_uploads() -> int:
+    """Return jobs left uploading by a previous run (crash or exit) to the queue."""
+    with Session(engine) as db:
+        count = db.execute(
+            update(UploadJob)
+            .where(UploadJob.status == UPLOAD_IN_PROGRESS)
+            .values(status=UPLOAD_PENDING, next_attempt_at=0.0, updated_at=time.time())
+        ).rowcount
+        db.commit()
+        return count
+
+
+def next_upload_due() -> Optional[float]:
+    """When the earliest pending job may be attempted, or None if none are pending."""
+    with Session(engine) as db:
+        return db.exec(
+            select(func.min(UploadJob.next_attempt_at)).where(UploadJob.status == UPLOAD_PENDING)
+        ).first()
+
+
+def upload_queue_counts() -> Dict[str, int]:
+    """Number of jobs in each state."""
+    with Session(engine) as db:
+        rows = db.exec(select(UploadJob.status, func.count()).group_by(UploadJob.status)).all()
+    counts = {UPLOAD_PENDING: 0, UPLOAD_IN_PROGRESS: 0, UPLOAD_DONE: 0, UPLOAD_FAILED: 0}
+    counts.update({status: count for status, count in rows})
+    return counts
+
+
+def get_session_file(path: str) -> Optional[SessionFile]:
+    with Session(engine) as db:
+        return db.exec(select(SessionFile).where(SessionFile.path == path)).first()
+
+
+def session_file_stamps(directory: str) -> Dict[str, tuple]:
+    """{path: (size, mtime)} of the indexed files in a directory."""
+    prefix = os.path.join(directory, "")
+    with Session(engine) as db:
+        rows = db.exec(
+            select(SessionFile.path, SessionFile.size, SessionFile.mtime)
+            .where(SessionFile.path.startswith(prefix, autoescape=True))
+        ).all()
+    return {path: (size, mtime) for path, size, mtime in rows if os.path.dirname(path) == directory}
+
+
+def save_session_file(entry: SessionFile) -> SessionFile:
+    """
+    Insert or replace the index entry for entry.path. Upload status is
+    kept when the file is re-indexed.
+    """
+    with Session(engine) as db:
+        existing = db.exec(select(SessionFile).where(SessionFile.path == entry.path)).first()
+        if existing is not None:
+            entry.id = existing.id
+            entry.upload_status = existing.upload_status
+            entry.remote_session_id = existing.remote_session_id
+        entry = db.merge(entry)
+        db.commit()
+        db.refresh(entry)
+        return entry
+
+
+def remove_session_files(paths: List[str]) -> int:
+    """Drop index entries (for files deleted from disk)."""
+    if not paths:
+        return 0
+    with Session(engine) as db:
+        count = db.execute(delete(SessionFile).where(SessionFile.path.in_(paths))).rowcount
+        db.commit()
+        return count
+
+
+def mark_session_uploaded(path: str, remote_session_id: Optional[int]):
+    """Record an upload made outside the queue (e.g. tools/upload_batch.py)."""
+    with Session(engine) as db:
+        db.execute(
+            update(SessionFile)
+            .where(SessionFile.path == path)
+            .values(upload_status=UPLOAD_DONE, remote_session_id=remote_session_id)
+        )
+        db.commit()
+
+
+def list_session_index(
+    directory: Optional[str] = None,
+    car: Optional[str] = None,
+    track: Optional[str] = None,
+    upload_status: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0
+) -> List[SessionFile]:
+    """Indexed sessions, newest first. upload_status="none" selects never-queued files."""
+    query = select(SessionFile)
+    if directory is not None:
+        query = query.where(SessionFile.path.startswith(os.path.join(directory, ""), autoescape=True))
+    if car is not None:
+        query = query.where(SessionFile.car == car)
+    if track is not None:
+        query = query.where(SessionFile.track == track)
+    if upload_status == "none":
+        query = query.where(SessionFile.upload_status.is_(None))
+    elif upload_status is not None:
+        query = query.where(SessionFile.upload_status == upload_status)
+    query = query.order_by(SessionFile.mtime.desc(), SessionFile.id.desc()).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    with Session(engine) as db:
+        return list(db.exec(query).all())
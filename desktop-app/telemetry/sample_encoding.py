@@ -0,0 +1,186 @@
+# telemetry/sample_encoding.py
+"""
+Binary encoding of a block of samples, for v2 session files
+(telemetry/session_file.py, header "encoding": "binary").
+
+A JSON sample repeats every key, and the car, track and source strings,
+on every line (~600 bytes). Here a block of samples is stored column by
+column, each column a packed little-endian array (the layout of a NumPy
+structured dtype's fields, so the backend decodes a column with a single
+np.frombuffer):
+
+    u32 length, JSON block metadata
+    one array per field listed in the metadata, in that order
+
+Floats are kept as float64, so the encoding is lossless. String channels
+are stored as u16 indexes into a per-block table, and a string that is
+the same for the whole block (car, track, source) is stored once in the
+metadata with no column at all. None in a float channel is stored as
+NaN, and anything else the columns cannot hold exactly (a missing key,
+None elsewhere, an unexpected type, an unknown key) is recorded in the
+metadata, so decode(encode(samples)) == samples.
+"""
+import json
+import struct
+from typing import List, Dict, Any
+
+# Numeric channels: (name, struct code). NumPy equivalents: d=<f8, i=<i4, b=i1, ?=bool
+CHANNELS = [
+    ("ts", "d"),
+    ("lap", "i"),
+    ("sector", "b"),
+    ("position_m", "d"),
+    ("lap_time_s", "d"),
+    ("sector_time_s", "d"),
+    ("best_lap_time_s", "d"),
+    ("best_sector_1_s", "d"),
+    ("best_sector_2_s", "d"),
+    ("best_sector_3_s", "d"),
+    ("speed", "d"),
+    ("rpm", "i"),
+    ("throttle", "d"),
+    ("brake", "d"),
+    ("gear", "b"),
+    ("steer", "d"),
+    ("abs", "?"),
+    ("tcs", "?"),
+    ("in_pitlane", "?"),
+    ("is_curve", "?"),
+]
+# String channels, stored as u16 table indexes ("H")
+STRING_CHANNELS = ["source", "car", "track", "segment"]
+
+ALL_CHANNELS = CHANNELS + [(name, "H") for name in STRING_CHANNELS]
+KNOWN_FIELDS = {name for name, _ in ALL_CHANNELS}
+BLOCK_META = struct.Struct("<I")
+
+_TYPES = {"d": float, "i": int, "b": int, "?": bool}
+_INT_RANGES = {"i": (-2 ** 31, 2 ** 31 - 1), "b": (-128, 127)}
+_ZERO = {"d": 0.0, "i": 0, "b": 0, "?": False, "H": 0}
+_MISSING = object()
+_NAN = float("nan")
+
+
+def _fits(code: str, value) -> bool:
+    if code == "H":
+        return isinstance(value, str)
+    if type(value) is not _TYPES[code]:
+        return False
+    if code in _INT_RANGES:
+        low, high = _INT_RANGES[code]
+        return low <= value <= high
+    return True
+
+
+def _column_fits(code: str, values: list) -> bool:
+    """Whether every value can be packed as is (the common case)."""
+    kind = _TYPES[code]
+    if not all(type(v) is kind for v in values):
+        return False
+    if code in _INT_RANGES:
+        low, high = _INT_RANGES[code]
+        return low <= min(values) and max(values) <= high
+    return True
+
+
+def encode_samples(samples: List[Dict[str, Any]]) -> bytes:
+    """Encode a block of samples (dicts as written by the recorder)."""
+    n = len(samples)
+    meta: Dict[str, Any] = {"count": n, "fields": []}
+    missing: Dict[str, List[int]] = {}
+    nulls: Dict[str, List[int]] = {}
+    extra: Dict[str, Dict[str, Any]] = {}
+    columns = []
+
+    for name, code in ALL_CHANNELS:
+        values = [s.get(name, _MISSING) for s in samples]
+        if all(v is _MISSING for v in values):
+            continue  # no sample has this field
+        if code != "H" and _column_fits(code, values):
+            meta["fields"].append(name)
+            columns.append(struct.pack(f"<{n}{code}", *values))
+            continue
+        if code == "H":
+            strings = list(dict.fromkeys(v for v in values if isinstance(v, str)))
+            if len(strings) == 1 and all(isinstance(v, str) for v in values):
+                meta.setdefault("constants", {})[name] = strings[0]
+                continue
+            if len(strings) > 0xFFFF:
+                raise ValueError(f"too many distinct {name} values in one block")
+            meta.setdefault("strings", {})[name] = strings
+            lookup = {s: i for i, s in enumerate(strings)}
+        out = []
+        for row, value in enumerate(values):
+            if value is _MISSING:
+                missing.setdefault(name, []).append(row)
+                out.append(_ZERO[code])
+            elif value is None:
+                nulls.setdefault(name, []).append(row)
+                # float columns mark None as NaN (see below)
+                out.append(_NAN if code == "d" else _ZERO[code])
+            elif _fits(code, value):
+                out.append(lookup[value] if code == "H" else value)
+            else:
+                # e.g. an int where a float is expected; kept as is
+                extra.setdefault(str(row), {})[name] = value
+                out.append(_ZERO[code])
+        if code == "d" and name in nulls and not any(v != v for v in values if type(v) is float):
+            # Not-yet-set channels (best lap times) are None for whole
+            # blocks; NaN says so without a list of rows
+            meta.setdefault("nan_nulls", []).append(name)
+            del nulls[name]
+        meta["fields"].append(name)
+        columns.append(struct.pack(f"<{n}{code}", *out))
+
+    for row, sample in enumerate(samples):
+        for key in sample.keys() - KNOWN_FIELDS:
+            extra.setdefault(str(row), {})[key] = sample[key]
+    if missing:
+        meta["missing"] = missing
+    if nulls:
+        meta["nulls"] = nulls
+    if extra:
+        meta["extra"] = extra
+
+    header = json.dumps(meta, separators=(",", ":"), default=str).encode("utf-8")
+    return BLOCK_META.pack(len(header)) + header + b"".join(columns)
+
+
+def decode_samples(data: bytes) -> List[Dict[str, Any]]:
+    """Inverse of encode_samples."""
+    (length,) = BLOCK_META.unpack_from(data)
+    meta = json.loads(data[BLOCK_META.size:BLOCK_META.size + length].decode("utf-8"))
+    n = meta["count"]
+    codes = dict(ALL_CHANNELS)
+    offset = BLOCK_META.size + length
+
+    fields = meta["fields"]
+    columns = []
+    strings = meta.get("strings", {})
+    for name in fields:
+        fmt = struct.Struct(f"<{n}{codes[name]}")
+        values = fmt.unpack_from(data, offset)
+        offset += fmt.size
+        if name in strings:
+            table = strings[name]
+            if table:
+                values = [table[i] for i in values]
+        columns.append(values)
+
+    for name in meta.get("nan_nulls", []):
+        i = fields.index(name)
+        columns[i] = [None if v != v else v for v in columns[i]]
+
+    rows = [dict(zip(fields, values)) for values in zip(*columns)] if fields else [{} for _ in range(n)]
+    for name, value in meta.get("constants", {}).items():
+        for row in rows:
+            row[name] = value
+    for name, indexes in meta.get("nulls", {}).items():
+        for i in indexes:
+            rows[i][name] = None
+    for name, indexes in meta.get("missing", {}).items():
+        for i in indexes:
+            del rows[i][name]
+    for i, values in meta.get("extra", {}).items():
+        rows[int(i)].update(values)
+    return rows
@@ -0,0 +1,438 @@
+# telemetry/session_file.py
+"""
+Session file format v2 (.tsf).
+
+A .jsonl.gz session is one opaque gzip stream: the last sample, the
+duration or lap 12 can only be found by decompressing everything. A v2
+file is laid out so readers can seek:
+
+    header   b"TSF2", u16 version, u16 flags, u32 length, JSON metadata
+             (car, track, source, block size, encoding, compression)
+    blocks   b"BLK2", u32 length, u32 crc32, then `block_samples` samples
+             compressed on their own, as JSON lines ("encoding": "json")
+             or packed columns ("binary", telemetry/sample_encoding.py),
+             with zlib or a codec from utils/compression.py ("compression":
+             "zlib", "zstd", "lz4" or "none")
+    index    one BLOCK_INFO record per block: offset, length, crc32, sample
+             count, first/last ts, first/last lap, min/max position_m
+    footer   JSON session summary (sample count, duration, laps, best lap)
+    trailer  u64 index offset, u32 block count, u64 footer offset,
+             u32 footer length, b"TSFE"
+
+Metadata and the summary cost two small reads from the start and end of
+the file, and a lap or time range only decompresses the blocks whose
+index ranges overlap it. Blocks are flushed to disk as they fill, so a
+recording that never reaches close() loses at most one block; readers
+rebuild the index of such a file by walking the block headers.
+
+All integers are little-endian.
+"""
+import json
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Iterator
+from telemetry.sample_encoding import encode_samples, decode_samples
+from utils.compression import get_codec, open_session_file
+
+FORMAT_VERSION = 2
+FILE_MAGIC = b"TSF2"
+BLOCK_MAGIC = b"BLK2"
+TRAILER_MAGIC = b"TSFE"
+V2_SUFFIX = ".tsf"
+
+DEFAULT_BLOCK_SAMPLES = 512
+DEFAULT_COMPRESSLEVEL = 6  # zlib
+ENCODINGS = ("binary", "json")
+COMPRESSIONS = ("zlib", "zstd", "lz4", "none")
+
+HEADER = struct.Struct("<4sHHI")
+BLOCK_HEADER = struct.Struct("<4sII")
+BLOCK_INFO = struct.Struct("<QIIIddiidd")
+TRAILER = struct.Struct("<QIQI4s")
+
+
+class SessionFileError(ValueError):
+    """Not a v2 session file, or a damaged one."""
+
+
+class SessionSummary:
+    """
+    Running summary of a session's samples: car, track, time span, and
+    completed laps (a lap is complete when the lap number increases; its
+    time is the last `lap_time_s` seen). Memory use is constant apart from
+    the list of lap times.
+    """
+
+    def __init__(self):
+        self.car = None
+        self.track = None
+        self.sample_count = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.laps: List[list] = []  # [lap, lap_time_s, in_pitlane]
+        self.best_lap_s = None
+        self._lap = None
+        self._lap_time = 0.0
+        self._in_pitlane = False
+
+    def add(self, sample: dict):
+        self.sample_count += 1
+        if self.car is None and sample.get("car"):
+            self.car = sample["car"]
+        if self.track is None and sample.get("track"):
+            self.track = sample["track"]
+        ts = sample.get("ts")
+        if ts:
+            if self.first_ts is None:
+                self.first_ts = ts
+            self.last_ts = ts
+
+        lap = sample.get("lap", 0) or 0
+        if self._lap is not None and lap != self._lap:
+            if lap > self._lap and self._lap_time > 0:
+                self.laps.append([self._lap, self._lap_time, self._in_pitlane])
+                if not self._in_pitlane and (self.best_lap_s is None or self._lap_time < self.best_lap_s):
+                    self.best_lap_s = self._lap_time
+            self._in_pitlane = False
+        self._lap = lap
+        self._lap_time = sample.get("lap_time_s", 0.0) or 0.0
+        self._in_pitlane = self._in_pitlane or bool(sample.get("in_pitlane", False))
+
+    @property
+    def lap_count(self) -> int:
+        return len(self.laps)
+
+    @property
+    def duration(self) -> float:
+        if self.first_ts is None or self.last_ts is None:
+            return 0.0
+        return self.last_ts - self.first_ts
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "car": self.car,
+            "track": self.track,
+            "sample_count": self.sample_count,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "duration": self.duration,
+            "lap_count": self.lap_count,
+            "best_lap_s": self.best_lap_s,
+            "laps": self.laps,
+        }
+
+
+@dataclass
+class BlockInfo:
+    offset: int  # of the block header
+    length: int  # compressed payload bytes
+    crc32: int
+    count: int
+    ts_first: float
+    ts_last: float
+    lap_first: int
+    lap_last: int
+    position_min: float
+    position_max: float
+
+    def pack(self) -> bytes:
+        return BLOCK_INFO.pack(self.offset, self.length, self.crc32, self.count, self.ts_first, self.ts_last,
+                               self.lap_first, self.lap_last, self.position_min, self.position_max)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "BlockInfo":
+        return cls(*BLOCK_INFO.unpack(data))
+
+    @classmethod
+    def for_samples(cls, offset: int, length: int, crc: int, samples: List[dict]) -> "BlockInfo":
+        laps = [s.get("lap", 0) or 0 for s in samples]
+        positions = [s.get("position_m", 0.0) or 0.0 for s in samples]
+        return cls(
+            offset=offset, length=length, crc32=crc, count=len(samples),
+            ts_first=samples[0].get("ts", 0.0) or 0.0, ts_last=samples[-1].get("ts", 0.0) or 0.0,
+            lap_first=min(laps), lap_last=max(laps),
+            position_min=min(positions), position_max=max(positions),
+        )
+
+
+def _encode_block(samples: List[dict], encoding: str, compression: str, level: Optional[int]) -> bytes:
+    if encoding == "binary":
+        data = encode_samples(samples)
+    else:
+        data = "\n".join(json.dumps(s, default=str) for s in samples).encode("utf-8")
+    if compression == "zlib":
+        return zlib.compress(data, DEFAULT_COMPRESSLEVEL if level is None else level)
+    return get_codec(compression).compress(data, level)
+
+
+def _decode_block(payload: bytes, encoding: str, compression: str = "zlib") -> List[dict]:
+    if compression == "zlib":
+        data = zlib.decompress(payload)
+    else:
+        data = get_codec(compression).decompress(payload)
+    if encoding == "binary":
+        return decode_samples(data)
+    return [json.loads(line) for line in data.decode("utf-8").split("\n") if line]
+
+
+class SessionFileWriter:
+    """
+    Writes a v2 session file. Samples are buffered until a block is full;
+    close() writes the last block, the index and the footer.
+
+    Args:
+        path: Output file (overwritten)
+        block_samples: Samples per compressed block
+        metadata: Extra header fields. car, track and source default to the
+            first sample's values.
+        compresslevel: Level for the blocks (None: the compression's default)
+        encoding: "binary" (packed columns) or "json" (JSON lines)
+        compression: "zlib", "zstd", "lz4" or "none"
+    """
+
+    def __init__(self, path, block_samples: int = DEFAULT_BLOCK_SAMPLES,
+                 metadata: Optional[Dict[str, Any]] = None, compresslevel: Optional[int] = None,
+                 encoding: str = "binary", compression: str = "zlib"):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown sample encoding: {encoding}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown block compression: {compression}")
+        if compression != "zlib":
+            get_codec(compression).check_available()
+        self.path = str(path)
+        self.encoding = encoding
+        self.compression = compression
+        self.block_samples = max(1, block_samples)
+        self.metadata = dict(metadata or {})
+        self.compresslevel = compresslevel
+        self.summary = SessionSummary()
+        self.blocks: List[BlockInfo] = []
+        self._buffer: List[dict] = []
+        self._header_written = False
+        self._closed = False
+        self.f = open(self.path, "wb")
+
+    def _write_header(self, first: Optional[dict]):
+        header = {
+            "format": "tsf",
+            "version": FORMAT_VERSION,
+            "block_samples": self.block_samples,
+            "encoding": self.encoding,
+            "compression": self.compression,
+        }
+        for key in ("car", "track", "source"):
+            if first and first.get(key) is not None:
+                header[key] = first[key]
+        header.update(self.metadata)
+        data = json.dumps(header, default=str).encode("utf-8")
+        self.f.write(HEADER.pack(FILE_MAGIC, FORMAT_VERSION, 0, len(data)) + data)
+        self._header_written = True
+
+    def write(self, obj: dict):
+        if self._closed:
+            raise ValueError("write to a closed session file")
+        self._buffer.append(obj)
+        self.summary.add(obj)
+        if len(self._buffer) >= self.block_samples:
+            self.flush_block()
+
+    def flush_block(self):
+        """Write the buffered samples as a block (even if it is not full)."""
+        if not self._header_written:
+            self._write_header(self._buffer[0] if self._buffer else None)
+        if not self._buffer:
+            return
+        payload = _encode_block(self._buffer, self.encoding, self.compression, self.compresslevel)
+        crc = zlib.crc32(payload)
+        offset = self.f.tell()
+        self.f.write(BLOCK_HEADER.pack(BLOCK_MAGIC, len(payload), crc) + payload)
+        self.f.flush()
+        self.blocks.append(BlockInfo.for_samples(offset, len(payload), crc, self._buffer))
+        self._buffer = []
+
+    def close(self):
+        if self._closed:
+            return
+        try:
+            self.flush_block()
+            index_offset = self.f.tell()
+            for block in self.blocks:
+                self.f.write(block.pack())
+            footer_offset = self.f.tell()
+            footer = json.dumps(self.summary.to_dict(), default=str).encode("utf-8")
+            self.f.write(footer)
+            self.f.write(TRAILER.pack(index_offset, len(self.blocks), footer_offset, len(footer), TRAILER_MAGIC))
+        finally:
+            self._closed = True
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SessionFileReader:
+    """
+    Reads a v2 session file.
+
+        reader.header     metadata written at the start of the file
+        reader.summary    footer summary (rebuilt by reading every block
+                          if the file was not closed cleanly)
+        reader.blocks     block index (BlockInfo list)
+        reader.complete   False if the index had to be rebuilt
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.f = open(self.path, "rb")
+        try:
+            self.header = self._read_header()
+            self.complete = self._read_trailer()
+            if not self.complete:
+                self._recover()
+        except Exception:
+            self.f.close()
+            raise
+
+    def _read_header(self) -> Dict[str, Any]:
+        raw = self.f.read(HEADER.size)
+        if len(raw) < HEADER.size:
+            raise SessionFileError(f"{self.path}: not a v2 session file")
+        magic, version, _flags, length = HEADER.unpack(raw)
+        if magic != FILE_MAGIC:
+            raise SessionFileError(f"{self.path}: not a v2 session file")
+        if version > FORMAT_VERSION:
+            raise SessionFileError(f"{self.path}: format version {version} is newer than this reader")
+        self._data_offset = HEADER.size + length
+        try:
+            header = json.loads(self.f.read(length).decode("utf-8"))
+        except ValueError as e:
+            raise SessionFileError(f"{self.path}: damaged header: {e}") from e
+        self.encoding = header.get("encoding", "json")
+        if self.encoding not in ENCODINGS:
+            raise SessionFileError(f"{self.path}: unknown sample encoding {self.encoding}")
+        self.compression = header.get("compression", "zlib")
+        if self.compression not in COMPRESSIONS:
+            raise SessionFileError(f"{self.path}: unknown block compression {self.compression}")
+        return header
+
+    def _read_trailer(self) -> bool:
+        size = os.fstat(self.f.fileno()).st_size
+        if size < self._data_offset + TRAILER.size:
+            return False
+        self.f.seek(size - TRAILER.size)
+        index_offset, count, footer_offset, footer_length, magic = TRAILER.unpack(self.f.read(TRAILER.size))
+        if magic != TRAILER_MAGIC or footer_offset + footer_length != size - TRAILER.size:
+            return False
+        self.f.seek(index_offset)
+        index = self.f.read(count * BLOCK_INFO.size)
+        self.blocks = [BlockInfo.unpack(index[i:i + BLOCK_INFO.size]) for i in range(0, len(index), BLOCK_INFO.size)]
+        self.summary = json.loads(self.f.read(footer_length).decode("utf-8"))
+        return True
+
+    def _recover(self):
+        """Rebuild the index and summary of a file without a footer."""
+        self.blocks = []
+        summary = SessionSummary()
+        offset = self._data_offset
+        while True:
+            self.f.seek(offset)
+            raw = self.f.read(BLOCK_HEADER.size)
+            if len(raw) < BLOCK_HEADER.size:
+                break
+            magic, length, crc = BLOCK_HEADER.unpack(raw)
+            if magic != BLOCK_MAGIC:
+                break
+            payload = self.f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break  # torn last block
+            samples = _decode_block(payload, self.encoding, self.compression)
+            if samples:
+                self.blocks.append(BlockInfo.for_samples(offset, length, crc, samples))
+                for sample in samples:
+                    summary.add(sample)
+            offset += BLOCK_HEADER.size + length
+        self.summary = summary.to_dict()
+
+    @property
+    def sample_count(self) -> int:
+        return sum(block.count for block in self.blocks)
+
+    def read_block(self, index: int) -> List[dict]:
+        block = self.blocks[index]
+        self.f.seek(block.offset + BLOCK_HEADER.size)
+        payload = self.f.read(block.length)
+        if zlib.crc32(payload) != block.crc32:
+            raise SessionFileError(f"{self.path}: block {index} is damaged")
+        return _decode_block(payload, self.encoding, self.compression)
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self.blocks)):
+            yield from self.read_block(i)
+
+    def samples(self, lap: Optional[int] = None, ts_from: Optional[float] = None,
+                ts_to: Optional[float] = None) -> Iterator[dict]:
+        """Samples of one lap and/or a ts range, decompressing only the blocks that overlap."""
+        for i, block in enumerate(self.blocks):
+            if lap is not None and not block.lap_first <= lap <= block.lap_last:
+                continue
+            if ts_from is not None and block.ts_last < ts_from:
+                continue
+            if ts_to is not None and block.ts_first > ts_to:
+                continue
+            for sample in self.read_block(i):
+                if lap is not None and (sample.get("lap", 0) or 0) != lap:
+                    continue
+                ts = sample.get("ts", 0.0) or 0.0
+                if ts_from is not None and ts < ts_from:
+                    continue
+                if ts_to is not None and ts > ts_to:
+                    continue
+                yield sample
+
+    def first_sample(self) -> Optional[dict]:
+        return self.read_block(0)[0] if self.blocks else None
+
+    def last_sample(self) -> Optional[dict]:
+        return self.read_block(len(self.blocks) - 1)[-1] if self.blocks else None
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def is_v2_file(path) -> bool:
+    """True if the file starts with the v2 magic (the extension is not trusted)."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(FILE_MAGIC)) == FILE_MAGIC
+    except OSError:
+        return False
+
+
+def read_samples(path) -> Iterator[dict]:
+    """
+    Samples of a v2 or .jsonl session file (any codec in utils/compression.py),
+    in order. Invalid JSON lines are skipped.
+    """
+    if is_v2_file(path):
+        with SessionFileReader(path) as reader:
+            yield from reader
+        return
+    with open_session_file(path, "rt") as f:
+        for line in f:
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if obj and isinstance(obj, dict):
+                yield obj
@@ -0,0 +1,164 @@
+# telemetry/session_library.py
+"""
+Local library of recorded sessions, backed by the SessionFile index in
+db/database.py.
+
+Listing sessions or reading their car, track and duration used to mean a
+stat() per file and decompressing whole files. Now each file is summarised
+once, either while it is recorded (SessionWriter keeps a SessionSummary)
+or the first time a directory scan sees it, and later scans only re-read
+files whose size or mtime changed. v2 files (telemetry/session_file.py)
+carry their summary in the footer and are never read in full.
+"""
+import os
+import time
+from typing import Optional, List, Dict, Any
+from telemetry.session_file import (
+    SessionSummary, SessionFileReader, SessionFileError, is_v2_file, read_samples, V2_SUFFIX,
+)
+from utils.compression import JSONL_SUFFIXES, DECOMPRESSION_ERRORS
+from db.database import (
+    SessionFile, init_db, get_session_file, session_file_stamps, save_session_file,
+    remove_session_files, list_session_index,
+)
+
+SESSION_PREFIX = "session_"
+SESSION_SUFFIXES = JSONL_SUFFIXES + (V2_SUFFIX,)
+
+
+def _summary_from_footer(footer: dict) -> SessionSummary:
+    summary = SessionSummary()
+    summary.car = footer.get("car")
+    summary.track = footer.get("track")
+    summary.sample_count = footer.get("sample_count", 0)
+    summary.first_ts = footer.get("first_ts")
+    summary.last_ts = footer.get("last_ts")
+    summary.laps = footer.get("laps", [])
+    summary.best_lap_s = footer.get("best_lap_s")
+    return summary
+
+
+def summarize_file(path: str) -> SessionSummary:
+    """
+    Summary of a session file: from the footer of a v2 file, otherwise by
+    reading every sample. A truncated file (e.g. still being recorded) is
+    read up to the damage.
+    """
+    if is_v2_file(path):
+        try:
+            with SessionFileReader(path) as reader:
+                return _summary_from_footer(reader.summary)
+        except SessionFileError as e:
+            print(f"Session file {path} is damaged: {e}")
+            return SessionSummary()
+    summary = SessionSummary()
+    try:
+        for sample in read_samples(path):
+            summary.add(sample)
+    except DECOMPRESSION_ERRORS as e:
+        print(f"Session file {path} is incomplete: {e}")
+    return summary
+
+
+def _sha256(path: str) -> str:
+    # Deferred import: telemetry.upload uses this module
+    from telemetry.upload import file_sha256
+    return file_sha256(path)
+
+
+def index_session_file(path: str, summary: Optional[SessionSummary] = None) -> SessionFile:
+    """
+    (Re-)index one file. Pass the recorder's summary to skip reading the
+    samples back; the file is still read once to hash it.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    if summary is None:
+        summary = summarize_file(path)
+    return save_session_file(SessionFile(
+        path=path,
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+        sha256=_sha256(path),
+        car=summary.car or "Unknown",
+        track=summary.track or "Unknown",
+        sample_count=summary.sample_count,
+        lap_count=summary.lap_count,
+        best_lap_s=summary.best_lap_s,
+        duration=summary.duration,
+        started_at=summary.first_ts,
+        indexed_at=time.time(),
+    ))
+
+
+def session_info(path: str) -> SessionFile:
+    """Index entry for a file, indexing it first if it is new or changed."""
+    init_db()
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    entry = get_session_file(path)
+    if entry is not None and entry.size == stat.st_size and entry.mtime == stat.st_mtime:
+        return entry
+    return index_session_file(path)
+
+
+def session_metadata(path: str) -> Dict[str, Any]:
+    """Upload metadata (car, track, duration, ...) from the index."""
+    entry = session_info(path)
+    return {
+        "car": entry.car,
+        "track": entry.track,
+        "duration": entry.duration,
+        "sample_count": entry.sample_count,
+        "lap_count": entry.lap_count,
+        "best_lap_s": entry.best_lap_s,
+    }
+
+
+def scan_sessions(sessions_dir: str = "sessions") -> Dict[str, int]:
+    """
+    Bring the index in line with a directory: index new and changed
+    session files and forget deleted ones. Unchanged files cost one stat
+    (from the directory listing).
+    """
+    init_db()
+    directory = os.path.abspath(sessions_dir)
+    indexed = session_file_stamps(directory)
+    counts = {"indexed": 0, "unchanged": 0, "removed": 0}
+    if not os.path.isdir(directory):
+        counts["removed"] = remove_session_files(list(indexed))
+        return counts
+
+    seen = set()
+    with os.scandir(directory) as entries:
+        for item in entries:
+            if not (item.name.startswith(SESSION_PREFIX) and item.name.endswith(SESSION_SUFFIXES)):
+                continue
+            if not item.is_file():
+                continue
+            seen.add(item.path)
+            stat = item.stat()
+            if indexed.get(item.path) == (stat.st_size, stat.st_mtime):
+                counts["unchanged"] += 1
+                continue
+            try:
+                index_session_file(item.path)
+                counts["indexed"] += 1
+            except OSError as e:
+                # Deleted or unreadable since the listing
+                print(f"Could not index {item.path}: {e}")
+
+    counts["removed"] = remove_session_files([p for p in indexed if p not in seen])
+    return counts
+
+
+def list_sessions(sessions_dir: str = "sessions", rescan: bool = True, **filters) -> List[SessionFile]:
+    """
+    Indexed sessions in a directory, newest first. Filters are passed to
+    list_session_index (car, track, upload_status, limit, offset).
+    """
+    if rescan:
+        scan_sessions(sessions_dir)
+    else:
+        init_db()
+    return list_session_index(os.path.abspath(sessions_dir), **filters)
@@ -1,22 +1,197 @@
 # telemetry/storage.py
-import gzip
 import json
+import os
+import queue
+import threading
+import time
+from typing import Optional
+from telemetry.session_file import SessionSummary, SessionFileWriter, V2_SUFFIX
+from utils.compression import DEFAULT_CODEC, get_codec, codec_for_path, open_session_file
+
+# Format for new recordings (TELEMETRY_SESSION_FORMAT):
+#   "jsonl"   .jsonl + codec suffix (.jsonl.gz, ...), one JSON sample per line
+#   "binary"  .tsf (telemetry/session_file.py) with packed binary samples
+SESSION_FORMATS = {"jsonl": ".jsonl", "binary": V2_SUFFIX}
+SESSION_FORMAT = os.environ.get("TELEMETRY_SESSION_FORMAT", "jsonl")
+# Compression for new recordings (utils/compression.py): gzip, zstd, lz4 or
+# none, and its level (unset: the codec's default). For .tsf files it
+# applies to each block, with gzip meaning zlib.
+SESSION_CODEC = os.environ.get("TELEMETRY_SESSION_CODEC", DEFAULT_CODEC)
+SESSION_LEVEL = int(os.environ["TELEMETRY_SESSION_LEVEL"]) if os.environ.get("TELEMETRY_SESSION_LEVEL") else None
+
+# Durability window: buffered samples reach the file at least this often
+DEFAULT_FLUSH_INTERVAL_S = 1.0
+# ...or as soon as this much encoded data is waiting (.jsonl only)
+DEFAULT_FLUSH_BYTES = 256 * 1024
+# Samples queued for the writer thread before new ones are dropped
+DEFAULT_MAX_PENDING = 10000
+
+_STOP = object()
+
+
+def new_session_path(directory: str = "sessions", session_format: str = SESSION_FORMAT,
+                     codec: str = SESSION_CODEC) -> str:
+    """Timestamped file name for a new recording."""
+    if session_format not in SESSION_FORMATS:
+        raise ValueError(f"Unknown session format: {session_format}")
+    suffix = SESSION_FORMATS[session_format]
+    if session_format == "jsonl":
+        suffix += get_codec(codec).suffix
+    return os.path.join(directory, time.strftime("session_%Y%m%d_%H%M%S") + suffix)
+
 
 class SessionWriter:
-    def __init__(self, path):
+    """
+    Records samples to a session file. The format follows the extension:
+    .tsf writes a v2 file with `encoding` ("binary" by default, or
+    "json"), anything else a .jsonl stream compressed with the codec the
+    extension names (.gz, .zst, .lz4, none). `codec` and `level` override
+    the extension and SESSION_CODEC/SESSION_LEVEL.
+
+    write() only queues the sample, so it is cheap enough for the UI
+    thread; a writer thread encodes and writes. The file is flushed when
+    `flush_bytes` of data are waiting or `flush_interval` seconds after the
+    first unflushed sample, whichever comes first, so at most about
+    `flush_interval` seconds of samples are lost if the app dies. A .tsf
+    flush writes a (possibly short) block. If the writer falls more than
+    `max_pending` samples behind, new samples are dropped and counted
+    rather than blocking the caller.
+    """
+
+    def __init__(self, path, encoding=None, codec: Optional[str] = None, level: Optional[int] = None,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL_S, flush_bytes: int = DEFAULT_FLUSH_BYTES,
+                 max_pending: int = DEFAULT_MAX_PENDING):
         self.path = path
-        self.f = gzip.open(self.path, "at", encoding="utf-8")  # append text mode
-        # write a small header line (optional)
-        # self.f.write(json.dumps({"meta":"session start"}) + "\n")
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        if level is None:
+            level = SESSION_LEVEL
+        self.v2 = None
+        if str(path).endswith(V2_SUFFIX):
+            codec = codec or SESSION_CODEC
+            self.codec = get_codec(codec)
+            self.v2 = SessionFileWriter(path, encoding=encoding or "binary", compresslevel=level,
+                                        compression="zlib" if codec == "gzip" else codec)
+            # kept for the session library index (see index_session_file)
+            self.summary = self.v2.summary
+        else:
+            if encoding not in (None, "json"):
+                raise ValueError(f"{encoding} encoding needs a {V2_SUFFIX} file")
+            self.codec = get_codec(codec) if codec else codec_for_path(path)
+            self.f = open_session_file(self.path, "at", self.codec.name, level)  # append text mode
+            # kept for the session library index (see index_session_file)
+            self.summary = SessionSummary()
+
+        self.written = 0  # samples handed to the file
+        self.dropped = 0  # samples lost: writer too far behind, or after a write error
+        self.flushes = 0
+        self.error: Optional[Exception] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._thread.start()
 
     def write(self, obj: dict):
-        # ensure serializable
-        self.f.write(json.dumps(obj, default=str) + "\n")
-        # flush occasionally
-        self.f.flush()
+        if self._closed:
+            raise ValueError("write to a closed session")
+        try:
+            self._queue.put_nowait(obj)
+        except queue.Full:
+            self._count_dropped(1)
+
+    def stats(self) -> dict:
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize(),
+            "flushes": self.flushes,
+            "error": str(self.error) if self.error else None,
+        }
+
+    def _count_dropped(self, count: int):
+        with self._lock:
+            self.dropped += count
+
+    def _write_batch(self, batch: list) -> int:
+        """Encode and write samples; returns the bytes buffered (.jsonl)."""
+        if self.v2 is not None:
+            for obj in batch:
+                # blocks are written as they fill
+                self.v2.write(obj)
+            return 0
+        text = "".join(json.dumps(obj, default=str) + "\n" for obj in batch)
+        self.f.write(text)
+        for obj in batch:
+            self.summary.add(obj)
+        return len(text)
+
+    def _flush(self):
+        if self.v2 is not None:
+            self.v2.flush_block()
+        else:
+            # gzip sync flush / end of a zstd or lz4 block: everything so
+            # far is decodable from disk
+            self.f.flush()
+        self.flushes += 1
+
+    def _run(self):
+        unflushed_since = None  # monotonic time of the oldest unflushed sample
+        unflushed_bytes = 0
+        stopping = False
+        while not stopping:
+            timeout = None
+            if unflushed_since is not None:
+                timeout = max(0.0, unflushed_since + self.flush_interval - time.monotonic())
+            try:
+                batch = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                batch = []
+            # Take whatever else is waiting in one go
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(obj is _STOP for obj in batch):
+                stopping = True
+                batch = [obj for obj in batch if obj is not _STOP]
+            if not batch and not stopping and unflushed_since is None:
+                continue
+
+            if self.error is not None:
+                self._count_dropped(len(batch))
+                continue
+            try:
+                if batch:
+                    unflushed_bytes += self._write_batch(batch)
+                    self.written += len(batch)
+                    if unflushed_since is None:
+                        unflushed_since = time.monotonic()
+                if unflushed_since is not None and (
+                    stopping
+                    or unflushed_bytes >= self.flush_bytes
+                    or time.monotonic() - unflushed_since >= self.flush_interval
+                ):
+                    self._flush()
+                    unflushed_since = None
+                    unflushed_bytes = 0
+            except Exception as e:
+                print(f"Session writer failed, dropping further samples: {e}")
+                self.error = e
+                self._count_dropped(len(batch))
 
     def close(self):
+        """Write everything still queued, flush and close the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
         try:
-            self.f.close()
-        except Exception:
-            pass
+            if self.v2 is not None:
+                self.v2.close()
+            else:
+                self.f.close()
+        except Exception as e:
+            print(f"Error closing session file: {e}")
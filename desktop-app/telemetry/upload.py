@@ -3,11 +3,21 @@
 Upload session files to FastAPI backend.
 """
 import os
-import gzip
-import json
+import hashlib
+import time
 import requests
-from pathlib import Path
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Callable, Iterable, List
+from requests.adapters import HTTPAdapter
+from utils.multipart import MultipartEncoder, ProgressCallback, DEFAULT_CHUNK_SIZE
+from utils.compression import detect_codec
+from telemetry.session_file import read_samples, is_v2_file
+from telemetry.session_library import list_sessions, session_info, session_metadata
+from db.database import mark_session_uploaded
+
+# Hashes per /sessions/known-hashes request (the backend's limit)
+HASH_LOOKUP_BATCH = 1000
 
 
 def extract_session_metadata(session_path: str) -> Dict[str, Any]:
@@ -25,32 +35,27 @@ def extract_session_metadata(session_path: str) -> Dict[str, Any]:
     }
     
     try:
-        with gzip.open(session_path, "rt", encoding="utf-8") as f:
-            first = None
-            last = None
-            count = 0
-            
-            for line in f:
-                try:
-                    obj = json.loads(line)
-                    if first is None:
-                        first = obj
-                    last = obj
-                    count += 1
-                except json.JSONDecodeError:
-                    continue
+        first = None
+        last = None
+        count = 0
+        
+        for obj in read_samples(session_path):
+            if first is None:
+                first = obj
+            last = obj
+            count += 1
+        
+        if first and last:
+            metadata["car"] = first.get("car", last.get("car", "Unknown"))
+            metadata["track"] = first.get("track", last.get("track", "Unknown"))
+            metadata["sample_count"] = count
             
-            if first and last:
-                metadata["car"] = first.get("car", last.get("car", "Unknown"))
-                metadata["track"] = first.get("track", last.get("track", "Unknown"))
-                metadata["sample_count"] = count
-                
-                first_ts = first.get("ts")
-                last_ts = last.get("ts")
-                if first_ts and last_ts:
-                    metadata["first_ts"] = first_ts
-                    metadata["last_ts"] = last_ts
-                    metadata["duration"] = last_ts - first_ts
+            first_ts = first.get("ts")
+            last_ts = last.get("ts")
+            if first_ts and last_ts:
+                metadata["first_ts"] = first_ts
+                metadata["last_ts"] = last_ts
+                metadata["duration"] = last_ts - first_ts
     
     except Exception as e:
         print(f"Error extracting metadata: {e}")
@@ -62,16 +67,28 @@ def upload_session(
     session_path: str,
     backend_url: str = "http://localhost:8000",
     driver_name: str = "Default Driver",
-    timeout: int = 60
+    timeout: int = 60,
+    http: Optional[requests.Session] = None,
+    progress: Optional[ProgressCallback] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_bytes_per_s: Optional[float] = None
 ) -> Optional[Dict[str, Any]]:
     """
     Upload a session file to the FastAPI backend.
+
+    The request body is streamed from disk (utils/multipart.py), so memory
+    use does not grow with the file size.
     
     Args:
-        session_path: Path to the .jsonl.gz session file
+        session_path: Path to the session file (.jsonl.gz, .jsonl.zst, ..., .tsf)
         backend_url: Base URL of the FastAPI backend
         driver_name: Name of the driver
         timeout: Request timeout in seconds
+        http: Session to send the request on, reusing its kept-alive
+            connections (default: a new connection per call)
+        progress: Called with (bytes sent, total bytes) as the body is sent
+        chunk_size: Bytes read from the file at a time
+        max_bytes_per_s: Upload bandwidth limit (default: unlimited)
     
     Returns:
         Response dict from the backend, or None on error
@@ -79,32 +96,9 @@ def upload_session(
     if not os.path.exists(session_path):
         raise FileNotFoundError(f"Session file not found: {session_path}")
     
-    # Extract metadata from the session file
-    metadata = extract_session_metadata(session_path)
-    
-    # Prepare the upload
-    upload_url = f"{backend_url}/sessions/upload"
-    
     try:
-        with open(session_path, "rb") as f:
-            files = {
-                "file": (os.path.basename(session_path), f, "application/gzip")
-            }
-            data = {
-                "driver_name": driver_name,
-                "car": metadata["car"],
-                "track": metadata["track"],
-                "duration": metadata["duration"],
-            }
-            
-            response = requests.post(
-                upload_url,
-                files=files,
-                data=data,
-                timeout=timeout
-            )
-            response.raise_for_status()
-            return response.json()
+        return send_session(session_path, backend_url, driver_name, timeout, http,
+                            progress, chunk_size, max_bytes_per_s)
     
     except requests.exceptions.RequestException as e:
         print(f"Upload failed: {e}")
@@ -119,19 +113,200 @@ def upload_session(
         return None
 
 
+def send_session(
+    session_path: str,
+    backend_url: str = "http://localhost:8000",
+    driver_name: str = "Default Driver",
+    timeout: int = 60,
+    http: Optional[requests.Session] = None,
+    progress: Optional[ProgressCallback] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_bytes_per_s: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Upload a session file like upload_session, but raise on failure
+    (requests exceptions, including HTTPError for error responses) so
+    callers can decide whether to retry.
+    """
+    # Metadata from the session library (reads the file only if not indexed yet)
+    metadata = session_metadata(session_path)
+    
+    # Prepare the upload
+    upload_url = f"{backend_url}/sessions/upload"
+    
+    body = MultipartEncoder(
+        fields={
+            "driver_name": driver_name,
+            "car": metadata["car"],
+            "track": metadata["track"],
+            "duration": metadata["duration"],
+        },
+        files={
+            "file": (
+                os.path.basename(session_path),
+                session_path,
+                "application/octet-stream" if is_v2_file(session_path) else detect_codec(session_path).mime_type
+            )
+        },
+        chunk_size=chunk_size,
+        progress=progress,
+        max_bytes_per_s=max_bytes_per_s
+    )
+    try:
+        response = (http or requests).post(
+            upload_url,
+            data=body,
+            headers={"Content-Type": body.content_type},
+            timeout=timeout
+        )
+    finally:
+        body.close()
+    response.raise_for_status()
+    return response.json()
+
+
 def list_session_files(sessions_dir: str = "sessions") -> list:
     """
     List all session files in the sessions directory.
     Returns list of file paths sorted by modification time (newest first).
+    The directory is rescanned incrementally against the session library.
     """
-    sessions_path = Path(sessions_dir)
-    if not sessions_path.exists():
-        return []
-    
-    files = sorted(
-        sessions_path.glob("session_*.jsonl.gz"),
-        key=lambda p: p.stat().st_mtime,
-        reverse=True
-    )
-    return [str(f) for f in files]
+    return [entry.path for entry in list_sessions(sessions_dir)]
+
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 hex digest of a session file, as stored by the backend."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def create_http_session(pool_size: int = 4) -> requests.Session:
+    """A requests.Session keeping up to `pool_size` connections alive per host."""
+    http = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    http.mount("http://", adapter)
+    http.mount("https://", adapter)
+    return http
+
+
+def find_known_hashes(
+    hashes: Iterable[str],
+    backend_url: str = "http://localhost:8000",
+    http: Optional[requests.Session] = None,
+    timeout: int = 30
+) -> Dict[str, int]:
+    """
+    Ask the backend which file hashes it already has.
+    Returns {sha256: session_id}; empty if the backend does not support the lookup.
+    """
+    hashes = list(hashes)
+    known: Dict[str, int] = {}
+    for start in range(0, len(hashes), HASH_LOOKUP_BATCH):
+        response = (http or requests).post(
+            f"{backend_url}/sessions/known-hashes",
+            json={"sha256": hashes[start:start + HASH_LOOKUP_BATCH]},
+            timeout=timeout
+        )
+        if response.status_code in (404, 405):
+            # Older backend without the endpoint: upload everything
+            return {}
+        response.raise_for_status()
+        known.update(response.json().get("known", {}))
+    return known
+
+
+@dataclass
+class BatchFileResult:
+    path: str
+    status: str  # "uploaded", "skipped" or "failed"
+    size: int
+    session_id: Optional[int] = None
+    elapsed: float = 0.0
+    response: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class BatchUploadResult:
+    files: List[BatchFileResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def count(self, status: str) -> int:
+        return sum(1 for f in self.files if f.status == status)
+
+    @property
+    def uploaded_bytes(self) -> int:
+        return sum(f.size for f in self.files if f.status == "uploaded")
+
+    @property
+    def throughput_mb_s(self) -> float:
+        return self.uploaded_bytes / 1024 / 1024 / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def upload_sessions(
+    session_paths: Iterable[str],
+    backend_url: str = "http://localhost:8000",
+    driver_name: str = "Default Driver",
+    workers: int = 4,
+    skip_existing: bool = True,
+    timeout: int = 60,
+    on_result: Optional[Callable[[BatchFileResult], None]] = None
+) -> BatchUploadResult:
+    """
+    Upload many session files over one pooled, kept-alive HTTP session
+    using up to `workers` concurrent uploads.
+
+    Files whose content hash the backend already has, and repeats of a file
+    earlier in the batch, are skipped unless `skip_existing` is False. `on_result` is called (from worker threads)
+    as each file finishes.
+    """
+    paths = list(dict.fromkeys(str(p) for p in session_paths))
+    result = BatchUploadResult()
+    started = time.perf_counter()
+
+    with create_http_session(workers) as http:
+        # Hashes come from the session library; only new or changed files are read
+        hashes = {path: session_info(path).sha256 for path in paths}
+        known: Dict[str, int] = {}
+        if skip_existing and paths:
+            try:
+                known = find_known_hashes(set(hashes.values()), backend_url, http)
+            except requests.exceptions.RequestException as e:
+                print(f"Could not check for already uploaded files: {e}")
+
+        first_with_hash: Dict[str, str] = {}
+        for path in paths:
+            first_with_hash.setdefault(hashes[path], path)
+
+        def upload_one(path: str) -> BatchFileResult:
+            size = os.path.getsize(path)
+            if hashes[path] in known:
+                return BatchFileResult(path, "skipped", size, session_id=known[hashes[path]])
+            if skip_existing and first_with_hash[hashes[path]] != path:
+                return BatchFileResult(path, "skipped", size)
+            file_started = time.perf_counter()
+            response = upload_session(path, backend_url, driver_name, timeout, http=http)
+            return BatchFileResult(
+                path,
+                "uploaded" if response else "failed",
+                size,
+                session_id=response.get("id") if response else None,
+                elapsed=time.perf_counter() - file_started,
+                response=response,
+            )
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [pool.submit(upload_one, path) for path in paths]
+            for future in as_completed(futures):
+                file_result = future.result()
+                result.files.append(file_result)
+                if file_result.session_id is not None:
+                    mark_session_uploaded(os.path.abspath(file_result.path), file_result.session_id)
+                if on_result:
+                    on_result(file_result)
 
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,184 @@
+# telemetry/upload_queue.py
+"""
+Background worker draining the persistent upload queue (db/database.py).
+
+Sessions are queued with `UploadQueueWorker.enqueue` and uploaded on a
+separate thread, at most `max_concurrent` at a time, so recording and the
+UI never wait on the network. Failed uploads are retried with exponential
+backoff (with jitter, honouring Retry-After); client errors such as a
+rejected file are not retried. Jobs survive restarts: anything left
+uploading when the app stopped is queued again on the next start.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import requests
+from db.database import (
+    UploadJob, init_db, enqueue_upload, claim_next_upload, complete_upload, retry_upload,
+    fail_upload, reset_interrupted_uploads, next_upload_due, upload_queue_counts,
+)
+from telemetry.upload import send_session, create_http_session, find_known_hashes
+from telemetry.session_library import session_info
+
+BACKOFF_BASE_S = 5.0
+BACKOFF_MAX_S = 15 * 60.0
+MAX_ATTEMPTS = 12
+# Longest sleep between queue checks when nothing is due
+IDLE_POLL_S = 5.0
+
+# on_event(kind, job, info) kinds:
+#   "started"   info: None
+#   "progress"  info: (bytes sent, total bytes)
+#   "uploaded"  info: backend response dict
+#   "retry"     info: (error message, seconds until the next attempt)
+#   "failed"    info: error message; the job will not be retried
+EventCallback = Callable[[str, UploadJob, object], None]
+
+
+def backoff_delay(attempts: int) -> float:
+    """Seconds to wait after the given number of failed attempts."""
+    delay = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class UploadQueueWorker:
+    """Uploads queued sessions in the background."""
+
+    def __init__(self, max_concurrent: int = 2, on_event: Optional[EventCallback] = None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.on_event = on_event
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._http: Optional[requests.Session] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        init_db()
+        resumed = reset_interrupted_uploads()
+        if resumed:
+            print(f"Resuming {resumed} interrupted upload(s)")
+        self._stopping.clear()
+        self._http = create_http_session(self.max_concurrent)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="upload")
+        self._thread = threading.Thread(target=self._run, name="upload-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Stop taking new jobs. Uploads still running are abandoned when the
+        app exits and picked up again on the next start.
+        """
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def enqueue(self, session_path: str, driver_name: str, backend_url: str) -> UploadJob:
+        job = enqueue_upload(os.path.abspath(session_path), driver_name, backend_url)
+        self._wake.set()
+        return job
+
+    def counts(self) -> dict:
+        return upload_queue_counts()
+
+    def _emit(self, kind: str, job: UploadJob, info=None):
+        if self.on_event:
+            try:
+                self.on_event(kind, job, info)
+            except Exception as e:
+                print(f"Upload queue event handler failed: {e}")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.clear()
+            while True:
+                with self._lock:
+                    if self._active >= self.max_concurrent:
+                        break
+                job = claim_next_upload()
+                if job is None:
+                    break
+                with self._lock:
+                    self._active += 1
+                self._pool.submit(self._process, job)
+
+            due = next_upload_due()
+            wait = IDLE_POLL_S if due is None else min(IDLE_POLL_S, max(0.0, due - time.time()))
+            self._wake.wait(wait if wait > 0 else 0.05)
+
+    def _process(self, job: UploadJob):
+        try:
+            self._upload(job)
+        except Exception as e:
+            # Never let a bug lose the job
+            self._retry(job, f"Unexpected error: {e}")
+        finally:
+            with self._lock:
+                self._active -= 1
+            self._wake.set()
+
+    def _upload(self, job: UploadJob):
+        if not os.path.exists(job.session_path):
+            fail_upload(job.id, "Session file no longer exists")
+            self._emit("failed", job, "Session file no longer exists")
+            return
+
+        if job.attempts > 1:
+            # An earlier attempt may have reached the server before failing
+            try:
+                known = find_known_hashes([session_info(job.session_path).sha256], job.backend_url, self._http)
+            except requests.exceptions.RequestException:
+                known = {}
+            if known:
+                session_id = next(iter(known.values()))
+                complete_upload(job.id, session_id)
+                self._emit("uploaded", job, {"id": session_id, "driver_name": job.driver_name})
+                return
+
+        self._emit("started", job)
+        try:
+            result = send_session(
+                job.session_path,
+                backend_url=job.backend_url,
+                driver_name=job.driver_name,
+                http=self._http,
+                progress=lambda sent, total: self._emit("progress", job, (sent, total)),
+            )
+        except requests.exceptions.HTTPError as e:
+            response = e.response
+            status = response.status_code if response is not None else None
+            detail = f"HTTP {status}: {response.text[:200] if response is not None else e}"
+            if status is not None and 400 <= status < 500 and status not in (408, 429):
+                # The server rejected the file; retrying will not help
+                fail_upload(job.id, detail)
+                self._emit("failed", job, detail)
+                return
+            retry_after = response.headers.get("Retry-After") if response is not None else None
+            self._retry(job, detail, float(retry_after) if retry_after and retry_after.isdigit() else None)
+            return
+        except (requests.exceptions.RequestException, OSError) as e:
+            self._retry(job, str(e))
+            return
+
+        complete_upload(job.id, result.get("id"))
+        self._emit("uploaded", job, result)
+
+    def _retry(self, job: UploadJob, error: str, delay: Optional[float] = None):
+        if job.attempts >= MAX_ATTEMPTS:
+            message = f"Gave up after {job.attempts} attempts: {error}"
+            fail_upload(job.id, message)
+            self._emit("failed", job, message)
+            return
+        delay = max(delay or 0.0, backoff_delay(job.attempts))
+        retry_upload(job.id, error, time.time() + delay)
+        self._emit("retry", job, (error, delay))
@@ -0,0 +1,174 @@
+# tools/benchmark_upload.py
+"""
+Benchmark session upload throughput and client memory.
+
+Compares the streaming multipart encoder (utils/multipart.py) at several
+disk read (chunk) sizes with the old in-memory `requests.post(files=...)`
+body. urllib3 sends the body in 16 KiB blocks whatever the chunk size, so
+the chunk size only changes how often the file is read. Each run happens
+in its own subprocess so peak RSS is measured per run.
+
+By default a large file of random bytes is generated and sent to a local
+sink server that reads and discards the body, so only the client side is
+measured. Point --backend at a real server (with --file set to a real
+session) to include the network and the server.
+
+Usage:
+    python tools/benchmark_upload.py                         # 500 MB file, local sink
+    python tools/benchmark_upload.py --size-mb 100 --chunk-kb 64 256 1024
+    python tools/benchmark_upload.py --file big.jsonl.gz --backend http://localhost:8000
+    python tools/benchmark_upload.py --limit-mbps 20         # throttled upload
+"""
+import sys
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Fix import path
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import requests
+from utils.multipart import MultipartEncoder
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    """Reads and discards request bodies."""
+
+    def do_POST(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+        body = json.dumps({"id": 0}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_test_file(size_mb: int) -> str:
+    """Random (incompressible) bytes, written in 8 MB blocks."""
+    fd, path = tempfile.mkstemp(suffix=".jsonl.gz", prefix="upload_bench_")
+    with os.fdopen(fd, "wb") as f:
+        for _ in range(size_mb // 8):
+            f.write(os.urandom(8 * 1024 * 1024))
+        f.write(os.urandom(size_mb % 8 * 1024 * 1024))
+    return path
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_once(url: str, path: str, mode: str, chunk_kb: int, limit_mbps: float) -> dict:
+    """One upload in this process; returns timings and peak memory."""
+    fields = {"driver_name": "Benchmark", "car": "Unknown", "track": "Unknown", "duration": 0.0}
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    if mode == "buffered":
+        with open(path, "rb") as f:
+            response = requests.post(url, data=fields,
+                                     files={"file": (os.path.basename(path), f, "application/gzip")},
+                                     timeout=600)
+    else:
+        body = MultipartEncoder(
+            fields=fields,
+            files={"file": (os.path.basename(path), path, "application/gzip")},
+            chunk_size=chunk_kb * 1024,
+            max_bytes_per_s=limit_mbps * 1024 * 1024 if limit_mbps else None
+        )
+        response = requests.post(url, data=body, headers={"Content-Type": body.content_type}, timeout=600)
+    elapsed = time.perf_counter() - started
+    return {
+        "status": response.status_code,
+        "seconds": elapsed,
+        "mb_s": os.path.getsize(path) / 1024 / 1024 / elapsed,
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming vs in-memory session uploads")
+    parser.add_argument("--size-mb", type=int, default=500, help="Size of the generated test file (default: 500)")
+    parser.add_argument("--file", help="Upload this file instead of a generated one")
+    parser.add_argument("--backend", help="Backend URL (default: a local sink server)")
+    parser.add_argument("--chunk-kb", type=int, nargs="+", default=[64, 256, 1024],
+                        help="Disk read sizes for the streaming encoder to try, in KB (default: 64 256 1024)")
+    parser.add_argument("--limit-mbps", type=float, default=0, help="Throttle streaming uploads to this many MB/s")
+    parser.add_argument("--skip-buffered", action="store_true", help="Do not run the in-memory baseline")
+    parser.add_argument("--run", nargs=5, metavar=("URL", "PATH", "MODE", "CHUNK_KB", "LIMIT"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        url, path, mode, chunk_kb, limit = args.run
+        print(json.dumps(run_once(url, path, mode, int(chunk_kb), float(limit))))
+        return
+
+    server = None
+    if args.backend:
+        url = f"{args.backend}/sessions/upload"
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SinkHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/sessions/upload"
+
+    path = args.file
+    generated = path is None
+    if generated:
+        print(f"Generating {args.size_mb} MB test file...")
+        path = make_test_file(args.size_mb)
+    size_mb = os.path.getsize(path) / 1024 / 1024
+
+    runs = [("stream", kb) for kb in args.chunk_kb]
+    if not args.skip_buffered:
+        runs.append(("buffered", 0))
+
+    print(f"Uploading {size_mb:.0f} MB to {url}\n")
+    print(f"{'mode':<10} {'chunk':>8} {'seconds':>8} {'MB/s':>8} {'peak RSS MB':>12} {'status':>7}")
+    try:
+        for mode, chunk_kb in runs:
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", url, path, mode, str(chunk_kb), str(args.limit_mbps)],
+                capture_output=True, text=True
+            )
+            if output.returncode != 0:
+                print(f"{mode:<10} failed: {output.stderr.strip().splitlines()[-1] if output.stderr else ''}")
+                continue
+            r = json.loads(output.stdout.strip().splitlines()[-1])
+            chunk = f"{chunk_kb} KB" if mode == "stream" else "-"
+            print(f"{mode:<10} {chunk:>8} {r['seconds']:>8.2f} {r['mb_s']:>8.1f} "
+                  f"{r['peak_rss_mb']:>12.0f} {r['status']:>7}")
+    finally:
+        if generated:
+            os.unlink(path)
+        if server:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
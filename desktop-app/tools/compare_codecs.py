@@ -0,0 +1,125 @@
+# tools/compare_codecs.py
+"""
+Compare compression codecs (utils/compression.py) on recorded sessions:
+compressed size, ratio and encode/decode throughput (MB/s of uncompressed
+data) per codec and level.
+
+The payload is each session as a .jsonl stream (what a .jsonl.* recording
+holds), or with --payload binary as v2 blocks of packed samples
+(telemetry/sample_encoding.py), each compressed on its own as in a .tsf
+file. Codecs whose package is not installed are skipped.
+
+Usage:
+    python tools/compare_codecs.py                                  # all of sessions/
+    python tools/compare_codecs.py sessions/ --payload binary --block-samples 1024
+    python tools/compare_codecs.py sessions/ --codec zstd --levels 1,3,9,19 --repeat 5
+"""
+import sys
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+
+# Fix import path
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from telemetry.session_file import read_samples, DEFAULT_BLOCK_SAMPLES
+from telemetry.sample_encoding import encode_samples
+from telemetry.session_library import SESSION_SUFFIXES
+from utils.compression import CODECS, Codec, get_codec
+
+DEFAULT_LEVELS = {"gzip": [1, 6, 9], "zstd": [1, 3, 9, 19], "lz4": [0, 9], "none": [0]}
+
+
+def input_files(paths: list) -> list:
+    files = []
+    for p in paths:
+        path = Path(p)
+        if path.is_dir():
+            files.extend(sorted(f for f in path.iterdir() if f.name.endswith(SESSION_SUFFIXES)))
+        elif path.is_file():
+            files.append(path)
+        else:
+            print(f"Warning: {p} not found")
+    return files
+
+
+def load_payloads(files: list, payload: str, block_samples: int) -> List[bytes]:
+    """The buffers each codec compresses: one per session, or one per v2 block."""
+    buffers = []
+    for path in files:
+        samples = list(read_samples(path))
+        if not samples:
+            continue
+        if payload == "jsonl":
+            buffers.append("".join(json.dumps(s, default=str) + "\n" for s in samples).encode("utf-8"))
+        else:
+            for i in range(0, len(samples), block_samples):
+                buffers.append(encode_samples(samples[i:i + block_samples]))
+    return buffers
+
+
+def measure(codec: Codec, level: Optional[int], buffers: List[bytes], repeat: int) -> dict:
+    """Best-of-`repeat` encode and decode times over all buffers."""
+    encode_s = decode_s = float("inf")
+    compressed = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        compressed = [codec.compress(b, level) for b in buffers]
+        encode_s = min(encode_s, time.perf_counter() - started)
+        started = time.perf_counter()
+        decoded = [codec.decompress(c) for c in compressed]
+        decode_s = min(decode_s, time.perf_counter() - started)
+        if decoded != buffers:
+            raise ValueError(f"{codec.name} level {level}: round trip changed the data")
+    raw = sum(len(b) for b in buffers)
+    size = sum(len(c) for c in compressed)
+    mb = raw / 1024 / 1024
+    return {
+        "size": size,
+        "ratio": raw / size if size else 0.0,
+        "encode_mb_s": mb / encode_s if encode_s else float("inf"),
+        "decode_mb_s": mb / decode_s if decode_s else float("inf"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare compression codecs on recorded sessions")
+    parser.add_argument("paths", nargs="*", help="Session files or directories (default: sessions/)")
+    parser.add_argument("--payload", choices=["jsonl", "binary"], default="jsonl",
+                        help="Compress whole .jsonl streams, or binary v2 blocks (default: jsonl)")
+    parser.add_argument("--block-samples", type=int, default=DEFAULT_BLOCK_SAMPLES,
+                        help=f"Samples per block with --payload binary (default: {DEFAULT_BLOCK_SAMPLES})")
+    parser.add_argument("--codec", action="append", choices=list(CODECS),
+                        help="Codec to compare (repeatable; default: all installed)")
+    parser.add_argument("--levels", help="Comma-separated levels for every codec (default: a few per codec)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, best is kept (default: 3)")
+    args = parser.parse_args()
+
+    files = input_files(args.paths or [str(PROJECT_ROOT / "sessions")])
+    buffers = load_payloads(files, args.payload, max(1, args.block_samples))
+    if not buffers:
+        print("No samples found")
+        sys.exit(1)
+    raw = sum(len(b) for b in buffers)
+    print(f"{len(files)} session files, {len(buffers)} {args.payload} buffers, "
+          f"{raw / 1024 / 1024:.1f} MB uncompressed\n")
+
+    print(f"{'codec':<6} {'level':>5} {'size KB':>10} {'ratio':>7} {'encode MB/s':>12} {'decode MB/s':>12}")
+    for name in args.codec or list(CODECS):
+        codec = get_codec(name)
+        if not codec.available:
+            print(f"{name:<6} (skipped: needs the {codec.module} package)")
+            continue
+        levels = [int(v) for v in args.levels.split(",")] if args.levels else DEFAULT_LEVELS[name]
+        for level in levels:
+            result = measure(codec, level, buffers, max(1, args.repeat))
+            print(f"{name:<6} {codec.level(level):>5} {result['size'] / 1024:>10.0f} {result['ratio']:>7.2f} "
+                  f"{result['encode_mb_s']:>12.1f} {result['decode_mb_s']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
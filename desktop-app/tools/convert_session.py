@@ -0,0 +1,153 @@
+# tools/convert_session.py
+"""
+Convert session files between .jsonl streams (.jsonl.gz, .jsonl.zst,
+.jsonl.lz4, .jsonl) and the indexed v2 format (.tsf, see
+telemetry/session_file.py), or recompress a .jsonl stream with another
+codec (utils/compression.py).
+
+Each input is written next to itself (or to --output-dir) with the new
+extension; inputs are left in place. With --verify the output is read back
+and compared sample by sample.
+
+Usage:
+    python tools/convert_session.py                              # all of sessions/ to v2
+    python tools/convert_session.py sessions/session_20251107_142224.jsonl.gz --verify
+    python tools/convert_session.py sessions/ --block-samples 1024 --output-dir converted/
+    python tools/convert_session.py sessions/ --encoding json     # v2 with JSON blocks
+    python tools/convert_session.py sessions/*.tsf --to jsonl     # back to .jsonl.gz
+    python tools/convert_session.py sessions/ --to jsonl --codec zstd --level 9   # .jsonl.zst
+    python tools/convert_session.py sessions/ --codec lz4         # v2 with lz4 blocks
+"""
+import sys
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+# Fix import path
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from telemetry.session_file import (
+    SessionFileWriter, read_samples, DEFAULT_BLOCK_SAMPLES, V2_SUFFIX, ENCODINGS,
+)
+from utils.compression import CODECS, JSONL_SUFFIXES, get_codec, open_session_file
+
+
+def input_files(paths: list) -> list:
+    files = []
+    for p in paths:
+        path = Path(p)
+        if path.is_dir():
+            files.extend(sorted(f for f in path.iterdir() if f.name.endswith(JSONL_SUFFIXES + (V2_SUFFIX,))))
+        elif path.is_file():
+            files.append(path)
+        else:
+            print(f"Warning: {p} not found")
+    return files
+
+
+def output_path(src: Path, to: str, codec: str = "gzip", output_dir: Optional[str] = None) -> Path:
+    # Longest match first: ".jsonl" is a prefix of the other suffixes
+    suffix = next((s for s in sorted(JSONL_SUFFIXES, key=len, reverse=True) if src.name.endswith(s)), None)
+    stem = src.name[:-len(suffix)] if suffix else src.stem
+    name = stem + (V2_SUFFIX if to == "v2" else ".jsonl" + get_codec(codec).suffix)
+    return Path(output_dir) / name if output_dir else src.with_name(name)
+
+
+def convert(src: Path, dest: Path, to: str, block_samples: int, encoding: str = "binary",
+            codec: str = "gzip", level: Optional[int] = None) -> int:
+    """Write `src` to `dest` in the target format; returns the sample count."""
+    count = 0
+    tmp = dest.with_name(dest.name + ".tmp")
+    if to == "v2":
+        # gzip's deflate is stored as plain zlib inside blocks
+        with SessionFileWriter(tmp, block_samples=block_samples, encoding=encoding, compresslevel=level,
+                               compression="zlib" if codec == "gzip" else codec,
+                               metadata={"converted_from": src.name}) as writer:
+            for sample in read_samples(src):
+                writer.write(sample)
+                count += 1
+    else:
+        with open_session_file(tmp, "wt", codec, level) as f:
+            for sample in read_samples(src):
+                f.write(json.dumps(sample, default=str) + "\n")
+                count += 1
+    os.replace(tmp, dest)
+    # Keep recording times meaningful for sorting by mtime
+    stat = src.stat()
+    os.utime(dest, (stat.st_atime, stat.st_mtime))
+    return count
+
+
+def verify(src: Path, dest: Path) -> bool:
+    sentinel = object()
+    a, b = read_samples(src), read_samples(dest)
+    while True:
+        x, y = next(a, sentinel), next(b, sentinel)
+        if x != y:
+            return False
+        if x is sentinel:
+            return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert telemetry session files between .jsonl and v2 (.tsf)")
+    parser.add_argument("paths", nargs="*", help="Session files or directories (default: sessions/)")
+    parser.add_argument("--to", choices=["v2", "jsonl"], default="v2", help="Target format (default: v2)")
+    parser.add_argument("--block-samples", type=int, default=DEFAULT_BLOCK_SAMPLES,
+                        help=f"Samples per v2 block (default: {DEFAULT_BLOCK_SAMPLES})")
+    parser.add_argument("--encoding", choices=ENCODINGS, default="binary",
+                        help="Sample encoding inside v2 blocks (default: binary)")
+    parser.add_argument("--codec", choices=list(CODECS), default="gzip",
+                        help="Compression: of the .jsonl stream, or of each v2 block (default: gzip)")
+    parser.add_argument("--level", type=int, help="Compression level (default: the codec's default)")
+    parser.add_argument("--output-dir", help="Write converted files here instead of next to the inputs")
+    parser.add_argument("--overwrite", action="store_true", help="Replace existing output files")
+    parser.add_argument("--verify", action="store_true", help="Read each output back and compare the samples")
+    args = parser.parse_args()
+
+    files = input_files(args.paths or [str(PROJECT_ROOT / "sessions")])
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    converted = failed = 0
+    in_bytes = out_bytes = 0
+    started = time.perf_counter()
+    for src in files:
+        dest = output_path(src, args.to, args.codec, args.output_dir)
+        if dest.resolve() == src.resolve():
+            print(f"  - {src.name} is already {args.to}")
+            continue
+        if dest.exists() and not args.overwrite:
+            print(f"  - {dest.name} exists (use --overwrite)")
+            continue
+        try:
+            count = convert(src, dest, args.to, args.block_samples, args.encoding, args.codec, args.level)
+        except Exception as e:
+            print(f"  ✗ {src.name}: {e}")
+            failed += 1
+            continue
+        if args.verify and not verify(src, dest):
+            print(f"  ✗ {src.name}: samples differ after conversion")
+            failed += 1
+            continue
+        src_size, dest_size = src.stat().st_size, dest.stat().st_size
+        in_bytes += src_size
+        out_bytes += dest_size
+        converted += 1
+        print(f"  ✓ {src.name} -> {dest.name} ({count} samples, "
+              f"{src_size / 1024:.0f} KB -> {dest_size / 1024:.0f} KB)")
+
+    print(f"\nConverted {converted}, failed {failed} in {time.perf_counter() - started:.1f}s")
+    if converted:
+        print(f"  {in_bytes / 1024 / 1024:.1f} MB -> {out_bytes / 1024 / 1024:.1f} MB")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
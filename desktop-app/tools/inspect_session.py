@@ -1,22 +1,45 @@
 # tools/inspect_session.py
-import gzip
 import json
 import sys
 from pathlib import Path
 
+# Fix import path
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from telemetry.session_file import SessionFileReader, is_v2_file
+from utils.compression import detect_codec, open_session_file
+
 # Use provided argument, or fall back to the latest session file
 if len(sys.argv) > 1:
     path = Path(sys.argv[1])
 else:
     sessions_dir = Path(__file__).resolve().parent.parent / "sessions"
-    latest = sorted(sessions_dir.glob("session_*.jsonl.gz"))[-1]
+    latest = sorted(sessions_dir.glob("session_*.*"))[-1]
     path = latest
 
+if is_v2_file(path):
+    # v2: header, footer and the first/last blocks only
+    with SessionFileReader(path) as reader:
+        print(f"Analyzing session: {path.name} (format v2, {len(reader.blocks)} {reader.compression} blocks"
+              f"{'' if reader.complete else ', not closed cleanly'})")
+        print("Samples:", reader.sample_count)
+        print("\nHeader:")
+        print(json.dumps(reader.header, indent=2))
+        print("\nSummary:")
+        print(json.dumps(reader.summary, indent=2))
+        print("\nFirst sample:")
+        print(json.dumps(reader.first_sample(), indent=2))
+        print("\nLast sample:")
+        print(json.dumps(reader.last_sample(), indent=2))
+    sys.exit(0)
+
 count = 0
 first = None
 last = None
 
-with gzip.open(path, "rt", encoding="utf-8") as f:
+with open_session_file(path, "rt") as f:
     for line in f:
         obj = json.loads(line)
         count += 1
@@ -24,7 +47,7 @@ with gzip.open(path, "rt", encoding="utf-8") as f:
             first = obj
         last = obj
 
-print(f"Analyzing session: {path.name}")
+print(f"Analyzing session: {path.name} ({detect_codec(path).name} compression)")
 print("Samples:", count)
 print("\nFirst sample:")
 print(json.dumps(first, indent=2))
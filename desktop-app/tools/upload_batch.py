@@ -0,0 +1,118 @@
+# tools/upload_batch.py
+"""
+CLI tool to upload many session files to the FastAPI backend at once.
+
+Files are uploaded concurrently over one kept-alive connection pool, and
+files the backend already has (same content hash) are skipped.
+
+Usage:
+    python tools/upload_batch.py                          # everything in sessions/
+    python tools/upload_batch.py sessions/ other_dir/ --workers 8
+    python tools/upload_batch.py "sessions/session_202511*.jsonl.gz" --driver "My Name"
+"""
+import sys
+import argparse
+import glob
+import threading
+from pathlib import Path
+
+# Fix import path
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from telemetry.upload import upload_sessions, list_session_files
+from telemetry.session_library import SESSION_SUFFIXES
+
+
+def expand_paths(patterns: list) -> list:
+    """Session files from files, directories and glob patterns, in the given order."""
+    paths = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            paths.extend(sorted(str(p) for p in path.iterdir() if p.name.endswith(SESSION_SUFFIXES)))
+        elif path.is_file():
+            paths.append(str(path))
+        else:
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                print(f"Warning: No session files match {pattern}")
+            paths.extend(m for m in matches if m.endswith(SESSION_SUFFIXES))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload many telemetry session files to the backend")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="Session files, directories or glob patterns (default: all sessions in sessions/)"
+    )
+    parser.add_argument(
+        "--driver",
+        default="Default Driver",
+        help="Driver name (default: 'Default Driver')"
+    )
+    parser.add_argument(
+        "--backend",
+        default="http://localhost:8000",
+        help="Backend URL (default: http://localhost:8000)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Concurrent uploads (default: 4)"
+    )
+    parser.add_argument(
+        "--no-skip",
+        action="store_true",
+        help="Upload files even if the backend already has them"
+    )
+
+    args = parser.parse_args()
+
+    paths = expand_paths(args.paths) if args.paths else list_session_files()
+    if not paths:
+        print("Error: No session files found.")
+        sys.exit(1)
+
+    print(f"Uploading {len(paths)} session file(s) to {args.backend} with {args.workers} workers...")
+    print(f"Driver: {args.driver}")
+
+    print_lock = threading.Lock()
+
+    def report(file_result):
+        with print_lock:
+            name = Path(file_result.path).name
+            if file_result.status == "uploaded":
+                rate = file_result.size / 1024 / 1024 / file_result.elapsed if file_result.elapsed else 0.0
+                print(f"  ✓ {name} -> session {file_result.session_id} "
+                      f"({file_result.size / 1024:.0f} KB, {rate:.2f} MB/s)")
+            elif file_result.status == "skipped":
+                where = f"session {file_result.session_id}" if file_result.session_id else "duplicate in batch"
+                print(f"  - {name} already uploaded ({where})")
+            else:
+                print(f"  ✗ {name} failed")
+
+    result = upload_sessions(
+        paths,
+        backend_url=args.backend,
+        driver_name=args.driver,
+        workers=args.workers,
+        skip_existing=not args.no_skip,
+        on_result=report
+    )
+
+    uploaded = result.count("uploaded")
+    print(f"\nUploaded {uploaded}, skipped {result.count('skipped')}, failed {result.count('failed')} "
+          f"in {result.elapsed:.1f}s")
+    print(f"  {result.uploaded_bytes / 1024 / 1024:.1f} MB at {result.throughput_mb_s:.2f} MB/s, "
+          f"{uploaded / result.elapsed if result.elapsed else 0:.1f} files/s")
+    if result.count("failed"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,23 +3,25 @@ import os
 import time
 from PyQt6.QtWidgets import (
     QMainWindow, QPushButton, QVBoxLayout, QWidget, QLabel, QHBoxLayout, QComboBox,
-    QLineEdit, QMessageBox, QTabWidget
+    QLineEdit, QMessageBox, QTabWidget, QProgressBar
 )
 from PyQt6.QtCore import QTimer, pyqtSignal, QObject
 from telemetry.listener import TelemetryListener
 from telemetry.simulator import TrackSimulator
-from telemetry.storage import SessionWriter
-from telemetry.upload import upload_session
+from telemetry.storage import SessionWriter, new_session_path
+from telemetry.upload_queue import UploadQueueWorker
+from telemetry.upload import list_session_files
+from telemetry.session_library import index_session_file
 from ui.visualization_widget import VisualizationWidget
 import threading
 import queue
 
 class UploadSignals(QObject):
-    """Signals for thread-safe UI updates from upload thread."""
-    success = pyqtSignal(dict)  # Emits result dict
-    failed = pyqtSignal()  # Emits when upload fails
-    error = pyqtSignal(str)  # Emits error message
-    finished = pyqtSignal()  # Emits when upload thread finishes
+    """Signals for thread-safe UI updates from upload queue threads."""
+    success = pyqtSignal(str, dict)  # Emits file name and result dict
+    failed = pyqtSignal(str, str)  # Emits file name and error; will not be retried
+    retry = pyqtSignal(str, str, float)  # Emits file name, error and seconds until retry
+    progress = pyqtSignal(str, int)  # Emits file name and percent of the file sent
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -43,8 +45,14 @@ class MainWindow(QMainWindow):
         self.upload_signals = UploadSignals()
         self.upload_signals.success.connect(self._show_upload_success)
         self.upload_signals.failed.connect(self._show_upload_failed)
-        self.upload_signals.error.connect(self._show_upload_error)
-        self.upload_signals.finished.connect(self._reset_upload_button)
+        self.upload_signals.retry.connect(self._show_upload_retry)
+        self.upload_signals.progress.connect(self._show_upload_progress)
+        
+        # Persistent upload queue, drained in the background (resumes
+        # uploads left over from the last run)
+        self._upload_percent = {}
+        self.upload_worker = UploadQueueWorker(max_concurrent=2, on_event=self._on_upload_event)
+        self.upload_worker.start()
 
         # Create tabs
         self.tabs = QTabWidget()
@@ -91,6 +99,10 @@ class MainWindow(QMainWindow):
         
         self.upload_btn = QPushButton("Upload Last Session")
         self.upload_btn.clicked.connect(self.upload_last_session)
+        self.upload_progress = QProgressBar()
+        self.upload_progress.setRange(0, 100)
+        self.upload_progress.setVisible(False)
+        self.upload_queue_label = QLabel("Upload queue: empty")
 
         # Control tab layout
         control_layout.addWidget(self.speed_label)
@@ -119,6 +131,8 @@ class MainWindow(QMainWindow):
         control_layout.addWidget(self.driver_name_input)
         control_layout.addWidget(self.backend_url_input)
         control_layout.addWidget(self.upload_btn)
+        control_layout.addWidget(self.upload_progress)
+        control_layout.addWidget(self.upload_queue_label)
         
         control_layout.addStretch()
         control_widget.setLayout(control_layout)
@@ -137,6 +151,13 @@ class MainWindow(QMainWindow):
         self.timer.setInterval(100)  # ms
         self.timer.timeout.connect(self.poll_queue)
         self.timer.start()
+        
+        # Timer to refresh upload queue status
+        self.upload_queue_timer = QTimer()
+        self.upload_queue_timer.setInterval(1000)  # ms
+        self.upload_queue_timer.timeout.connect(self.update_upload_queue_status)
+        self.upload_queue_timer.start()
+        self.update_upload_queue_status()
 
     def start_listener(self):
         if self.listener_thread and self.listener_thread.is_alive():
@@ -173,7 +194,7 @@ class MainWindow(QMainWindow):
     def start_session(self):
         # create sessions directory
         os.makedirs("sessions", exist_ok=True)
-        fname = time.strftime("sessions/session_%Y%m%d_%H%M%S.jsonl.gz")
+        fname = new_session_path("sessions")
         self.session_writer = SessionWriter(fname)
         self.current_session_path = fname
         self.save_session_btn.setEnabled(False)
@@ -183,8 +204,17 @@ class MainWindow(QMainWindow):
     def stop_session(self):
         if self.session_writer:
             self.session_writer.close()
+            # Add to the session library from what was recorded, without reading the file back
+            try:
+                index_session_file(self.current_session_path, self.session_writer.summary)
+            except Exception as e:
+                print(f"Could not index session: {e}")
+            stats = self.session_writer.stats()
             self.session_writer = None
-            self.status_label.setText(f"Status: saved session -> {self.current_session_path}")
+            dropped = f", {stats['dropped']} dropped" if stats["dropped"] else ""
+            self.status_label.setText(
+                f"Status: saved session -> {self.current_session_path} ({stats['written']} samples{dropped})"
+            )
             self.current_session_path = None
         self.save_session_btn.setEnabled(True)
         self.stop_session_btn.setEnabled(False)
@@ -195,7 +225,10 @@ class MainWindow(QMainWindow):
         try:
             while True:
                 popped = self.queue.get_nowait()
-                # keep consuming to show the latest
+                # record every sample (write() only queues it for the
+                # writer thread); keep consuming to show the latest
+                if self.session_writer:
+                    self.session_writer.write(popped)
         except Exception:
             pass
 
@@ -217,84 +250,97 @@ class MainWindow(QMainWindow):
             # Update visualization widget
             self.visualization_widget.update_telemetry(popped)
 
-            # write to session if active
-            if self.session_writer:
-                self.session_writer.write(popped)
     
-    def _show_upload_success(self, result):
-        """Show success message box (called on main thread)."""
-        QMessageBox.information(
-            self,
-            "Upload Success",
-            f"Session uploaded successfully!\n\n"
-            f"ID: {result.get('id', 'N/A')}\n"
-            f"Driver: {result.get('driver_name', 'N/A')}\n"
-            f"Car: {result.get('car', 'N/A')}\n"
-            f"Track: {result.get('track', 'N/A')}"
+    def _on_upload_event(self, kind, job, info):
+        """Upload queue callback (worker threads): forward to the main thread."""
+        name = os.path.basename(job.session_path)
+        if kind == "progress":
+            sent, total = info
+            # Signal only when the percentage changes, not on every chunk
+            percent = int(sent * 100 / total) if total else 100
+            if self._upload_percent.get(job.id) != percent:
+                self._upload_percent[job.id] = percent
+                self.upload_signals.progress.emit(name, percent)
+        elif kind == "uploaded":
+            self._upload_percent.pop(job.id, None)
+            self.upload_signals.success.emit(name, info)
+        elif kind == "retry":
+            self._upload_percent.pop(job.id, None)
+            error, delay = info
+            self.upload_signals.retry.emit(name, error, delay)
+        elif kind == "failed":
+            self._upload_percent.pop(job.id, None)
+            self.upload_signals.failed.emit(name, info)
+    
+    def _show_upload_success(self, name, result):
+        """Report a finished upload (called on main thread)."""
+        self.statusBar().showMessage(
+            f"Uploaded {name}: session {result.get('id', 'N/A')} "
+            f"({result.get('car', 'N/A')} @ {result.get('track', 'N/A')})",
+            10000
         )
     
-    def _show_upload_failed(self):
+    def _show_upload_failed(self, name, error_msg):
         """Show failed message box (called on main thread)."""
-        QMessageBox.warning(self, "Upload Failed", "Failed to upload session. Check backend connection.")
+        QMessageBox.warning(self, "Upload Failed", f"Failed to upload {name}:\n{error_msg}")
+    
+    def _show_upload_retry(self, name, error_msg, delay):
+        """Report a failed attempt that will be retried (called on main thread)."""
+        self.statusBar().showMessage(f"Upload of {name} failed ({error_msg}); retrying in {delay:.0f}s", 10000)
     
-    def _show_upload_error(self, error_msg):
-        """Show error message box (called on main thread)."""
-        QMessageBox.critical(self, "Upload Error", f"Error during upload:\n{error_msg}")
+    def _show_upload_progress(self, name, percent):
+        """Update the progress bar (called on main thread)."""
+        self.upload_progress.setVisible(True)
+        if percent >= 100:
+            # File sent; the backend is ingesting it
+            self.upload_progress.setRange(0, 0)
+            self.upload_progress.setFormat(f"Processing {name}...")
+        else:
+            self.upload_progress.setRange(0, 100)
+            self.upload_progress.setValue(percent)
+            self.upload_progress.setFormat(f"{name} %p%")
+    
+    def update_upload_queue_status(self):
+        """Refresh the upload queue summary (called by timer)."""
+        try:
+            counts = self.upload_worker.counts()
+        except Exception as e:
+            self.upload_queue_label.setText(f"Upload queue: unavailable ({e})")
+            return
+        waiting = counts["pending"]
+        uploading = counts["uploading"]
+        failed = counts["failed"]
+        if not waiting and not uploading and not failed:
+            self.upload_queue_label.setText("Upload queue: empty")
+        else:
+            self.upload_queue_label.setText(
+                f"Upload queue: {uploading} uploading, {waiting} waiting, {failed} failed"
+            )
+        if not uploading:
+            self.upload_progress.setVisible(False)
     
-    def _reset_upload_button(self):
-        """Reset upload button state (called on main thread)."""
-        self.upload_btn.setEnabled(True)
-        self.upload_btn.setText("Upload Last Session")
+    def closeEvent(self, event):
+        # Unfinished uploads stay queued and resume on the next start
+        self.upload_worker.stop()
+        super().closeEvent(event)
     
     def upload_last_session(self):
-        """Upload the most recent session file to the backend."""
+        """Queue the most recent session file for upload to the backend."""
         if not self.current_session_path:
-            # Try to find the latest session file
-            from pathlib import Path
-            sessions_dir = Path("sessions")
-            if not sessions_dir.exists():
-                QMessageBox.warning(self, "No Session", "No session files found. Please record a session first.")
-                return
-            
-            session_files = sorted(
-                sessions_dir.glob("session_*.jsonl.gz"),
-                key=lambda p: p.stat().st_mtime,
-                reverse=True
-            )
+            # Latest session file from the session library
+            session_files = list_session_files("sessions")
             if not session_files:
                 QMessageBox.warning(self, "No Session", "No session files found. Please record a session first.")
                 return
-            session_path = str(session_files[0])
+            session_path = session_files[0]
         else:
             session_path = self.current_session_path
         
         driver_name = self.driver_name_input.text() or "Default Driver"
         backend_url = self.backend_url_input.text() or "http://localhost:8000"
         
-        self.upload_btn.setEnabled(False)
-        self.upload_btn.setText("Uploading...")
-        
-        def do_upload():
-            """Upload session in background thread - emits signals for UI updates."""
-            try:
-                result = upload_session(
-                    session_path=session_path,
-                    backend_url=backend_url,
-                    driver_name=driver_name
-                )
-                if result:
-                    # Emit signal to show success message on main thread
-                    self.upload_signals.success.emit(result)
-                else:
-                    # Emit signal to show failure message on main thread
-                    self.upload_signals.failed.emit()
-            except Exception as e:
-                # Emit signal to show error message on main thread
-                self.upload_signals.error.emit(str(e))
-            finally:
-                # Emit signal to reset button on main thread
-                self.upload_signals.finished.emit()
-        
-        # Run upload in a separate thread to avoid blocking UI
-        upload_thread = threading.Thread(target=do_upload, daemon=True)
-        upload_thread.start()
+        # Uploads run in the background and are retried until they succeed,
+        # so the button never blocks
+        self.upload_worker.enqueue(session_path, driver_name, backend_url)
+        self.statusBar().showMessage(f"Queued {os.path.basename(session_path)} for upload", 5000)
+        self.update_upload_queue_status()
@@ -0,0 +1,213 @@
+# utils/compression.py
+"""
+Compression codecs for session files.
+
+A codec compresses a whole .jsonl stream (session_*.jsonl.gz, .jsonl.zst,
+.jsonl.lz4, or plain .jsonl) and single v2 blocks (telemetry/session_file.py):
+
+    gzip   .gz    levels 1-9, default 6   always available
+    zstd   .zst   levels 1-22, default 3  needs `zstandard`
+    lz4    .lz4   levels 0-16, default 0  needs `lz4`
+    none   (no suffix)
+
+Writers pick the codec from the file name (codec_for_path) or explicitly;
+readers detect it from the first bytes of the file (detect_codec), so a
+renamed file still opens. Reading a recording that was cut short (the app
+died) returns everything that was flushed, then raises one of
+DECOMPRESSION_ERRORS for gzip and zstd (lz4 just ends).
+"""
+import gzip
+import io
+import zlib
+from typing import Optional, Dict, Tuple
+from utils.zstd_stream import ZstdFrameReader
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # optional dependency
+    lz4_frame = None
+
+
+class Codec:
+    name = ""
+    suffix = ""  # file name suffix after ".jsonl"
+    magic = b""  # first bytes of a compressed stream
+    mime_type = "application/octet-stream"
+    module = ""  # optional package the codec needs
+    levels: Tuple[int, int] = (0, 0)
+    default_level = 0
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def check_available(self):
+        if not self.available:
+            raise RuntimeError(f"{self.name} compression needs the {self.module} package")
+
+    def level(self, level: Optional[int]) -> int:
+        """`level` clamped to the codec's range (None: the default)."""
+        if level is None:
+            return self.default_level
+        low, high = self.levels
+        return min(max(level, low), high)
+
+    def compress(self, data: bytes, level: Optional[int] = None) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def open(self, path, mode: str = "rb", level: Optional[int] = None):
+        """Binary file object ("rb", "wb" or "ab"); appending adds a new frame/member."""
+        raise NotImplementedError
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    suffix = ".gz"
+    magic = b"\x1f\x8b"
+    mime_type = "application/gzip"
+    levels = (1, 9)
+    default_level = 6
+
+    def compress(self, data: bytes, level: Optional[int] = None) -> bytes:
+        return gzip.compress(data, compresslevel=self.level(level), mtime=0)
+
+    def decompress(self, data: bytes) -> bytes:
+        return gzip.decompress(data)
+
+    def open(self, path, mode: str = "rb", level: Optional[int] = None):
+        return gzip.open(path, mode, compresslevel=self.level(level))
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    suffix = ".zst"
+    magic = b"\x28\xb5\x2f\xfd"
+    mime_type = "application/zstd"
+    module = "zstandard"
+    levels = (1, 22)
+    default_level = 3
+
+    @property
+    def available(self) -> bool:
+        return zstandard is not None
+
+    def compress(self, data: bytes, level: Optional[int] = None) -> bytes:
+        self.check_available()
+        return zstandard.ZstdCompressor(level=self.level(level)).compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        self.check_available()
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    def open(self, path, mode: str = "rb", level: Optional[int] = None):
+        self.check_available()
+        if "r" in mode:
+            return io.BufferedReader(ZstdFrameReader(path))
+        # flush() on a writer ends a zstd block, so flushed data is readable
+        return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=self.level(level)))
+
+
+class Lz4Codec(Codec):
+    name = "lz4"
+    suffix = ".lz4"
+    magic = b"\x04\x22\x4d\x18"
+    mime_type = "application/x-lz4"
+    module = "lz4"
+    levels = (0, 16)
+    default_level = 0
+
+    @property
+    def available(self) -> bool:
+        return lz4_frame is not None
+
+    def compress(self, data: bytes, level: Optional[int] = None) -> bytes:
+        self.check_available()
+        return lz4_frame.compress(data, compression_level=self.level(level))
+
+    def decompress(self, data: bytes) -> bytes:
+        self.check_available()
+        return lz4_frame.decompress(data)
+
+    def open(self, path, mode: str = "rb", level: Optional[int] = None):
+        self.check_available()
+        return lz4_frame.open(path, mode, compression_level=self.level(level))
+
+
+class NoCodec(Codec):
+    name = "none"
+    mime_type = "application/x-ndjson"
+
+    def compress(self, data: bytes, level: Optional[int] = None) -> bytes:
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+    def open(self, path, mode: str = "rb", level: Optional[int] = None):
+        return open(path, mode)
+
+
+# Raised while reading a truncated (e.g. still recording) or damaged stream
+DECOMPRESSION_ERRORS: Tuple[type, ...] = (EOFError, zlib.error, gzip.BadGzipFile, RuntimeError)  # lz4: RuntimeError
+if zstandard is not None:
+    DECOMPRESSION_ERRORS += (zstandard.ZstdError,)
+
+CODECS: Dict[str, Codec] = {codec.name: codec for codec in (GzipCodec(), ZstdCodec(), Lz4Codec(), NoCodec())}
+DEFAULT_CODEC = "gzip"
+# Session file names: ".jsonl" + codec suffix
+JSONL_SUFFIXES = tuple(".jsonl" + codec.suffix for codec in CODECS.values())
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown compression codec: {name} (choose from {', '.join(CODECS)})") from None
+
+
+def available_codecs() -> list:
+    return [name for name, codec in CODECS.items() if codec.available]
+
+
+def codec_for_path(path) -> Codec:
+    """Codec named by the file's extension (a file without one is uncompressed)."""
+    name = str(path)
+    for codec in CODECS.values():
+        if codec.suffix and name.endswith(codec.suffix):
+            return codec
+    return CODECS["none"]
+
+
+def detect_codec(path) -> Codec:
+    """Codec of an existing file, from its magic bytes (no match: uncompressed)."""
+    with open(path, "rb") as f:
+        head = f.read(4)
+    for codec in CODECS.values():
+        if codec.magic and head.startswith(codec.magic):
+            return codec
+    return CODECS["none"]
+
+
+def open_session_file(path, mode: str = "rt", codec: Optional[str] = None, level: Optional[int] = None):
+    """
+    Open a .jsonl session stream. Reading detects the codec from the file
+    contents; writing uses `codec`, or the one named by the extension.
+    Text modes ("rt", "wt", "at") decode UTF-8.
+    """
+    if "r" in mode:
+        selected = detect_codec(path)
+    else:
+        selected = get_codec(codec) if codec else codec_for_path(path)
+    binary_mode = mode.replace("t", "") + ("" if "b" in mode else "b")
+    f = selected.open(path, binary_mode, level)
+    if "b" in mode:
+        return f
+    return io.TextIOWrapper(f, encoding="utf-8")
@@ -0,0 +1,127 @@
+# utils/multipart.py
+"""
+Streaming multipart/form-data encoder.
+
+`requests.post(files=...)` builds the whole request body in memory. A
+MultipartEncoder is a file-like body instead: requests (urllib3) reads it
+in blocks while sending (16 KiB each), and file parts are read from disk a
+chunk at a time and handed out in those blocks, so memory use stays at
+about one chunk whatever the file size. The total length is known up
+front, so the request carries a Content-Length.
+"""
+import os
+import time
+import uuid
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+ProgressCallback = Callable[[int, int], None]  # (bytes sent, total bytes)
+
+
+class MultipartEncoder:
+    """
+    File-like multipart/form-data body.
+
+    Args:
+        fields: Plain form fields (values are converted with str())
+        files: Field name -> (file name, path on disk, content type)
+        chunk_size: Bytes read from disk at a time for file parts; it does
+            not limit read(), which returns as much as the caller asks for
+        progress: Called with (bytes sent, total bytes) after each read
+        max_bytes_per_s: Throttle the body to this rate (None: unlimited)
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, object],
+        files: Dict[str, Tuple[str, str, str]],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress: Optional[ProgressCallback] = None,
+        max_bytes_per_s: Optional[float] = None
+    ):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.max_bytes_per_s = max_bytes_per_s
+        self.sent = 0
+        self._started = None
+
+        # Parts are either bytes or an open-on-demand file path
+        self._parts = []
+        for name, value in fields.items():
+            self._parts.append(
+                self._header(name) + b"\r\n" + str(value).encode("utf-8") + b"\r\n"
+            )
+        for name, (file_name, path, content_type) in files.items():
+            self._parts.append(
+                self._header(name, file_name) + f"Content-Type: {content_type}\r\n".encode("utf-8") + b"\r\n"
+            )
+            self._parts.append(path)
+            self._parts.append(b"\r\n")
+        self._parts.append(f"--{self.boundary}--\r\n".encode("ascii"))
+
+        self.len = sum(len(p) if isinstance(p, bytes) else os.path.getsize(p) for p in self._parts)
+        self._index = 0
+        self._file = None
+        self._pending = memoryview(b"")  # rest of the last chunk, handed out by read()
+
+    def _header(self, name: str, file_name: Optional[str] = None) -> bytes:
+        disposition = f'form-data; name="{name}"'
+        if file_name is not None:
+            disposition += f'; filename="{file_name}"'
+        return f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n".encode("utf-8")
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return self.len
+
+    def _next_chunk(self) -> bytes:
+        """The next bytes part, or up to chunk_size bytes of a file part. b"" at the end."""
+        while self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, bytes):
+                self._index += 1
+                return part
+            if self._file is None:
+                self._file = open(part, "rb")
+            chunk = self._file.read(self.chunk_size)
+            if chunk:
+                return chunk
+            self._file.close()
+            self._file = None
+            self._index += 1
+        return b""
+
+    def read(self, size: int = -1) -> bytes:
+        """Up to `size` bytes of the body, or all the rest if `size` is negative or None. b"" at the end."""
+        if size is None or size < 0:
+            return b"".join(iter(lambda: self.read(self.chunk_size), b""))
+        if size == 0:
+            return b""
+        if not self._pending:
+            self._pending = memoryview(self._next_chunk())
+        data, self._pending = bytes(self._pending[:size]), self._pending[size:]
+        if not data:
+            self.close()
+            return b""
+
+        if self._started is None:
+            self._started = time.perf_counter()
+        self.sent += len(data)
+        if self.max_bytes_per_s:
+            # Sleep until the average rate is back under the limit
+            ahead = self.sent / self.max_bytes_per_s - (time.perf_counter() - self._started)
+            if ahead > 0:
+                time.sleep(ahead)
+        if self.progress:
+            self.progress(self.sent, self.len)
+        return data
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None